@@ -0,0 +1,313 @@
+"""
+Backend local (sem Earth Engine) das séries mensais de P, ET, P - ET e PDSI.
+
+Executa a mesma análise do climate_st.py sobre pilhas locais de CHIRPS, MOD16 e TERRACLIMATE, para
+quando a cota do Earth Engine se esgota ou para reprocessamentos em lote. Tudo roda offline em uma
+única máquina.
+
+Organização esperada do diretório de dados (CLIMA_DADOS_LOCAIS), para cada dataset:
+    <dados>/<dataset>.zarr          variável precipitation / ET / pdsi com dimensões (time, y, x)
+    <dados>/<dataset>/*.tif         um GeoTIFF por imagem, com a data no nome (ex.: 2024.01.1, 20240109 ou
+                                    o dia juliano dos produtos MODIS, A2024009)
+
+Os valores são os brutos dos produtos (mesmos fatores de escala das coleções do EE: MOD16 x 0,1 e
+PDSI x 0,01). De cada arquivo é lida apenas a janela que cobre a ROI; as composições mensais (soma de
+P e ET, média do PDSI) são feitas por pixel e as médias zonais usam máscaras rasterizadas da ROI. As
+tabelas de saída têm as mesmas colunas das séries do Earth Engine, então gráficos e indicadores não
+mudam.
+
+Uso:
+    python app_climate_gee/backend_local.py roi.geojson --inicio 2015 --fim 2024 --dados /dados/clima --saida serie
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils_clima import series_de_valores
+
+logger = logging.getLogger(__name__)
+
+DIRETORIO_DADOS = os.environ.get("CLIMA_DADOS_LOCAIS", "dados_clima")
+
+# Variável, fator de escala, maior valor válido e agregação mensal de cada dataset
+DATASETS = {
+    'chirps': {'variavel': 'precipitation', 'fator': 1.0, 'valido_max': None, 'agregacao': 'soma'},
+    # Valores acima de 32760 são códigos de preenchimento do MOD16 (água, área urbana, sem dados)
+    'mod16': {'variavel': 'ET', 'fator': 0.1, 'valido_max': 32760, 'agregacao': 'soma'},
+    'terraclimate': {'variavel': 'pdsi', 'fator': 0.01, 'valido_max': None, 'agregacao': 'media'},
+}
+
+# Data no nome do arquivo: ano e mês (dia opcional), separados ou não por '.', '_' ou '-'
+PADRAO_DATA = re.compile(r'((?:19|20)\d{2})[._-]?(0[1-9]|1[0-2])(?:[._-]?(\d{1,2}))?')
+
+# Data dos produtos MODIS: 'A' + ano + dia juliano (ex.: MOD16A2.A2024009.h13v10.061.tif)
+PADRAO_DIA_JULIANO = re.compile(r'(?<![A-Za-z0-9])A((?:19|20)\d{2})(\d{3})(?!\d)')
+
+
+def geometrias_roi(roi_geojson):
+    """Geometrias shapely (EPSG:4326) de uma Feature ou FeatureCollection GeoJSON."""
+    from shapely.geometry import shape
+
+    if roi_geojson.get("type") == "FeatureCollection":
+        return [shape(feicao["geometry"]) for feicao in roi_geojson["features"]]
+    return [shape(roi_geojson["geometry"])]
+
+
+def data_do_arquivo(caminho):
+    """Data da imagem a partir do nome do arquivo (None se não houver data no nome)."""
+    # O dia juliano do MODIS é verificado primeiro (A2024109 não é outubro de 2024)
+    juliano = PADRAO_DIA_JULIANO.search(os.path.basename(caminho))
+    if juliano is not None:
+        ano, dia_juliano = juliano.groups()
+        return pd.Timestamp(int(ano), 1, 1) + pd.Timedelta(days=int(dia_juliano) - 1)
+
+    encontrada = PADRAO_DATA.search(os.path.basename(caminho))
+    if encontrada is None:
+        return None
+    ano, mes, dia = encontrada.groups()
+    # Em nomes como chirps-v2.0.2024.01.1 o último número é a pêntada, não o dia
+    dia = int(dia) if dia and len(dia) == 2 else 1
+    return pd.Timestamp(int(ano), int(mes), min(max(dia, 1), 28))
+
+
+def padronizar_dims(pilha):
+    """Renomeia lat/lon para y/x, ordena as dimensões (time, y, x) e define o CRS (padrão EPSG:4326)."""
+    import rioxarray  # noqa: F401  (registra o acessor .rio)
+
+    nomes = {'lon': 'x', 'longitude': 'x', 'lat': 'y', 'latitude': 'y'}
+    pilha = pilha.rename({dim: nome for dim, nome in nomes.items() if dim in pilha.dims})
+    pilha = pilha.transpose('time', 'y', 'x').rio.set_spatial_dims(x_dim='x', y_dim='y')
+    if pilha.rio.crs is None:
+        pilha = pilha.rio.write_crs('EPSG:4326')
+    return pilha
+
+
+def recortar_pilha(dataset, limites, inicio, fim, diretorio=DIRETORIO_DADOS):
+    """
+    Lê da pilha local apenas a janela que cobre os limites, no período [inicio, fim).
+
+    Args:
+        dataset (String): Chave em DATASETS.
+        limites (tuple): (oeste, sul, leste, norte) em EPSG:4326.
+        inicio, fim (pd.Timestamp): Período (fim exclusivo).
+        diretorio (String): Diretório dos dados locais.
+
+    Returns:
+        xarray.DataArray (time, y, x) carregado em memória, ou None se não houver imagens no período
+    """
+    import rioxarray
+    import xarray as xr
+    from rasterio.warp import transform_bounds
+
+    variavel = DATASETS[dataset]['variavel']
+    caminho_zarr = os.path.join(diretorio, f"{dataset}.zarr")
+    pasta = os.path.join(diretorio, dataset)
+
+    if os.path.isdir(caminho_zarr):
+        # Zarr: leitura preguiçosa (dask), apenas os blocos da janela e do período são lidos
+        pilha = padronizar_dims(xr.open_zarr(caminho_zarr)[variavel])
+        pilha = pilha.sel(time=slice(inicio, fim - pd.Timedelta(seconds=1)))
+        if pilha.sizes['time'] == 0:
+            return None
+        janela = transform_bounds('EPSG:4326', pilha.rio.crs, *limites)
+        return pilha.rio.clip_box(*janela, auto_expand=True).load()
+
+    if not os.path.isdir(pasta):
+        raise FileNotFoundError(f"Dados locais de {dataset} não encontrados: {caminho_zarr} ou {pasta}/*.tif")
+
+    arquivos = sorted(glob.glob(os.path.join(pasta, '*.tif')) + glob.glob(os.path.join(pasta, '*.tiff')))
+    datados = [(data_do_arquivo(arquivo), arquivo) for arquivo in arquivos]
+    sem_data = [os.path.basename(arquivo) for data, arquivo in datados if data is None]
+    if sem_data:
+        logger.warning("%s: %d arquivo(s) ignorado(s) sem data reconhecida no nome: %s",
+                       dataset, len(sem_data), ', '.join(sem_data[:5]) + (' ...' if len(sem_data) > 5 else ''))
+    datados = sorted((data, arquivo) for data, arquivo in datados if data is not None and inicio <= data < fim)
+    if not datados:
+        return None
+
+    # GeoTIFF: leitura em janela de cada arquivo (a janela é calculada uma vez, no CRS dos arquivos)
+    camadas, janela, crs = [], None, None
+    for data, arquivo in datados:
+        with rioxarray.open_rasterio(arquivo, masked=True) as camada:
+            camada = camada.isel(band=0, drop=True)
+            if janela is None:
+                crs = camada.rio.crs or 'EPSG:4326'
+                janela = transform_bounds('EPSG:4326', crs, *limites)
+            camadas.append(camada.rio.clip_box(*janela, auto_expand=True).load().expand_dims(time=[data]))
+
+    return xr.concat(camadas, dim='time').rename(variavel).rio.write_crs(crs)
+
+
+def composicao_mensal(recorte, dataset):
+    """Aplica o fator de escala e compõe as imagens mensais por pixel (soma ou média)."""
+    config = DATASETS[dataset]
+    if config['valido_max'] is not None:
+        recorte = recorte.where(recorte <= config['valido_max'])
+    recorte = recorte * config['fator']
+
+    mensal = recorte.resample(time='MS')
+    # min_count=1: pixel sem nenhuma imagem válida no mês fica sem dados (não zero)
+    return mensal.sum(min_count=1) if config['agregacao'] == 'soma' else mensal.mean()
+
+
+def mascara_regiao(geometrias, forma, transform):
+    """Máscara (True dentro) das geometrias; ROIs menores que um pixel usam os pixels tocados."""
+    from rasterio.features import geometry_mask
+
+    mascara = geometry_mask(geometrias, out_shape=forma, transform=transform, invert=True)
+    if not mascara.any():
+        mascara = geometry_mask(geometrias, out_shape=forma, transform=transform, invert=True, all_touched=True)
+    return mascara
+
+
+def reprojetar(geometrias, crs):
+    """Reprojeta geometrias de EPSG:4326 para o CRS da pilha."""
+    from pyproj import CRS, Transformer
+    from shapely.ops import transform as transformar
+
+    if CRS.from_user_input(crs) == CRS.from_epsg(4326):
+        return geometrias
+    transformador = Transformer.from_crs('EPSG:4326', crs, always_xy=True)
+    return [transformar(transformador.transform, geometria) for geometria in geometrias]
+
+
+def medias_zonais(dataset, regioes, inicio, fim, diretorio=DIRETORIO_DADOS):
+    """
+    Médias mensais do dataset em cada região.
+
+    Args:
+        dataset (String): Chave em DATASETS.
+        regioes (dict): id da região -> lista de geometrias shapely (EPSG:4326).
+        inicio, fim (pd.Timestamp): Período (fim exclusivo).
+        diretorio (String): Diretório dos dados locais.
+
+    Returns:
+        DataFrame (índice: início do mês; colunas: ids das regiões)
+    """
+    from shapely import total_bounds
+
+    todas = [geometria for geometrias in regioes.values() for geometria in geometrias]
+    recorte = recortar_pilha(dataset, tuple(total_bounds(todas)), inicio, fim, diretorio)
+    if recorte is None:
+        return pd.DataFrame(columns=list(regioes), dtype=float)
+
+    crs, transform = recorte.rio.crs, recorte.rio.transform()
+    mensal = composicao_mensal(recorte, dataset)
+    forma = mensal.shape[1:]
+    # (meses, pixels): cada região é reduzida de uma vez para todos os meses
+    valores = mensal.values.reshape(mensal.shape[0], -1)
+
+    medias = {}
+    for id_regiao, geometrias in regioes.items():
+        mascara = mascara_regiao(reprojetar(geometrias, crs), forma, transform)
+        pixels = valores[:, mascara.ravel()]
+        validos = ~np.isnan(pixels)
+        contagem = validos.sum(axis=1)
+        soma = np.where(validos, pixels, 0).sum(axis=1)
+        medias[id_regiao] = np.where(contagem > 0, soma / np.maximum(contagem, 1), np.nan)
+
+    return pd.DataFrame(medias, index=pd.DatetimeIndex(mensal['time'].values))
+
+
+def balanco_local(regioes, year_start, year_end, diretorio=DIRETORIO_DADOS):
+    """
+    P, ET, P - ET e PDSI mensais de cada região.
+
+    Returns:
+        dict variável -> DataFrame (índice: mês; colunas: ids das regiões)
+    """
+    inicio, fim = pd.Timestamp(year_start, 1, 1), pd.Timestamp(year_end, 1, 1)
+    medias = {dataset: medias_zonais(dataset, regioes, inicio, fim, diretorio).dropna(how='all')
+              for dataset in DATASETS}
+
+    # Junção interna por ano e mês (como o ee.Join de P e ET)
+    meses = medias['chirps'].index.intersection(medias['mod16'].index)
+    precipitacao, et = medias['chirps'].loc[meses], medias['mod16'].loc[meses]
+    return {
+        'precipitation': precipitacao,
+        'ET': et,
+        'water_balance': precipitacao - et,
+        'pdsi': medias['terraclimate'],
+    }
+
+
+def series_locais(roi_geojson, year_start, year_end, diretorio=DIRETORIO_DADOS):
+    """
+    Séries mensais (média na ROI) calculadas a partir dos dados locais.
+
+    Args:
+        roi_geojson (dict): Feature ou FeatureCollection GeoJSON (EPSG:4326).
+        year_start (int): Ano inicial.
+        year_end (int): Ano final (exclusivo).
+        diretorio (String): Diretório dos dados locais.
+
+    Returns:
+        tuple (df, df_pdsi) com as mesmas colunas das séries do Earth Engine
+    """
+    variaveis = balanco_local({'roi': geometrias_roi(roi_geojson)}, year_start, year_end, diretorio)
+
+    valores = {}
+    for banda, tabela in variaveis.items():
+        for mes, valor in tabela['roi'].dropna().items():
+            valores[f"{mes.strftime('%Y%m')}_{banda}"] = float(valor)
+    return series_de_valores(valores)
+
+
+def estatisticas_por_feicao_local(feicoes, year_start, year_end, diretorio=DIRETORIO_DADOS):
+    """
+    P, ET, P - ET e PDSI mensais de cada feição, a partir dos dados locais.
+
+    Returns:
+        DataFrame longo com feature_id, data, variavel e valor (mesmo formato do Earth Engine)
+    """
+    from shapely.geometry import shape
+
+    regioes = {str(feicao.get('id', posicao)): [shape(feicao['geometry'])] for posicao, feicao in enumerate(feicoes)}
+    if not regioes:
+        return pd.DataFrame(columns=['feature_id', 'data', 'variavel', 'valor'])
+
+    tabelas = []
+    for variavel, tabela in balanco_local(regioes, year_start, year_end, diretorio).items():
+        longa = tabela.rename_axis('data').reset_index() \
+            .melt(id_vars='data', var_name='feature_id', value_name='valor') \
+            .dropna(subset=['valor'])
+        longa['variavel'] = variavel
+        tabelas.append(longa)
+
+    return pd.concat(tabelas, ignore_index=True)[['feature_id', 'data', 'variavel', 'valor']] \
+        .sort_values(['feature_id', 'data', 'variavel'], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Séries de P, ET, P - ET e PDSI a partir de dados locais.")
+    parser.add_argument("roi", help="Arquivo GeoJSON da ROI (EPSG:4326)")
+    parser.add_argument("--inicio", type=int, required=True, help="Ano inicial")
+    parser.add_argument("--fim", type=int, required=True, help="Ano final (exclusivo)")
+    parser.add_argument("--dados", default=DIRETORIO_DADOS, help="Diretório das pilhas GeoTIFF/Zarr")
+    parser.add_argument("--saida", default="serie_clima", help="Prefixo dos arquivos CSV de saída")
+    parser.add_argument("--por-feicao", action="store_true", help="Calcula também as estatísticas por feição")
+    args = parser.parse_args()
+
+    with open(args.roi, encoding='utf-8') as arquivo:
+        roi_geojson = json.load(arquivo)
+
+    inicio = time.perf_counter()
+    df, df_pdsi = series_locais(roi_geojson, args.inicio, args.fim, args.dados)
+    df.to_csv(f"{args.saida}_balanco.csv", index=False)
+    df_pdsi.to_csv(f"{args.saida}_pdsi.csv", index=False)
+    print(f"{len(df)} meses de balanço hídrico e {len(df_pdsi)} meses de PDSI -> {args.saida}_*.csv")
+
+    if args.por_feicao:
+        feicoes = roi_geojson['features'] if roi_geojson.get('type') == 'FeatureCollection' else [roi_geojson]
+        df_feicoes = estatisticas_por_feicao_local(feicoes, args.inicio, args.fim, args.dados)
+        df_feicoes.to_csv(f"{args.saida}_feicoes.csv", index=False)
+        print(f"{df_feicoes['feature_id'].nunique()} feições -> {args.saida}_feicoes.csv")
+
+    print(f"Tempo total: {time.perf_counter() - inicio:.2f} s")
@@ -0,0 +1,85 @@
+"""
+Benchmark da construção da coleção do balanço hídrico: ET por ee.Join x busca por filter().first().
+
+Mede o tempo de extração da série mensal (média de P, ET e P - ET na ROI) para janelas de 1, 10 e
+20 anos com cada método.
+
+Uso:
+    python app_climate_gee/benchmark_clima.py --projeto meu-projeto-gee --anos 1 10 20
+"""
+import argparse
+import json
+import time
+from datetime import datetime
+
+import ee
+
+from utils_clima import criar_colecoes
+
+# ROI padrão: retângulo de ~20 x 20 km no oeste da Bahia
+ROI_PADRAO = [-45.5, -12.3, -45.3, -12.1]
+
+
+def serie_mensal(waterBalanceResult, roi, scale=5000):
+    """Série mensal (média na ROI) calculada no servidor e retornada em uma única chamada."""
+    def por_imagem(image):
+        media = image.select(['precipitation', 'ET', 'water_balance']).reduceRegion(
+            reducer=ee.Reducer.mean(), geometry=roi, scale=scale
+        )
+        return ee.Feature(None, media).set('data', image.get('data'))
+
+    return waterBalanceResult.map(por_imagem).getInfo()
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+def executar_benchmark(roi, janelas, repeticoes=3, ano_final=None):
+    """
+    Mede os dois métodos de junção do ET para cada janela (em anos).
+
+    Returns:
+        list de dicionários (uma linha por janela e método)
+    """
+    ano_final = ano_final or datetime.now().year
+    resultados = []
+    for anos in janelas:
+        for metodo in ['filtro', 'join']:
+            tempos, qtd_meses = [], None
+            for _ in range(repeticoes):
+                waterBalanceResult, _ = criar_colecoes(roi, ano_final - anos, ano_final, metodo_et=metodo)
+                serie, segundos = cronometrar(serie_mensal, waterBalanceResult, roi)
+                tempos.append(segundos)
+                qtd_meses = len(serie['features'])
+            resultados.append({
+                'anos': anos,
+                'metodo': metodo,
+                'meses': qtd_meses,
+                'mediana_s': sorted(tempos)[len(tempos) // 2],
+                'min_s': min(tempos),
+            })
+            print(f"{anos:>2} anos | {metodo:<6} | {qtd_meses} meses | mediana {resultados[-1]['mediana_s']:.2f} s "
+                  f"| mín {resultados[-1]['min_s']:.2f} s")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da junção P/ET do balanço hídrico.")
+    parser.add_argument("--projeto", default=None, help="Projeto do Google Cloud usado pelo Earth Engine")
+    parser.add_argument("--anos", type=int, nargs="+", default=[1, 10, 20], help="Janelas (em anos)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Repetições por janela e método")
+    parser.add_argument("--bbox", type=float, nargs=4, default=ROI_PADRAO, help="ROI (oeste sul leste norte)")
+    parser.add_argument("--saida", default=None, help="Arquivo JSON com os resultados")
+    args = parser.parse_args()
+
+    ee.Initialize(project=args.projeto)
+    roi = ee.Geometry.Rectangle(args.bbox)
+
+    resultados = executar_benchmark(roi, args.anos, args.repeticoes)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+        print(f"Resultados -> {args.saida}")
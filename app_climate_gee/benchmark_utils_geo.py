@@ -0,0 +1,99 @@
+"""
+Benchmark da conversão 3D -> 2D (convert_3D_2D) contra a implementação anterior (linha a linha).
+
+Usa um arquivo KML/KMZ informado ou gera polígonos 3D sintéticos com buracos.
+
+Uso:
+    python app_climate_gee/benchmark_utils_geo.py --arquivo fazenda.kmz
+    python app_climate_gee/benchmark_utils_geo.py --feicoes 5000 --vertices 2000
+"""
+import argparse
+import time
+from zipfile import ZipFile
+
+import fiona
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import Polygon, MultiPolygon
+
+from utils_geo import convert_3D_2D
+
+
+def convert_3D_2D_anterior(geometry):
+    """
+    Implementação anterior (por geometria, descarta os anéis internos), mantida para comparação.
+    """
+    if geometry.has_z:
+        if geometry.geom_type == 'Polygon':
+            return Polygon([(x, y) for x, y, z in geometry.exterior.coords])
+        elif geometry.geom_type == 'MultiPolygon':
+            new_polygons = []
+            for polygon in geometry.geoms:
+                new_polygons.append(Polygon([(x, y) for x, y, z in polygon.exterior.coords]))
+            return MultiPolygon(new_polygons)
+    return geometry
+
+
+def poligonos_3d_sinteticos(qtd_feicoes, qtd_vertices, semente=0):
+    """Gera polígonos 3D com um buraco cada (vetorizado)."""
+    rng = np.random.default_rng(semente)
+    centros = rng.uniform([-54, -30], [-48, -26], (qtd_feicoes, 2))
+    angulos = np.linspace(0, 2 * np.pi, qtd_vertices, endpoint=False)
+
+    def aneis(raio):
+        x = centros[:, 0, None] + raio * np.cos(angulos)
+        y = centros[:, 1, None] + raio * np.sin(angulos)
+        z = rng.uniform(0, 1000, x.shape)
+        coords = np.stack([x, y, z], axis=-1)
+        return np.concatenate([coords, coords[:, :1]], axis=1)
+
+    externos = shapely.linearrings(aneis(0.05))
+    internos = shapely.linearrings(aneis(0.02)[:, ::-1])
+    poligonos = [shapely.polygons(externo, holes=[interno]) for externo, interno in zip(externos, internos)]
+    return gpd.GeoSeries(poligonos, crs="EPSG:4326")
+
+
+def ler_arquivo_3d(caminho):
+    """Lê todas as camadas do KML/KMZ mantendo a coordenada Z."""
+    fiona.drvsupport.supported_drivers['LIBKML'] = 'rw'
+    if caminho.lower().endswith('.kmz'):
+        with ZipFile(caminho) as kmz:
+            nome_kml = next(nome for nome in kmz.namelist() if nome.lower().endswith('.kml'))
+        caminho = f"/vsizip/{caminho}/{nome_kml}"
+
+    geometrias = []
+    for layer in fiona.listlayers(caminho):
+        with fiona.open(caminho, layer=layer) as colecao:
+            geometrias.append(gpd.GeoDataFrame.from_features(colecao, crs=colecao.crs).geometry)
+    return gpd.GeoSeries(pd.concat(geometrias, ignore_index=True))
+
+
+def cronometrar(funcao, *args):
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    return resultado, time.perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark da conversão 3D -> 2D.")
+    parser.add_argument("--arquivo", default=None, help="Arquivo KML/KMZ com geometrias 3D")
+    parser.add_argument("--feicoes", type=int, default=2000, help="Feições sintéticas")
+    parser.add_argument("--vertices", type=int, default=1000, help="Vértices por anel nas feições sintéticas")
+    args = parser.parse_args()
+
+    geometrias = ler_arquivo_3d(args.arquivo) if args.arquivo else poligonos_3d_sinteticos(args.feicoes, args.vertices)
+    qtd_coordenadas = int(shapely.get_num_coordinates(geometrias.to_numpy()).sum())
+    print(f"{len(geometrias)} feições, {qtd_coordenadas} coordenadas")
+
+    anterior, segundos_anterior = cronometrar(geometrias.apply, convert_3D_2D_anterior)
+    vetorizado, segundos_vetorizado = cronometrar(convert_3D_2D, geometrias)
+
+    buracos_original = int(shapely.get_num_interior_rings(geometrias.to_numpy()).sum())
+    buracos_anterior = int(shapely.get_num_interior_rings(anterior.to_numpy()).sum())
+    buracos_vetorizado = int(shapely.get_num_interior_rings(vetorizado.to_numpy()).sum())
+
+    print(f"Anterior (apply):      {segundos_anterior:.3f} s | buracos mantidos: {buracos_anterior}/{buracos_original}")
+    print(f"Vetorizado (force_2d): {segundos_vetorizado:.3f} s | buracos mantidos: {buracos_vetorizado}/{buracos_original}")
+    print(f"Aceleração: {segundos_anterior / segundos_vetorizado:.1f}x")
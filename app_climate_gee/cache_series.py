@@ -0,0 +1,156 @@
+"""
+Cache local (SQLite) das séries mensais de P, ET, P - ET e PDSI.
+
+Os valores são gravados por (hash da geometria da ROI, dataset, escala, mês, banda). A escala é a
+planejada para um mês, independente do período analisado, para que estender as datas não invalide os
+meses já consultados. Em uma nova análise apenas os meses que ainda não estão no cache são consultados
+no Earth Engine (do primeiro ao último mês faltante, em blocos de meses_por_requisicao meses por
+requisição); análises repetidas são atendidas sem o servidor.
+
+Meses consultados sem dados só são marcados como consultados quando já passaram do atraso de
+publicação dos datasets (LATENCIA_MESES); meses recentes voltam a ser consultados.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+from contextlib import closing
+
+import pandas as pd
+
+from utils_clima import BANDAS_BALANCO, criar_colecoes, valores_serie_unica, series_de_valores
+
+CAMINHO_CACHE = os.environ.get("SERIES_CACHE_PATH", os.path.join(tempfile.gettempdir(), "sbsr2025_series.sqlite"))
+
+# Bandas de cada dataset
+DATASETS = {
+    'balanco': BANDAS_BALANCO,
+    'pdsi': ['pdsi'],
+}
+
+# Atraso de publicação dos dados (meses)
+LATENCIA_MESES = 6
+
+
+def hash_roi(roi_geojson):
+    """SHA-256 das geometrias da ROI (Feature ou FeatureCollection GeoJSON)."""
+    if roi_geojson.get("type") == "FeatureCollection":
+        geometrias = [feicao["geometry"] for feicao in roi_geojson["features"]]
+    else:
+        geometrias = [roi_geojson["geometry"]]
+    return hashlib.sha256(json.dumps(geometrias, sort_keys=True).encode()).hexdigest()
+
+
+def criar_tabelas(conexao):
+    """Cria as tabelas de valores e de meses consultados, se não existirem."""
+    conexao.execute(
+        'CREATE TABLE IF NOT EXISTS series ('
+        'roi TEXT NOT NULL, dataset TEXT NOT NULL, escala INTEGER NOT NULL, mes TEXT NOT NULL, '
+        'banda TEXT NOT NULL, valor REAL, PRIMARY KEY (roi, dataset, escala, mes, banda))'
+    )
+    conexao.execute(
+        'CREATE TABLE IF NOT EXISTS meses_consultados ('
+        'roi TEXT NOT NULL, dataset TEXT NOT NULL, escala INTEGER NOT NULL, mes TEXT NOT NULL, '
+        'PRIMARY KEY (roi, dataset, escala, mes))'
+    )
+    conexao.commit()
+
+
+def meses_periodo(year_start, year_end):
+    """Meses 'YYYYMM' do período (year_end exclusivo)."""
+    return [f"{ano}{mes:02d}" for ano in range(year_start, year_end) for mes in range(1, 13)]
+
+
+def meses_em_cache(conexao, chave_roi, dataset, escala):
+    """Meses já consultados para a ROI, dataset e escala."""
+    return {mes for mes, in conexao.execute(
+        'SELECT mes FROM meses_consultados WHERE roi = ? AND dataset = ? AND escala = ?',
+        (chave_roi, dataset, escala)
+    )}
+
+
+def ler_valores(conexao, chave_roi, escala, meses):
+    """Valores em cache no formato 'YYYYMM_banda' -> valor."""
+    valores = {}
+    consulta = conexao.execute(
+        'SELECT mes, banda, valor FROM series WHERE roi = ? AND escala = ? AND valor IS NOT NULL',
+        (chave_roi, escala)
+    )
+    for mes, banda, valor in consulta:
+        if mes in meses:
+            valores[f"{mes}_{banda}"] = valor
+    return valores
+
+
+def gravar_valores(conexao, chave_roi, escala, meses_consultados, valores):
+    """Grava os valores retornados pelo Earth Engine e os meses consultados."""
+    linhas = []
+    for chave, valor in valores.items():
+        mes, banda = chave.split('_', 1)
+        dataset = 'pdsi' if banda == 'pdsi' else 'balanco'
+        linhas.append((chave_roi, dataset, escala, mes, banda, valor))
+    conexao.executemany('INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?, ?, ?)', linhas)
+
+    # Meses sem dados só são definitivos depois do atraso de publicação
+    limite = (pd.Timestamp.today() - pd.DateOffset(months=LATENCIA_MESES)).strftime('%Y%m')
+    com_dados = {(linha[1], linha[3]) for linha in linhas if linha[5] is not None}
+    marcados = [
+        (chave_roi, dataset, escala, mes)
+        for dataset in DATASETS for mes in meses_consultados
+        if (dataset, mes) in com_dados or mes <= limite
+    ]
+    conexao.executemany('INSERT OR REPLACE INTO meses_consultados VALUES (?, ?, ?, ?)', marcados)
+    conexao.commit()
+
+
+def series_com_cache(roi, roi_geojson, year_start, year_end, scale=5000, caminho=CAMINHO_CACHE, tile_scale=1,
+                     meses_por_requisicao=None):
+    """
+    Séries mensais de P, ET, P - ET e PDSI, consultando no Earth Engine apenas os meses fora do cache.
+
+    Args:
+        roi (ee.Geometry | ee.FeatureCollection): Região de interesse.
+        roi_geojson (dict): GeoJSON da ROI (usado no hash da geometria).
+        year_start (int): Ano inicial.
+        year_end (int): Ano final (exclusivo).
+        scale (int): Escala (m) da redução.
+        tile_scale (int): tileScale da redução (não faz parte da chave do cache).
+        meses_por_requisicao (int): Meses reduzidos por requisição (padrão: todos os faltantes em uma só).
+
+    Returns:
+        tuple (df, df_pdsi, contagem) com contagem = {'acertos': ..., 'faltas': ...} em meses por dataset
+    """
+    chave_roi = hash_roi(roi_geojson)
+    meses = meses_periodo(year_start, year_end)
+
+    with closing(sqlite3.connect(caminho)) as conexao:
+        criar_tabelas(conexao)
+        faltantes = {dataset: sorted(set(meses) - meses_em_cache(conexao, chave_roi, dataset, scale))
+                     for dataset in DATASETS}
+        contagem = {
+            'acertos': sum(len(meses) - len(lista) for lista in faltantes.values()),
+            'faltas': sum(len(lista) for lista in faltantes.values()),
+        }
+
+        todos_faltantes = sorted(set().union(*faltantes.values()))
+        if todos_faltantes:
+            # Do primeiro ao último mês faltante, em blocos de meses consecutivos (uma requisição por bloco)
+            consultados = [mes for mes in meses if todos_faltantes[0] <= mes <= todos_faltantes[-1]]
+            tamanho_bloco = meses_por_requisicao or len(consultados)
+            for posicao in range(0, len(consultados), tamanho_bloco):
+                bloco = consultados[posicao:posicao + tamanho_bloco]
+                if not set(bloco) & set(todos_faltantes):
+                    continue
+                inicio = pd.Timestamp(f"{bloco[0]}01")
+                fim = pd.Timestamp(f"{bloco[-1]}01") + pd.DateOffset(months=1)
+                waterBalanceResult, pdsi = criar_colecoes(roi, year_start, year_end,
+                                                          inicio=inicio.strftime('%Y-%m-%d'),
+                                                          fim=fim.strftime('%Y-%m-%d'))
+                novos = valores_serie_unica(waterBalanceResult, pdsi, roi, scale, tile_scale)
+                gravar_valores(conexao, chave_roi, scale, bloco, novos)
+
+        valores = ler_valores(conexao, chave_roi, scale, set(meses))
+
+    df, df_pdsi = series_de_valores(valores)
+    return df, df_pdsi, contagem
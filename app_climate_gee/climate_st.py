@@ -1,32 +1,35 @@
-import geemap               # Ferramentas para integração com o Google Earth Engine e mapas interativos
+import time                  # Medição do tempo de execução do script
+inicio_script = time.perf_counter()
+
 import ee                   # Biblioteca oficial do Google Earth Engine para Python (processamento de dados geoespaciais)
-import geemap.foliumap as geemap  # Versão do geemap baseada no folium, usada para renderizar mapas no Streamlit
 
 from datetime import datetime       # Utilizado para manipular datas (seleção do período de análise)
 import streamlit as st              # Framework principal do app (interface web interativa)
 from streamlit_folium import st_folium  # Permite integrar mapas Folium interativos ao Streamlit
 
 import folium                # Biblioteca de mapas interativos baseada em Leaflet.js (usada para desenho da ROI)
-import plotly.express as px  # Gráficos simples e rápidos)
-import plotly.graph_objects as go  # Usado para gráficos avançados (ex: série temporal, indicadores)
-
-import altair as alt         # Biblioteca de visualização declarativa (usada para o gráfico de calor e séries temporais do PDSI)
-import pandas as pd          # Manipulação de tabelas e dataframes
-import time                  # Pausa no processamento (ex: spinner de carregamento)
-import geopandas as gpd      # ⚠️ Não está sendo utilizada diretamente (mas pode estar usada dentro de `convert_to_geodf`)
-from utils_geo import convert_to_geodf  # Função personalizada que converte o upload em GeoDataFrame
+from folium.plugins import Draw  # Ferramenta de desenho da ROI
+
 import json                  # Manipulação de GeoJSONs e estruturação dos dados para download/sessão
-import tempfile
-from google.oauth2 import service_account
-from ee import oauth
+from concurrent.futures import as_completed  # Consultas ao Earth Engine em paralelo
+import os
+import sys
+
+# Módulos compartilhados entre os apps (pasta comum/ na raiz do repositório)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.ee_inicializacao import inicializar_ee, exibir_tempo_execucao, executor_da_sessao
+from comum.escala import (area_geojson_m2, planejar_escala, executar_com_fallback, descrever_plano,
+                          ORCAMENTO_PIXELS_PADRAO)
+from comum.cache_tiles import adicionar_camada_ee, map_id_em_cache
+
+# geemap, plotly, altair, geopandas, pandas e os módulos de séries (utils_clima, cache_series e
+# backend_local) são importados apenas quando usados (partida mais rápida)
  
 
 # ====================================================
 # CONFIGURAÇÃO INICIAL DA PÁGINA
 # ====================================================
 st.set_page_config(layout="wide")
-# Inicializa um mapa apenas para garantir autenticação do Earth Engine
-auth_map = geemap.Map()
 st.title('Análise Variáveis Climáticas (P - ET)')
 st.markdown("""
 Este aplicativo permite visualizar e analisar séries temporais mensais de **Precipitação**, **Evapotranspiração (ET)**, **Balanço Hídrico (P - ET)** e **Índice de Seca de Palmer (PDSI)**.
@@ -64,11 +67,7 @@ Este aplicativo permite visualizar e analisar séries temporais mensais de **Pre
 💡 Este app é voltado para pesquisadores, técnicos e gestores que desejam realizar diagnósticos ambientais rápidos e baseados em dados de sensoriamento remoto, utilizando o poder computacional do **Google Earth Engine** com uma interface acessível e interativa.
 """)
 
-# Spinner de carregamento inicial
 st.subheader('Processamento de dados', divider='blue')
-with st.spinner('Aguarde o processamento dos dados...'):
-    time.sleep(2)
-st.success('Informações Processadas!')
 
 # ====================================================
 # BARRA LATERAL (SIDEBAR) - Upload e desenho da ROI
@@ -87,7 +86,14 @@ st.sidebar.markdown("### Ou desenhe sua área no mapa abaixo ⬇️")
 # ====================================================
 # DEFINIÇÃO DA REGIÃO DE INTERESSE (ROI)
 # ====================================================
-roi = None  # Variável global para armazenar a ROI
+roi_geojson = None  # GeoJSON da ROI (o objeto do EE é criado apenas quando o EE é usado)
+
+
+def roi_do_geojson(roi_geojson):
+    """ROI do Earth Engine a partir do GeoJSON salvo na sessão (FeatureCollection ou feição desenhada)."""
+    if roi_geojson["type"] == "FeatureCollection":
+        return ee.FeatureCollection(roi_geojson["features"])
+    return ee.Geometry(roi_geojson["geometry"])
 
 # CASO 1: Nenhum upload e nenhuma ROI na sessão → mapa para desenho
 if uploaded_file is None and "roi_uploaded" not in st.session_state:
@@ -96,7 +102,7 @@ if uploaded_file is None and "roi_uploaded" not in st.session_state:
 
     # Cria mapa base com ferramenta de desenho
     folium_map = folium.Map(location=[-14, -54], zoom_start=5)
-    draw = folium.plugins.Draw(export=True)
+    draw = Draw(export=True)
     draw.add_to(folium_map)
 
     # Captura do desenho feito pelo usuário
@@ -105,8 +111,7 @@ if uploaded_file is None and "roi_uploaded" not in st.session_state:
     # Se houver geometria desenhada, define como ROI
     if draw_result and draw_result.get("all_drawings"):
         feature = draw_result["all_drawings"][0]
-        geojson_geom = feature["geometry"]
-        roi = ee.Geometry(geojson_geom)
+        roi_geojson = feature
 
         # Salva no estado da sessão para reutilização futura
         st.session_state["roi_uploaded"] = True
@@ -125,27 +130,85 @@ if uploaded_file is None and "roi_uploaded" not in st.session_state:
 # CASO 2: Upload de arquivo vetorial → define a ROI
 elif uploaded_file is not None:
     try:
-        # Converte arquivo carregado em GeoDataFrame e depois para FeatureCollection do EE
-        gdf = convert_to_geodf(uploaded_file)
-        shp_json = gdf.to_json()
-        f_json = json.loads(shp_json)['features']
-        roi = ee.FeatureCollection(f_json)
+        # Converte arquivo carregado em GeoDataFrame e depois em feições GeoJSON
+        from utils_geo import convert_to_geodf  # Função personalizada que converte o upload em GeoDataFrame
+        from comum.roi import descrever_relatorio
+        from comum.cache_roi import resolver_roi
+
+        # O arquivo só é lido se ainda não estiver no cache de ROIs (SHA-256 do conteúdo)
+        metricas_upload = {}
+        # Simplifica a ROI para a resolução do MOD16 (500 m), o dataset mais fino da análise
+        entrada_roi = resolver_roi(uploaded_file.getvalue(),
+                                   lambda: convert_to_geodf(uploaded_file, metricas_upload), resolucao_m=500)
+        f_json, relatorio_roi = entrada_roi['feicoes'], entrada_roi['relatorio']
+        roi_geojson = {
+            "type": "FeatureCollection",
+            "features": f_json
+        }
 
-        # Salva a geometria no estado da sessão
+        # Salva todas as feições no estado da sessão (não apenas a primeira)
         st.session_state["roi_uploaded"] = True
-        st.session_state["roi_geojson"] = {
-            "type": "Feature",
-            "geometry": f_json[0]['geometry']
-        }
+        st.session_state["roi_geojson"] = roi_geojson
 
         st.sidebar.success("✅ Arquivo carregado com sucesso!")
+        # Tempo e memória de leitura para arquivos grandes
+        if metricas_upload.get('tamanho_mb', 0) >= 5:
+            texto_upload = f"Arquivo de {metricas_upload['tamanho_mb']:.1f} MB lido em {metricas_upload['tempo_s']:.2f} s"
+            if 'pico_memoria_mb' in metricas_upload:
+                texto_upload += (f" (pico de memória do processo: {metricas_upload['pico_memoria_mb']:.0f} MB, "
+                                 f"+{metricas_upload['aumento_pico_memoria_mb']:.0f} MB na leitura)")
+            st.sidebar.caption(texto_upload)
+        st.sidebar.caption(descrever_relatorio(relatorio_roi))
+        if entrada_roi['origem'] != 'leitura':
+            st.sidebar.caption("ROI recuperada do cache (arquivo já carregado anteriormente).")
     except Exception as e:
         st.sidebar.error(f"Erro ao carregar o arquivo: {e}")
 
 # CASO 3: ROI já definida anteriormente → carrega da sessão
 elif "roi_uploaded" in st.session_state:
-    geojson_geom = st.session_state["roi_geojson"]["geometry"]
-    roi = ee.Geometry(geojson_geom)
+    roi_geojson = st.session_state["roi_geojson"]
+
+######################## COLEÇÃO DE IMAGENS ########################
+
+# Sidebar - seleção de datas e botão de análise
+start_date = st.sidebar.date_input("Selecione a data inicial", datetime(2024, 1, 1))
+end_date = st.sidebar.date_input("Selecione a data final", datetime.now())
+# Feições da ROI (upload com vários talhões ou ROI desenhada)
+feicoes_roi = st.session_state.get("roi_geojson", {}).get("features", [])
+por_feicao = st.sidebar.checkbox(
+    "📊 Estatísticas por feição",
+    value=False,
+    disabled=len(feicoes_roi) < 2,
+    help="Calcula P, ET, P - ET e PDSI mensais para cada polígono do arquivo carregado."
+)
+# Modo de extração das séries temporais
+MODOS_EXTRACAO = ["Requisição única (imagem multibanda)", "Por imagem (reduceRegions)"]
+modo_extracao = st.sidebar.radio(
+    "Modo de extração",
+    MODOS_EXTRACAO,
+    help="Requisição única: toda a série em uma chamada (média da ROI inteira). "
+         "Por imagem: uma redução por mês e por feição (modo anterior)."
+)
+# Fonte dos dados: Earth Engine ou pilhas locais (ex.: cota do Earth Engine esgotada)
+FONTES_DADOS = ["Google Earth Engine", "Arquivos locais (GeoTIFF/Zarr)"]
+fonte_dados = st.sidebar.radio(
+    "Fonte dos dados",
+    FONTES_DADOS,
+    help="Arquivos locais: CHIRPS, MOD16 e TERRACLIMATE em <diretório>/<dataset>.zarr ou <diretório>/<dataset>/*.tif."
+)
+if fonte_dados == FONTES_DADOS[1]:
+    from backend_local import DIRETORIO_DADOS
+    diretorio_local = st.sidebar.text_input("Diretório dos dados locais", DIRETORIO_DADOS)
+run_analysis = st.sidebar.button("🚀 Executar Análise")
+dados_locais = fonte_dados == FONTES_DADOS[1]
+
+# Com dados locais o Earth Engine não é inicializado nem consultado (funciona sem credenciais)
+roi = None
+if not dados_locais:
+    # Inicializa o Earth Engine uma única vez por processo (credenciais em cache)
+    inicializar_ee()
+    if roi_geojson is not None:
+        roi = roi_do_geojson(roi_geojson)
 
 # ====================================================
 # VISUALIZAÇÃO DA ROI NO MAPA (GEEMAP)
@@ -154,401 +217,427 @@ if roi is not None and not st.session_state.get("analysis_done", False):
     st.subheader("Visualização da Região de Interesse")
 
     # Cria o mapa GEEMAP com a ROI
+    import geemap.foliumap as geemap  # Versão do geemap baseada no folium, usada para renderizar mapas no Streamlit
     m = geemap.Map(height=600)
     m.centerObject(roi, 8)
     m.setOptions("HYBRID")
-    m.addLayer(roi, {}, "Região de Interesse")
+    adicionar_camada_ee(m, roi, {}, "Região de Interesse")
 
     # O mapa ainda não está sendo renderizado neste trecho
     # Para exibir: descomente a linha abaixo
     # m.to_streamlit()
 
-    
-######################## COLEÇÃO DE IMAGENS ########################
+# Executa o processamento somente se ROI foi definida e botão clicado
+if roi_geojson is not None and run_analysis:
+    import plotly.graph_objects as go  # Usado para gráficos avançados (ex: série temporal, indicadores)
+    import altair as alt         # Gráfico de calor e séries temporais do PDSI
+    import pandas as pd          # Manipulação de tabelas e dataframes
 
-# Sidebar - seleção de datas e botão de análise
-start_date = st.sidebar.date_input("Selecione a data inicial", datetime(2024, 1, 1))
-end_date = st.sidebar.date_input("Selecione a data final", datetime.now())
-run_analysis = st.sidebar.button("🚀 Executar Análise")
+    ## Definição de período
+    year_start = start_date.year
+    year_end = end_date.year
+    roi_geojson = st.session_state["roi_geojson"]
+
+    ## Funções de exibição (executadas na thread principal, à medida que os resultados chegam)
+    def exibir_balanco(df):
+        ## Criando o gráfico com Plotly
+        fig = go.Figure()
+
+        # Barras para balanço hídrico (eixo secundário)
+        fig.add_trace(go.Bar(
+            x=df['data'], 
+            y=df['water_balance'], 
+            name='Wb', 
+            yaxis='y2', 
+            marker_color='orange'
+        ))
+
+        # Linhas para ET e Precipitação
+        fig.add_trace(go.Scatter(
+            x=df['data'], 
+            y=df['ET'], 
+            mode='lines', 
+            name='ET', 
+            line=dict(color='green')
+        ))
+        fig.add_trace(go.Scatter(
+            x=df['data'], 
+            y=df['precipitation'], 
+            mode='lines', 
+            name='P', 
+            line=dict(color='blue')
+        ))
+
+        # Layout do gráfico
+        fig.update_layout(
+            title='Balanço Hídrico (P-ET)',
+            yaxis=dict(title='ET & P mm/m'),
+            yaxis2=dict(title='Wb (mm/m)', overlaying='y', side='right')
+        )
 
-# Executa o processamento somente se ROI foi definida e botão clicado
-if roi is not None and run_analysis:
+        # ======================= INDICADORES (EXCEDENTE / DÉFICIT HÍDRICO) ==========================
 
-    ## Abrindo nossos dados
-    chirps = ee.ImageCollection("UCSB-CHG/CHIRPS/PENTAD").select('precipitation')
+        # Layout padrão do gráfico de indicadores
+        layout = go.Layout(
+            width=800,
+            height=400,
+            margin=dict(t=50, b=50, l=50, r=50),
+        )
 
-    # Definindo a função de escala
-    def scale_mod16(image):
-        return image.multiply(0.1).copyProperties(image, image.propertyNames())
+        # Calcula a média da coluna 'water_balance'
+        mean_water_balance = df['water_balance'].mean()
+
+        # Remove o sufixo de hora para melhor visualização textual
+        df['data'] = pd.to_datetime(df['data']).dt.date
+
+        # Verifica excedente e déficit com base na média
+        excess = df['water_balance'] > mean_water_balance
+        deficit = df['water_balance'] < mean_water_balance
+
+        # Obtém os extremos de excedente e déficit e suas datas
+        max_excess_value = df.loc[excess, 'water_balance'].max()
+        max_excess_date = df.loc[df['water_balance'] == max_excess_value, 'data'].values[0]
+
+        min_deficit_value = df.loc[deficit, 'water_balance'].min()
+        min_deficit_date = df.loc[df['water_balance'] == min_deficit_value, 'data'].values[0]
+
+        # Criação do gráfico com indicadores
+        fig_2 = go.Figure(layout=layout)
+
+        # Indicador: Excedente Hídrico
+        fig_2.add_trace(go.Indicator(
+            mode="number+delta+gauge",
+            value=max_excess_value,  # Maior valor de excedente hídrico
+            delta={'reference': mean_water_balance},  # Comparação com a média
+            gauge={
+                'axis': {'visible': True, 'range': [None, df['water_balance'].max()]},
+                'steps': [{'range': [mean_water_balance, df['water_balance'].max()], 'color': "lightgray"}],
+                'threshold': {
+                    'line': {'color': "green", 'width': 4},
+                    'thickness': 0.75,
+                    'value': mean_water_balance
+                }
+            },
+            title={"text": f"Excedente hídrico (Data: {max_excess_date})"},
+            domain={'x': [0, 0.5], 'y': [0, 1]}
+        ))
+
+        # Indicador: Déficit Hídrico
+        fig_2.add_trace(go.Indicator(
+            mode="number+delta+gauge",
+            value=min_deficit_value,  # Menor valor de déficit
+            delta={'reference': mean_water_balance},
+            gauge={
+                'axis': {'visible': True, 'range': [None, df['water_balance'].max()]},
+                'steps': [{'range': [df['water_balance'].min(), mean_water_balance], 'color': "lightgray"}],
+                'threshold': {
+                    'line': {'color': "red", 'width': 4},
+                    'thickness': 0.75,
+                    'value': mean_water_balance
+                }
+            },
+            title={"text": f"Déficit (Data: {min_deficit_date})"},
+            domain={'x': [0.5, 1], 'y': [0, 1]}
+        ))
+
+        ############## Dados principais ###################################################
+
+        # Calcular valores máximos, médios e mínimos para ET e Precipitação
+        max_et = df['ET'].max()
+        min_et = df['ET'].min()
+        mean_et = df['ET'].mean()
+
+        max_precipitation = df['precipitation'].max()
+        min_precipitation = df['precipitation'].min()
+        mean_precipitation = df['precipitation'].mean()
+
+        # Inserir os valores calculados nas colunas com formato de métricas
+        col1.metric("ET", f"Mín: {min_et:.2f}, Méd: {mean_et:.2f}, Máx: {max_et:.2f}", "")
+        col2.metric("Precipitação", f"Mín: {min_precipitation:.2f}, Méd: {mean_precipitation:.2f}, Máx: {max_precipitation:.2f}", "")
+
+        # Gráfico da série histórica do balanço hídrico
+        with col4:
+            st.subheader('📈 Balanço Hídrico - Série Histórica')
+            st.plotly_chart(fig, use_container_width=True)
+
+        # Exibição da tabela com dados extraídos
+        with col5:
+            st.subheader("🗃Tabela de dados")
+            st.dataframe(df, height=500)
+
+        # Gráfico dos indicadores de excedente e déficit
+        with col6:
+            st.subheader('📈 Análise Hídrica (P-ET)')
+            st.plotly_chart(fig_2, use_container_width=True)
+
+    def exibir_pdsi(df_pdsi):
+        # Conversão de data para datetime (PDSI)
+        df_pdsi['data'] = pd.to_datetime(df_pdsi['data'])
+
+        # Extração de mês e ano
+        df_pdsi['mes'] = df_pdsi['data'].dt.month
+        df_pdsi['ano'] = df_pdsi['data'].dt.year
+
+        # ========================== VISUALIZAÇÃO PDSI ===========================
+
+        # Gráfico de calor (ano x mês) com intensidade do PDSI
+        alt_heat = alt.Chart(df_pdsi).mark_rect().encode(
+            x='ano:O',
+            y='mes:O',
+            color=alt.Color('mean(pdsi):Q', scale=alt.Scale(scheme='redblue', domain=(-5, 5))),
+            tooltip=[
+                alt.Tooltip('ano:O', title='Year'),
+                alt.Tooltip('mes:O', title='Month'),
+                alt.Tooltip('mean(pdsi):Q', title='PDSI')
+            ]
+        ).properties(
+            title='Mapa de Calor do Índice de Severidade de Seca Padrão (PDSI)',
+            width=600,
+            height=300
+        )
 
-    mod16 = ee.ImageCollection("MODIS/061/MOD16A2GF").map(scale_mod16 ).select('ET')
+        # Gráfico de barras temporais (linha do tempo PDSI)
+        alt_time = alt.Chart(df_pdsi).mark_bar(size=1).encode(
+            x='data:T',
+            y='pdsi:Q',
+            color=alt.Color('pdsi:Q', scale=alt.Scale(scheme='redblue', domain=(-5, 5))),
+            tooltip=[
+                alt.Tooltip('data:T', title='Date'),
+                alt.Tooltip('pdsi:Q', title='PDSI')
+            ]
+        ).properties(
+            title='Série histórica Índice de Severidade de Seca Padrão (PDSI)',
+            width=600,
+            height=300
+        )
 
-    ## Definição de período
-    year_start = start_date.year
-    year_end = end_date.year
+        max_pdsi = df_pdsi['pdsi'].max()
+        min_pdsi = df_pdsi['pdsi'].min()
+        mean_pdsi = df_pdsi['pdsi'].mean()
+        col3.metric("PDSI", f"Mín: {min_pdsi:.2f}, Méd: {mean_pdsi:.2f}, Máx: {max_pdsi:.2f}", "")
 
-    # Parâmetros para padronização temporal
-    startDate = ee.Date.fromYMD(year_start, 1, 1)
-    endDate = ee.Date.fromYMD(year_end, 1, 1)  # Avança o ano inicial mais x
-
-    # Filtrar a coleção a partir do período definido
-    yearFiltered = chirps.filter(ee.Filter.date(startDate, endDate)).filterBounds(roi)
-    # print('Numero de imagens',yearFiltered.size().getInfo())
-
-    # Lista de meses e anos
-    months = ee.List.sequence(1, 12)
-    years = ee.List.sequence(year_start, (year_end - 1))
-
-    # Função para criar imagens mensais
-    def createYearly(year):
-
-        def createMonthlyImage(month):
-            return yearFiltered \
-                .filter(ee.Filter.calendarRange(year, year, 'year')) \
-                .filter(ee.Filter.calendarRange(month, month, 'month')) \
-                .sum() \
-                .clip(roi) \
-                .set('year', year) \
-                .set('month', month) \
-                .set('data', ee.Date.fromYMD(year, month, 1).format()) \
-                .set('system:time_start', ee.Date.fromYMD(year, month, 1))
-
-        return months.map(createMonthlyImage)
-
-    # Aplicar função mês/ano nas coleções
-    chirps_monthlyImages = ee.ImageCollection.fromImages(years.map(createYearly).flatten())
-    yearFiltered = mod16.filter(ee.Filter.date(startDate, endDate)).filterBounds(roi)
-    mod16_monthlyImages = ee.ImageCollection.fromImages(years.map(createYearly).flatten())
-
-    # Verificar número de bandas
-    def addNumBands(image):
-        num_bands = image.bandNames().size()
-        return image.set('nbands', num_bands)
-
-    # Aplica a função e filtra imagens com bandas válidas
-    mod16_monthlyImages = mod16_monthlyImages.map(addNumBands).filter(ee.Filter.gt('nbands', 0))
-    chirps_monthlyImages = chirps_monthlyImages.map(addNumBands).filter(ee.Filter.gt('nbands', 0))
-
-    ## Cálculo do Balanço Hídrico
-    def calculateWaterBalance(image):
-        P = image.select('precipitation')
-        ET = image.select('ET')
-        waterBalance = P.subtract(ET)
-        return image.addBands([waterBalance.rename('water_balance')])
-
-    # Adicionar bandas de precipitação e evapotranspiração às imagens CHIRPS
-    def addETBands(image):
-        ET_image = mod16_monthlyImages \
-            .filter(ee.Filter.eq('year', image.get('year'))) \
-            .filter(ee.Filter.eq('month', image.get('month'))) \
-            .first()
-        return image.addBands([ET_image.rename('ET')])
-
-    # Aplica as funções
-    waterBalanceWithBands = chirps_monthlyImages.map(addETBands)
-    waterBalanceResult = waterBalanceWithBands.map(calculateWaterBalance)
-
-    ## Função para extrair estatísticas das imagens
-    def stats(image):
-        reduce = image.reduceRegions(**{
-            'collection': roi,
-            'reducer': ee.Reducer.mean(),
-            'scale': 5000
-        })
-
-        reduce = reduce \
-            .map(lambda f: f.set({'data': image.get('data')})) \
-            .map(lambda f: f.set({'year': image.get('year')})) \
-            .map(lambda f: f.set({'month': image.get('month')}))
-
-        return reduce.copyProperties(image, image.propertyNames())
-
-    # Converter para df
-    col_bands = waterBalanceResult  # .select(bands)
-
-    # Aplicar estatísticas
-    stats_reduce = col_bands.map(stats) \
-        .flatten() \
-        .sort('data', True)
-   
-
-    df = geemap.ee_to_df(stats_reduce)
-    
+        # Gráfico temporal do PDSI
+        with col7:
+            st.altair_chart(alt_time, theme="streamlit", use_container_width=True)
 
-    ## Criando o gráfico com Plotly
-    fig = go.Figure()
-
-    # Barras para balanço hídrico (eixo secundário)
-    fig.add_trace(go.Bar(
-        x=df['data'], 
-        y=df['water_balance'], 
-        name='Wb', 
-        yaxis='y2', 
-        marker_color='orange'
-    ))
-
-    # Linhas para ET e Precipitação
-    fig.add_trace(go.Scatter(
-        x=df['data'], 
-        y=df['ET'], 
-        mode='lines', 
-        name='ET', 
-        line=dict(color='green')
-    ))
-    fig.add_trace(go.Scatter(
-        x=df['data'], 
-        y=df['precipitation'], 
-        mode='lines', 
-        name='P', 
-        line=dict(color='blue')
-    ))
-
-    # Layout do gráfico
-    fig.update_layout(
-        title='Balanço Hídrico (P-ET)',
-        yaxis=dict(title='ET & P mm/m'),
-        yaxis2=dict(title='Wb (mm/m)', overlaying='y', side='right')
-    )
-
-
-    ######################## PDSI - Palmer Drought Severity Index ###############################
-
-    # Função para aplicar escala e definir data nas imagens PDSI
-    def scale_pdsi(image):
-        return image.multiply(0.01).clip(roi) \
-                    .set('data', image.date().format('YYYY-MM-dd')) \
-                    .copyProperties(image, image.propertyNames())
-
-    # Coleção PDSI (TERRACLIMATE)
-    pdsi = ee.ImageCollection("IDAHO_EPSCOR/TERRACLIMATE") \
-                .select('pdsi') \
-                .map(scale_pdsi) \
-                .filter(ee.Filter.date(startDate, endDate)) \
-                .filterBounds(roi)
-
-    # Redução espacial - cálculo de média por ROI
-    def stats_pdsi(image):
-        reduce = image.reduceRegions(**{
-            'collection': roi,
-            'reducer': ee.Reducer.mean(),
-            'scale': 5000
-        })
-
-        reduce = reduce.map(lambda f: f.set({'data': image.get('data')}))
-        return reduce.copyProperties(image, image.propertyNames())
-
-    # Reduz, ordena e renomeia colunas
-    stats_reduce = pdsi.map(stats_pdsi) \
-                    .flatten() \
-                    .sort('data', True) \
-                    .select(['data', 'mean'], ['data', 'pdsi'])
-
-    # Converte os dados para DataFrame
-    df_pdsi = geemap.ee_to_df(stats_reduce)
-
-    # Conversão de data para datetime
-    df_pdsi['data'] = pd.to_datetime(df_pdsi['data'])
-
-    # Extração de mês e ano
-    df_pdsi['mes'] = df_pdsi['data'].dt.month
-    df_pdsi['ano'] = df_pdsi['data'].dt.year
-
-    # ========================== VISUALIZAÇÃO PDSI ===========================
-
-    # Gráfico de calor (ano x mês) com intensidade do PDSI
-    alt_heat = alt.Chart(df_pdsi).mark_rect().encode(
-        x='ano:O',
-        y='mes:O',
-        color=alt.Color('mean(pdsi):Q', scale=alt.Scale(scheme='redblue', domain=(-5, 5))),
-        tooltip=[
-            alt.Tooltip('ano:O', title='Year'),
-            alt.Tooltip('mes:O', title='Month'),
-            alt.Tooltip('mean(pdsi):Q', title='PDSI')
-        ]
-    ).properties(
-        title='Mapa de Calor do Índice de Severidade de Seca Padrão (PDSI)',
-        width=600,
-        height=300
-    )
-
-    # Gráfico de barras temporais (linha do tempo PDSI)
-    alt_time = alt.Chart(df_pdsi).mark_bar(size=1).encode(
-        x='data:T',
-        y='pdsi:Q',
-        color=alt.Color('pdsi:Q', scale=alt.Scale(scheme='redblue', domain=(-5, 5))),
-        tooltip=[
-            alt.Tooltip('data:T', title='Date'),
-            alt.Tooltip('pdsi:Q', title='PDSI')
-        ]
-    ).properties(
-        title='Série histórica Índice de Severidade de Seca Padrão (PDSI)',
-        width=600,
-        height=300
-    )
-
-    # ======================= INDICADORES (EXCEDENTE / DÉFICIT HÍDRICO) ==========================
-
-    # Layout padrão do gráfico de indicadores
-    layout = go.Layout(
-        width=800,
-        height=400,
-        margin=dict(t=50, b=50, l=50, r=50),
-    )
-
-    # Calcula a média da coluna 'water_balance'
-    mean_water_balance = df['water_balance'].mean()
-
-    # Remove o sufixo de hora para melhor visualização textual
-    df['data'] = pd.to_datetime(df['data']).dt.date
-
-    # Verifica excedente e déficit com base na média
-    excess = df['water_balance'] > mean_water_balance
-    deficit = df['water_balance'] < mean_water_balance
-
-    # Obtém os extremos de excedente e déficit e suas datas
-    max_excess_value = df.loc[excess, 'water_balance'].max()
-    max_excess_date = df.loc[df['water_balance'] == max_excess_value, 'data'].values[0]
-
-    min_deficit_value = df.loc[deficit, 'water_balance'].min()
-    min_deficit_date = df.loc[df['water_balance'] == min_deficit_value, 'data'].values[0]
-
-    # Criação do gráfico com indicadores
-    fig_2 = go.Figure(layout=layout)
-
-    # Indicador: Excedente Hídrico
-    fig_2.add_trace(go.Indicator(
-        mode="number+delta+gauge",
-        value=max_excess_value,  # Maior valor de excedente hídrico
-        delta={'reference': mean_water_balance},  # Comparação com a média
-        gauge={
-            'axis': {'visible': True, 'range': [None, df['water_balance'].max()]},
-            'steps': [{'range': [mean_water_balance, df['water_balance'].max()], 'color': "lightgray"}],
-            'threshold': {
-                'line': {'color': "green", 'width': 4},
-                'thickness': 0.75,
-                'value': mean_water_balance
-            }
-        },
-        title={"text": f"Excedente hídrico (Data: {max_excess_date})"},
-        domain={'x': [0, 0.5], 'y': [0, 1]}
-    ))
-
-    # Indicador: Déficit Hídrico
-    fig_2.add_trace(go.Indicator(
-        mode="number+delta+gauge",
-        value=min_deficit_value,  # Menor valor de déficit
-        delta={'reference': mean_water_balance},
-        gauge={
-            'axis': {'visible': True, 'range': [None, df['water_balance'].max()]},
-            'steps': [{'range': [df['water_balance'].min(), mean_water_balance], 'color': "lightgray"}],
-            'threshold': {
-                'line': {'color': "red", 'width': 4},
-                'thickness': 0.75,
-                'value': mean_water_balance
-            }
-        },
-        title={"text": f"Déficit (Data: {min_deficit_date})"},
-        domain={'x': [0.5, 1], 'y': [0, 1]}
-    ))
-
-
-    ############## Dados principais ###################################################
-
-    # Calcular valores máximos, médios e mínimos para ET, Precipitação e PDSI
-    max_et = df['ET'].max()
-    min_et = df['ET'].min()
-    mean_et = df['ET'].mean()
-
-    max_precipitation = df['precipitation'].max()
-    min_precipitation = df['precipitation'].min()
-    mean_precipitation = df['precipitation'].mean()
-
-    max_pdsi = df_pdsi['pdsi'].max()
-    min_pdsi = df_pdsi['pdsi'].min()
-    mean_pdsi = df_pdsi['pdsi'].mean()
+        # Mapa de calor PDSI por mês/ano
+        with col8:
+            st.altair_chart(alt_heat, theme="streamlit", use_container_width=True)
 
+    # Layout das seções (preenchidas à medida que os resultados chegam)
     # Layout de 3 colunas para mostrar métricas principais
     col1, col2, col3 = st.columns(3)
 
-    # Inserir os valores calculados nas colunas com formato de métricas
-    col1.metric("ET", f"Mín: {min_et:.2f}, Méd: {mean_et:.2f}, Máx: {max_et:.2f}", "")
-    col2.metric("Precipitação", f"Mín: {min_precipitation:.2f}, Méd: {mean_precipitation:.2f}, Máx: {max_precipitation:.2f}", "")
-    col3.metric("PDSI", f"Mín: {min_pdsi:.2f}, Méd: {mean_pdsi:.2f}, Máx: {max_pdsi:.2f}", "")
-
     # Separador visual
     st.divider()
 
     # Layout de 3 colunas para visualização dos gráficos e da tabela
     col4, col5, col6 = st.columns([0.3, 0.3, 0.4])
 
-    # Gráfico da série histórica do balanço hídrico
-    with col4:
-        st.subheader('📈 Balanço Hídrico - Série Histórica')
-        st.plotly_chart(fig, use_container_width=True)
-
-    # Exibição da tabela com dados extraídos
-    with col5:
-        st.subheader("🗃Tabela de dados")
-        st.dataframe(df, height=500)
-
-    # Gráfico dos indicadores de excedente e déficit
-    with col6:
-        st.subheader('📈 Análise Hídrica (P-ET)')
-        st.plotly_chart(fig_2, use_container_width=True)
-
     # Seção PDSI
     st.subheader('Índice de Seca PDSI', divider='blue')
 
     # Layout com dois gráficos: linha do tempo e mapa de calor
     col7, col8 = st.columns([0.5, 0.5])
 
-    # Gráfico temporal do PDSI
-    with col7:
-        st.altair_chart(alt_time, theme="streamlit", use_container_width=True)
-
-    # Mapa de calor PDSI por mês/ano
-    with col8:
-        st.altair_chart(alt_heat, theme="streamlit", use_container_width=True)
-
-    # Seção final: visualização espacial das médias
-    st.subheader('Visualização das imagens', divider='blue')
-
-    # Centraliza o mapa na ROI com zoom ajustado
-    m.centerObject(roi, 13)
-
-    # Adiciona camadas ao mapa: ROI, PDSI médio, ET médio e Precipitação média
-    m.addLayer(roi, {}, 'Região de Interesse')
-    m.addLayer(pdsi.mean(), {
-        'palette': ['red', 'orange', 'cyan', 'blue'],
-        'min': -1,
-        'max': 2
-    }, 'PDSI')
-
-    m.addLayer(waterBalanceResult.select('ET').mean(), {
-        'palette': ['red', 'orange', 'cyan', 'blue'],
-        'min': 0,
-        'max': 100
-    }, 'ET')
-
-    m.addLayer(waterBalanceResult.select('precipitation').mean(), {
-        'palette': ['red', 'orange', 'cyan', 'blue'],
-        'min': 0,
-        'max': 100
-    }, 'Precipitation')
-
     # Expander na barra lateral com resumo das imagens utilizadas
     expander = st.sidebar.expander('Clique para saber mais')
-    size_collection = waterBalanceResult.size().getInfo()
-    expander.write(
-        f"""
-        Para a análise de dados de estão sendo utilizadas {size_collection} imagens.
-        """
-    )
+
+    if dados_locais:
+        # Séries a partir de dados locais
+        from backend_local import series_locais, estatisticas_por_feicao_local
+
+        # Mesma análise sobre as pilhas locais (GeoTIFF/Zarr), sem consultas ao Earth Engine
+        with st.spinner('Processando os dados locais...'):
+            df, df_pdsi = series_locais(roi_geojson, year_start, year_end, diretorio_local)
+        expander.write(f"Dados locais de {diretorio_local}: {len(df)} meses de balanço hídrico.")
+        exibir_balanco(df)
+        exibir_pdsi(df_pdsi)
+    else:
+        import geemap.foliumap as geemap  # Conversão das coleções do EE em DataFrame
+        from utils_clima import criar_colecoes, estatisticas_por_feicao, RESOLUCOES_NATIVAS  # Coleções mensais e estatísticas por feição
+        from cache_series import series_com_cache  # Cache local (SQLite) das séries mensais
+
+        # Coleções mensais do balanço hídrico (P, ET e P - ET) e do PDSI
+        waterBalanceResult, pdsi = criar_colecoes(roi, year_start, year_end)
+
+        # Escala e tileScale planejados pelo orçamento de pixels: área da ROI, resolução do dataset mais
+        # fino (MOD16) e as bandas de um mês. A escala não depende do período (é a chave do cache de
+        # séries: estender as datas não invalida os meses já consultados); na requisição única os meses
+        # são agrupados em blocos que cabem no orçamento
+        plano_escala = planejar_escala(area_geojson_m2(roi_geojson), min(RESOLUCOES_NATIVAS.values()), qtd_bandas=4)
+        meses_por_requisicao = max(1, int(ORCAMENTO_PIXELS_PADRAO // max(plano_escala['pixels'], 1)))
+
+        ## Funções de extração (executadas em paralelo, fora da thread do Streamlit)
+        def serie_balanco_por_imagem(escala, tile_scale):
+            ## Função para extrair estatísticas das imagens
+            def stats(image):
+                reduce = image.reduceRegions(**{
+                    'collection': roi,
+                    'reducer': ee.Reducer.mean(),
+                    'scale': escala,
+                    'tileScale': tile_scale
+                })
+
+                reduce = reduce \
+                    .map(lambda f: f.set({'data': image.get('data')})) \
+                    .map(lambda f: f.set({'year': image.get('year')})) \
+                    .map(lambda f: f.set({'month': image.get('month')}))
+
+                return reduce.copyProperties(image, image.propertyNames())
+
+            # Converter para df
+            col_bands = waterBalanceResult  # .select(bands)
+
+            # Aplicar estatísticas
+            stats_reduce = col_bands.map(stats) \
+                .flatten() \
+                .sort('data', True)
+
+            return geemap.ee_to_df(stats_reduce)
+
+        ######################## PDSI - Palmer Drought Severity Index ###############################
+
+        def serie_pdsi_por_imagem(escala, tile_scale):
+            # Redução espacial - cálculo de média por ROI
+            def stats_pdsi(image):
+                reduce = image.reduceRegions(**{
+                    'collection': roi,
+                    'reducer': ee.Reducer.mean(),
+                    'scale': escala,
+                    'tileScale': tile_scale
+                })
+
+                reduce = reduce.map(lambda f: f.set({'data': image.get('data')}))
+                return reduce.copyProperties(image, image.propertyNames())
+
+            # Reduz, ordena e renomeia colunas
+            stats_reduce = pdsi.map(stats_pdsi) \
+                            .flatten() \
+                            .sort('data', True) \
+                            .select(['data', 'mean'], ['data', 'pdsi'])
+
+            # Converte os dados para DataFrame
+            return geemap.ee_to_df(stats_reduce)
+
+        # Camadas do mapa: ROI, PDSI médio, ET médio e Precipitação média
+        camadas = {
+            'Região de Interesse': (ee.FeatureCollection(roi).style(color='0000FF', fillColor='00000000', width=2), {}),
+            'PDSI': (pdsi.mean(), {
+                'palette': ['red', 'orange', 'cyan', 'blue'],
+                'min': -1,
+                'max': 2
+            }),
+            'ET': (waterBalanceResult.select('ET').mean(), {
+                'palette': ['red', 'orange', 'cyan', 'blue'],
+                'min': 0,
+                'max': 100
+            }),
+            'Precipitation': (waterBalanceResult.select('precipitation').mean(), {
+                'palette': ['red', 'orange', 'cyan', 'blue'],
+                'min': 0,
+                'max': 100
+            }),
+        }
+
+        # Todas as consultas ao Earth Engine são independentes: são disparadas em paralelo e a latência
+        # total passa a ser a da consulta mais lenta
+        with executor_da_sessao(max_workers=8) as executor:
+            futuros = {}
+            if modo_extracao == MODOS_EXTRACAO[0]:
+                # Todas as séries (P, ET, P - ET e PDSI) em uma única requisição (imagem multibanda) por
+                # bloco de meses, consultando no Earth Engine apenas os meses que ainda não estão no cache local
+                # Reduções repetidas em escala mais grossa se o EE falhar por tempo/pixels/memória
+                def serie_com_cache(escala, tile_scale):
+                    return series_com_cache(roi, roi_geojson, year_start, year_end, scale=escala, tile_scale=tile_scale,
+                                            meses_por_requisicao=meses_por_requisicao)
+
+                futuros[executor.submit(executar_com_fallback, serie_com_cache, plano_escala)] = ('series', None)
+            else:
+                futuros[executor.submit(executar_com_fallback, serie_balanco_por_imagem, plano_escala)] = ('balanco', None)
+                futuros[executor.submit(executar_com_fallback, serie_pdsi_por_imagem, plano_escala)] = ('pdsi', None)
+            futuros[executor.submit(waterBalanceResult.size().getInfo)] = ('tamanho', None)
+            for nome, (imagem, vis) in camadas.items():
+                # Map IDs em cache: camadas já vistas não voltam ao servidor
+                futuros[executor.submit(map_id_em_cache, imagem, vis)] = ('camada', nome)
+
+            with st.spinner('Consultando o Earth Engine...'):
+                for futuro in as_completed(futuros):
+                    tipo, nome = futuros[futuro]
+                    resultado = futuro.result()
+                    if tipo == 'series':
+                        (df, df_pdsi, contagem_cache), plano_usado = resultado
+                        st.sidebar.caption(
+                            f"Cache de séries: {contagem_cache['acertos']} meses do cache, "
+                            f"{contagem_cache['faltas']} meses consultados no Earth Engine"
+                        )
+                        st.sidebar.caption(descrever_plano(plano_usado))
+                        exibir_balanco(df)
+                        exibir_pdsi(df_pdsi)
+                    elif tipo == 'balanco':
+                        df, plano_usado = resultado
+                        st.sidebar.caption(descrever_plano(plano_usado))
+                        exibir_balanco(df)
+                    elif tipo == 'pdsi':
+                        exibir_pdsi(resultado[0])
+                    elif tipo == 'tamanho':
+                        expander.write(
+                            f"""
+                            Para a análise de dados de estão sendo utilizadas {resultado} imagens.
+                            """
+                        )
+                    # 'camada': o map ID já está no cache de tiles (usado abaixo)
+
+        # Seção final: visualização espacial das médias
+        st.subheader('Visualização das imagens', divider='blue')
+
+        # Centraliza o mapa na ROI com zoom ajustado
+        m.centerObject(roi, 13)
+
+        # Adiciona as camadas a partir dos map IDs já obtidos (sem nova consulta ao servidor)
+        for nome, (imagem, vis) in camadas.items():
+            adicionar_camada_ee(m, imagem, vis, nome)
+
+    # Estatísticas por feição (tabela longa: feature_id, data, variavel, valor)
+    if por_feicao:
+        st.subheader('Estatísticas por feição', divider='blue')
+        with st.spinner(f'Calculando as estatísticas de {len(feicoes_roi)} feições...'):
+            if dados_locais:
+                df_feicoes = estatisticas_por_feicao_local(feicoes_roi, year_start, year_end, diretorio_local)
+            else:
+                def estatisticas_feicoes(escala, tile_scale):
+                    return estatisticas_por_feicao(feicoes_roi, year_start, year_end, scale=escala, tile_scale=tile_scale)
+
+                # Cada feição é menor que a ROI inteira: o plano da ROI é um limite seguro
+                df_feicoes, _ = executar_com_fallback(estatisticas_feicoes, plano_escala)
+
+        # Um gráfico por variável (abas não disparam nova execução do script)
+        variaveis = ['precipitation', 'ET', 'water_balance', 'pdsi']
+        for aba, variavel in zip(st.tabs(variaveis), variaveis):
+            aba.altair_chart(
+                alt.Chart(df_feicoes[df_feicoes['variavel'] == variavel]).mark_line().encode(
+                    x='data:T',
+                    y=alt.Y('valor:Q', title=variavel),
+                    color=alt.Color('feature_id:N', legend=None),
+                    tooltip=['feature_id', 'data:T', 'valor:Q']
+                ).properties(height=300),
+                theme="streamlit", use_container_width=True
+            )
+        st.dataframe(df_feicoes, height=300)
+        st.download_button(
+            "📥 Baixar estatísticas por feição (CSV)",
+            data=df_feicoes.to_csv(index=False),
+            file_name="estatisticas_por_feicao.csv",
+            mime="text/csv"
+        )
 
 # # Exibe o mapa no Streamlit
 # Exibe o mapa no Streamlit apenas se 'm' existir
 if 'm' in locals():
     m.to_streamlit()
+
+# Tempo desta execução do script (partida a frio ou reexecução)
+exibir_tempo_execucao('climate_st', inicio_script)
     
 # if st.sidebar.button("🔁 Nova análise"):
 #     st.session_state.clear()
@@ -0,0 +1,318 @@
+"""
+Coleções mensais de precipitação (CHIRPS), evapotranspiração (MOD16) e PDSI (TERRACLIMATE) e
+extração das estatísticas por feição da ROI.
+"""
+import json
+
+import ee
+import pandas as pd
+
+# Limite de elementos retornados por uma consulta getInfo de FeatureCollection no Earth Engine
+LIMITE_ELEMENTOS_EE = 5000
+
+# Tamanho máximo (bytes) das geometrias enviadas em cada lote
+LIMITE_BYTES_LOTE = 256 * 1024
+
+BANDAS_BALANCO = ['precipitation', 'ET', 'water_balance']
+
+# Resolução nativa (m) de cada dataset
+RESOLUCOES_NATIVAS = {
+    'CHIRPS': 5566,
+    'MOD16': 500,
+    'TERRACLIMATE': 4638,
+}
+
+
+def compor_mensal(colecao, redutor, inicio, fim, roi):
+    """
+    Compõe imagens mensais de uma ImageCollection qualquer.
+
+    Os meses são gerados a partir de uma única lista de datas de início (ee.List.sequence) e cada
+    composição usa filterDate no intervalo [mês, mês seguinte). Meses sem imagens são descartados no
+    servidor (ee.List.map com dropNulls).
+
+    Args:
+        colecao (ee.ImageCollection): Coleção de origem.
+        redutor (ee.Reducer): Redutor temporal (ex.: ee.Reducer.sum(), ee.Reducer.mean()).
+        inicio (ee.Date): Data inicial.
+        fim (ee.Date): Data final (exclusiva).
+        roi (ee.Geometry | ee.FeatureCollection): Região de interesse (filtro e recorte).
+
+    Returns:
+        ee.ImageCollection com as propriedades year, month, data e system:time_start
+    """
+    colecao = colecao.filterDate(inicio, fim).filterBounds(roi)
+    qtd_meses = fim.difference(inicio, 'month').round()
+    meses = ee.List.sequence(0, qtd_meses.subtract(1)).map(lambda k: inicio.advance(k, 'month'))
+    # O redutor acrescenta um sufixo às bandas (ex.: precipitation_sum): mantém os nomes originais
+    bandas = colecao.first().bandNames()
+
+    def compor(data_mes):
+        data_mes = ee.Date(data_mes)
+        filtrada = colecao.filterDate(data_mes, data_mes.advance(1, 'month'))
+        imagem = filtrada.reduce(redutor) \
+            .rename(bandas) \
+            .clip(roi) \
+            .set('year', data_mes.get('year')) \
+            .set('month', data_mes.get('month')) \
+            .set('data', data_mes.format()) \
+            .set('system:time_start', data_mes.millis()) \
+            .set('system:index', data_mes.format('YYYYMM'))
+        return ee.Algorithms.If(filtrada.size().gt(0), imagem, None)
+
+    return ee.ImageCollection.fromImages(meses.map(compor, dropNulls=True))
+
+
+def juntar_et(chirps_monthlyImages, mod16_monthlyImages):
+    """
+    Adiciona a banda ET (MOD16) às imagens mensais do CHIRPS com um único ee.Join por ano e mês.
+
+    Meses sem imagem MOD16 correspondente são descartados (junção interna).
+    """
+    filtro = ee.Filter.And(
+        ee.Filter.equals(leftField='year', rightField='year'),
+        ee.Filter.equals(leftField='month', rightField='month'),
+    )
+    pares = ee.Join.inner('chirps', 'mod16').apply(chirps_monthlyImages, mod16_monthlyImages, filtro)
+
+    def combinar(par):
+        chirps_image = ee.Image(par.get('chirps'))
+        return chirps_image.addBands([ee.Image(par.get('mod16')).rename('ET')])
+
+    return ee.ImageCollection(pares.map(combinar)).sort('system:time_start')
+
+
+def criar_colecoes(roi, year_start, year_end, metodo_et='join', inicio=None, fim=None):
+    """
+    Cria as coleções mensais do balanço hídrico (P, ET e P - ET) e do PDSI para a ROI.
+
+    Args:
+        roi (ee.Geometry | ee.FeatureCollection): Região de interesse.
+        year_start (int): Ano inicial.
+        year_end (int): Ano final (exclusivo).
+        metodo_et (String): 'join' (ee.Join por ano e mês) ou 'filtro' (busca da imagem MOD16 de
+            cada mês com filter().first(), implementação anterior mantida para comparação).
+        inicio, fim (String): Datas 'YYYY-MM-DD' do período (fim exclusivo); substituem os anos
+            quando informadas (ex.: apenas os meses que faltam no cache de séries).
+
+    Returns:
+        tuple (waterBalanceResult, pdsi)
+    """
+    ## Abrindo nossos dados
+    chirps = ee.ImageCollection("UCSB-CHG/CHIRPS/PENTAD").select('precipitation')
+
+    # Definindo a função de escala
+    def scale_mod16(image):
+        return image.multiply(0.1).copyProperties(image, image.propertyNames())
+
+    mod16 = ee.ImageCollection("MODIS/061/MOD16A2GF").select('ET').map(scale_mod16)
+
+    # Parâmetros para padronização temporal
+    startDate = ee.Date(inicio) if inicio else ee.Date.fromYMD(year_start, 1, 1)
+    endDate = ee.Date(fim) if fim else ee.Date.fromYMD(year_end, 1, 1)
+
+    # Composições mensais (soma de P e ET); meses sem imagens são descartados no servidor
+    chirps_monthlyImages = compor_mensal(chirps, ee.Reducer.sum(), startDate, endDate, roi)
+    mod16_monthlyImages = compor_mensal(mod16, ee.Reducer.sum(), startDate, endDate, roi)
+
+    ## Cálculo do Balanço Hídrico
+    def calculateWaterBalance(image):
+        P = image.select('precipitation')
+        ET = image.select('ET')
+        waterBalance = P.subtract(ET)
+        return image.addBands([waterBalance.rename('water_balance')])
+
+    # Adicionar bandas de precipitação e evapotranspiração às imagens CHIRPS
+    def addETBands(image):
+        ET_image = mod16_monthlyImages \
+            .filter(ee.Filter.eq('year', image.get('year'))) \
+            .filter(ee.Filter.eq('month', image.get('month'))) \
+            .first()
+        return image.addBands([ET_image.rename('ET')])
+
+    # Aplica as funções
+    if metodo_et == 'filtro':
+        waterBalanceWithBands = chirps_monthlyImages.map(addETBands)
+    else:
+        waterBalanceWithBands = juntar_et(chirps_monthlyImages, mod16_monthlyImages)
+    waterBalanceResult = waterBalanceWithBands.map(calculateWaterBalance)
+
+    ######################## PDSI - Palmer Drought Severity Index ###############################
+
+    # Função para aplicar escala nas imagens PDSI
+    def scale_pdsi(image):
+        return image.multiply(0.01).copyProperties(image, image.propertyNames())
+
+    # Coleção PDSI (TERRACLIMATE, já mensal: a média preserva o valor do mês)
+    terraclimate = ee.ImageCollection("IDAHO_EPSCOR/TERRACLIMATE").select('pdsi').map(scale_pdsi)
+    pdsi = compor_mensal(terraclimate, ee.Reducer.mean(), startDate, endDate, roi)
+
+    return waterBalanceResult, pdsi
+
+
+def dividir_em_lotes(feicoes, qtd_meses, limite_elementos=LIMITE_ELEMENTOS_EE, limite_bytes=LIMITE_BYTES_LOTE):
+    """
+    Divide as feições em lotes que respeitam o limite de elementos (feições x meses) e o tamanho
+    das geometrias enviadas em cada requisição.
+
+    Returns:
+        list de listas de feições
+    """
+    max_feicoes = max(1, limite_elementos // max(1, qtd_meses))
+
+    lotes, lote, bytes_lote = [], [], 0
+    for feicao in feicoes:
+        tamanho = len(json.dumps(feicao['geometry']))
+        if lote and (len(lote) >= max_feicoes or bytes_lote + tamanho > limite_bytes):
+            lotes.append(lote)
+            lote, bytes_lote = [], 0
+        lote.append(feicao)
+        bytes_lote += tamanho
+    if lote:
+        lotes.append(lote)
+    return lotes
+
+
+def estatisticas_lote(lote, year_start, year_end, scale=5000, tile_scale=1):
+    """
+    Calcula P, ET, P - ET e PDSI mensais (média) de cada feição do lote.
+
+    Returns:
+        DataFrame longo com feature_id, data, variavel e valor
+    """
+    fc = ee.FeatureCollection([
+        ee.Feature(ee.Geometry(feicao['geometry']), {'feature_id': feicao['id']}) for feicao in lote
+    ])
+    waterBalanceResult, pdsi = criar_colecoes(fc, year_start, year_end)
+
+    def reduzir(colecao, bandas):
+        def por_imagem(image):
+            return image.select(bandas).reduceRegions(**{
+                'collection': fc,
+                'reducer': ee.Reducer.mean(),
+                'scale': scale,
+                'tileScale': tile_scale
+            }).map(lambda f: f.set({'data': image.get('data')}))
+
+        # Com uma única banda o redutor grava a propriedade 'mean'
+        saidas = bandas if len(bandas) > 1 else ['mean']
+
+        # Apenas as propriedades (sem geometria) voltam do servidor
+        return colecao.map(por_imagem).flatten() \
+            .select(['feature_id', 'data'] + saidas, ['feature_id', 'data'] + bandas, False)
+
+    tabelas = []
+    for colecao, bandas in [(waterBalanceResult, BANDAS_BALANCO), (pdsi, ['pdsi'])]:
+        linhas = [f['properties'] for f in reduzir(colecao, bandas).getInfo()['features']]
+        tabela = pd.DataFrame(linhas)
+        if tabela.empty:
+            continue
+        tabela['data'] = pd.to_datetime(tabela['data']).dt.to_period('M').dt.to_timestamp()
+        tabelas.append(tabela.melt(id_vars=['feature_id', 'data'], var_name='variavel', value_name='valor'))
+
+    if not tabelas:
+        return pd.DataFrame(columns=['feature_id', 'data', 'variavel', 'valor'])
+    return pd.concat(tabelas, ignore_index=True)
+
+
+def estatisticas_por_feicao(feicoes, year_start, year_end, scale=5000, max_workers=4, tile_scale=1):
+    """
+    Calcula P, ET, P - ET e PDSI mensais para cada feição da ROI, em lotes executados em paralelo.
+
+    Args:
+        feicoes (list): Feições GeoJSON da ROI.
+        year_start (int): Ano inicial.
+        year_end (int): Ano final (exclusivo).
+        scale (int): Escala (m) da redução.
+        max_workers (int): Lotes processados simultaneamente.
+        tile_scale (int): tileScale da redução.
+
+    Returns:
+        DataFrame longo com feature_id, data, variavel e valor
+    """
+    feicoes = [{**feicao, 'id': str(feicao.get('id', posicao))} for posicao, feicao in enumerate(feicoes)]
+    qtd_meses = 12 * max(1, year_end - year_start)
+    lotes = dividir_em_lotes(feicoes, qtd_meses)
+    if not lotes:
+        return pd.DataFrame(columns=['feature_id', 'data', 'variavel', 'valor'])
+
+    # Threads com o contexto da sessão do Streamlit (chamadas ao EE contadas na sessão)
+    from comum.ee_inicializacao import executor_da_sessao
+
+    with executor_da_sessao(max_workers) as executor:
+        tabelas = list(executor.map(lambda lote: estatisticas_lote(lote, year_start, year_end, scale, tile_scale), lotes))
+
+    return pd.concat(tabelas, ignore_index=True) \
+        .sort_values(['feature_id', 'data', 'variavel'], ignore_index=True)
+
+
+def indexar_por_mes(image):
+    """Define o system:index da imagem como 'YYYYMM' (prefixo das bandas no toBands)."""
+    return image.set('system:index', ee.Date(image.get('system:time_start')).format('YYYYMM'))
+
+
+def valores_serie_unica(waterBalanceResult, pdsi, roi, scale=5000, tile_scale=1):
+    """
+    Reduz as séries mensais de P, ET, P - ET e PDSI em uma única requisição.
+
+    As imagens mensais são empilhadas (toBands) em uma imagem multibanda com bandas 'YYYYMM_banda'
+    e reduzidas por um único reduceRegion (média na ROI inteira).
+
+    Returns:
+        dict 'YYYYMM_banda' -> valor
+    """
+    empilhada = waterBalanceResult.select(BANDAS_BALANCO).map(indexar_por_mes).toBands() \
+        .addBands(pdsi.map(indexar_por_mes).toBands())
+
+    return empilhada.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=ee.FeatureCollection(roi).geometry(),
+        scale=scale,
+        maxPixels=1e13,
+        tileScale=tile_scale
+    ).getInfo()
+
+
+def series_de_valores(valores):
+    """
+    Converte os valores 'YYYYMM_banda' nas tabelas usadas pelos gráficos.
+
+    Returns:
+        tuple (df, df_pdsi) com as mesmas colunas usadas pelos gráficos do modo por imagem
+    """
+    serie = pd.Series(valores, dtype=float)
+    if serie.empty:
+        return (pd.DataFrame(columns=['data', 'year', 'month'] + BANDAS_BALANCO),
+                pd.DataFrame(columns=['data', 'pdsi']))
+
+    chaves = serie.index.str.split('_', n=1)
+    tabela = pd.DataFrame({
+        'mes': [chave[0] for chave in chaves],
+        'banda': [chave[1] for chave in chaves],
+        'valor': serie.to_numpy(),
+    }).pivot(index='mes', columns='banda', values='valor').sort_index()
+    datas = pd.to_datetime(tabela.index, format='%Y%m')
+
+    df = pd.DataFrame({
+        'data': datas.strftime('%Y-%m-%dT%H:%M:%S'),
+        'year': datas.year,
+        'month': datas.month,
+    })
+    for banda in BANDAS_BALANCO:
+        df[banda] = tabela[banda].to_numpy() if banda in tabela else float('nan')
+    df = df.dropna(subset=BANDAS_BALANCO, how='all').reset_index(drop=True)
+
+    df_pdsi = pd.DataFrame({'data': datas.strftime('%Y-%m-%d'),
+                            'pdsi': tabela['pdsi'].to_numpy() if 'pdsi' in tabela else float('nan')})
+    df_pdsi = df_pdsi.dropna(subset=['pdsi']).reset_index(drop=True)
+    return df, df_pdsi
+
+
+def extrair_serie_unica(waterBalanceResult, pdsi, roi, scale=5000, tile_scale=1):
+    """
+    Extrai as séries mensais de P, ET, P - ET e PDSI em uma única requisição (toBands + reduceRegion).
+
+    Returns:
+        tuple (df, df_pdsi) com as mesmas colunas usadas pelos gráficos do modo por imagem
+    """
+    return series_de_valores(valores_serie_unica(waterBalanceResult, pdsi, roi, scale, tile_scale))
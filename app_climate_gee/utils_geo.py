@@ -1,34 +1,69 @@
 # utils_geo.py
 
 import os
-import io
-import tempfile
+import sys
+import time
 from zipfile import ZipFile
  
 import fiona
+from fiona.io import MemoryFile, ZipMemoryFile
 import geopandas as gpd
 import pandas as pd
-from shapely.geometry import Polygon, MultiPolygon
+import shapely
 
 
-def convert_3D_2D(geometry):
+def convert_3D_2D(geometrias):
     """
-    Converte uma geometria 3D em 2D.
+    Converte geometrias 3D em 2D.
+
+    Operação vetorizada do shapely 2 sobre toda a GeoSeries (ou sobre uma geometria isolada).
+    Funciona para polígonos, multipolígonos, linhas e pontos e mantém os buracos (anéis internos).
     """
-    if geometry.has_z:
-        if geometry.geom_type == 'Polygon':
-            return Polygon([(x, y) for x, y, z in geometry.exterior.coords])
-        elif geometry.geom_type == 'MultiPolygon':
-            new_polygons = []
-            for polygon in geometry.geoms:
-                new_polygons.append(Polygon([(x, y) for x, y, z in polygon.exterior.coords]))
-            return MultiPolygon(new_polygons)
-    return geometry
-
-
-def convert_to_geodf(uploaded_file):
+    if isinstance(geometrias, gpd.GeoSeries):
+        return gpd.GeoSeries(shapely.force_2d(geometrias.to_numpy()), index=geometrias.index, crs=geometrias.crs)
+    return shapely.force_2d(geometrias)
+
+
+def ler_colecao(colecao):
     """
-    Converte arquivos geográficos enviados (GeoJSON, SHP, KML, KMZ, GPKG, ZIP) para GeoDataFrame 2D.
+    Converte uma coleção aberta pelo fiona em GeoDataFrame.
+    """
+    return gpd.GeoDataFrame.from_features(colecao, crs=colecao.crs)
+
+
+def pico_rss_mb():
+    """
+    Pico de memória residente (RSS) do processo em MB, incluindo os buffers do GDAL (/vsimem/).
+
+    Returns:
+        float, ou None onde o módulo resource não existe (Windows)
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss em KB no Linux e em bytes no macOS
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+
+def caminho_no_zip(zip_memoria, nome):
+    """
+    Caminho GDAL de um arquivo dentro do ZipMemoryFile.
+
+    No fiona 1.10 o name já começa com /vsizip/; nas versões anteriores é o caminho /vsimem/ do ZIP.
+    """
+    if zip_memoria.name.startswith('/vsizip/'):
+        return f"{zip_memoria.name}/{nome}"
+    return f"/vsizip{zip_memoria.name}/{nome}"
+
+
+def ler_camadas(uploaded_file):
+    """
+    Lê todas as camadas do arquivo enviado em memória.
+
+    Returns:
+        tuple (lista de GeoDataFrames, tamanho do arquivo em bytes)
     """
     file_extension = os.path.splitext(uploaded_file.name)[1].lower()
     gdf_list = []
@@ -38,38 +73,70 @@ def convert_to_geodf(uploaded_file):
     fiona.drvsupport.supported_drivers['libkml'] = 'rw'
     fiona.drvsupport.supported_drivers['LIBKML'] = 'rw'
 
-    # KMZ (extração de arquivos internos)
-    if file_extension == '.kmz':
-        with tempfile.TemporaryDirectory() as extraction_dir:
-            with ZipFile(io.BytesIO(uploaded_file.getvalue()), 'r') as kmz:
-                kmz.extractall(extraction_dir)
-            for filename in os.listdir(extraction_dir):
-                if filename.lower().endswith('.kml'):
-                    kml_file_path = os.path.join(extraction_dir, filename)
-                    for layer in fiona.listlayers(kml_file_path):
-                        gdf = gpd.read_file(kml_file_path, layer=layer, driver='LIBKML')
-                        gdf_list.append(gdf)
-
-    # ZIP com shapefile completo
-    elif file_extension == '.zip':
-        with tempfile.TemporaryDirectory() as zip_dir:
-            with ZipFile(io.BytesIO(uploaded_file.getvalue()), 'r') as zip_ref:
-                zip_ref.extractall(zip_dir)
-            # Procura o .shp dentro da pasta descompactada
-            for file in os.listdir(zip_dir):
-                if file.endswith('.shp'):
-                    shp_path = os.path.join(zip_dir, file)
-                    gdf = gpd.read_file(shp_path)
-                    gdf_list.append(gdf)
+    # Bytes do upload
+    dados = uploaded_file.getvalue()
+
+    # KMZ e ZIP: leitura direta dos arquivos internos via /vsizip/, sem extração
+    if file_extension in ['.kmz', '.zip']:
+        # Apenas o diretório central do ZIP é lido para listar os arquivos internos
+        with ZipFile(uploaded_file) as arquivo_zip:
+            nomes = arquivo_zip.namelist()
+
+        with ZipMemoryFile(dados) as zip_memoria:
+            if file_extension == '.kmz':
+                for filename in nomes:
+                    if filename.lower().endswith('.kml'):
+                        caminho_kml = caminho_no_zip(zip_memoria, filename)
+                        for layer in fiona.listlayers(caminho_kml):
+                            with zip_memoria.open(filename, layer=layer, driver='LIBKML') as colecao:
+                                gdf_list.append(ler_colecao(colecao))
+            else:
+                # Procura o .shp dentro do ZIP
+                for file in nomes:
+                    if file.endswith('.shp'):
+                        with zip_memoria.open(file) as colecao:
+                            gdf_list.append(ler_colecao(colecao))
 
     elif file_extension in ['.kml', '.gpkg', '.geojson']:
-        gdf = gpd.read_file(io.BytesIO(uploaded_file.getvalue()))
-        gdf_list = [gdf]
+        with MemoryFile(dados, ext=file_extension) as arquivo_memoria:
+            # KML: todas as camadas (pastas) do arquivo, como no KMZ
+            camadas = fiona.listlayers(arquivo_memoria.name) if file_extension == '.kml' else [None]
+            for layer in camadas:
+                with arquivo_memoria.open(layer=layer) as colecao:
+                    gdf_list.append(ler_colecao(colecao))
 
     # OBS: não suportar .shp diretamente sem os demais componentes
     elif file_extension == '.shp':
         raise ValueError("Um arquivo .shp isolado não é suportado. Por favor, envie todos os arquivos em um .zip.")
 
+    return gdf_list, len(dados)
+
+
+def convert_to_geodf(uploaded_file, metricas=None):
+    """
+    Converte arquivos geográficos enviados (GeoJSON, SHP, KML, KMZ, GPKG, ZIP) para GeoDataFrame 2D.
+
+    Os arquivos são lidos em memória pelos sistemas de arquivos virtuais do GDAL (/vsimem/ e
+    /vsizip/), sem extrair os arquivos compactados em disco.
+
+    Args:
+        uploaded_file (UploadedFile): Arquivo enviado pelo st.file_uploader.
+        metricas (dict): Se informado, recebe o tamanho do arquivo (MB), o tempo de leitura (s), o pico
+            de memória residente do processo (MB) e quanto esse pico aumentou durante a leitura (MB).
+            As medidas de memória são omitidas onde o módulo resource não existe.
+    """
+    inicio = time.perf_counter()
+    pico_anterior = pico_rss_mb() if metricas is not None else None
+
+    gdf_list, tamanho_bytes = ler_camadas(uploaded_file)
+    if metricas is not None:
+        metricas['tamanho_mb'] = tamanho_bytes / 1024 ** 2
+        metricas['tempo_s'] = time.perf_counter() - inicio
+        if pico_anterior is not None:
+            pico = pico_rss_mb()
+            metricas['pico_memoria_mb'] = pico
+            metricas['aumento_pico_memoria_mb'] = pico - pico_anterior
+
     if gdf_list:
         combined_gdf = pd.concat(gdf_list, ignore_index=True)
         
@@ -80,7 +147,7 @@ def convert_to_geodf(uploaded_file):
             combined_gdf = combined_gdf.to_crs("EPSG:4326")
 
         # Remove coordenada Z se existir
-        combined_gdf['geometry'] = combined_gdf['geometry'].apply(convert_3D_2D)
+        combined_gdf['geometry'] = convert_3D_2D(combined_gdf.geometry)
 
         return combined_gdf
     else:
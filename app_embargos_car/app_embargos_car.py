@@ -1,14 +1,17 @@
 import streamlit as st
-from streamlit_folium import folium_static
 from streamlit_folium import st_folium
 import folium
 
+import os
+
 import pandas as pd
-import plotly.express as px
-import fiona
-import geopandas as gpd
 
 from proc import ler_geodataframe, selecionar_imovel_car, inserir_geojson_folium, mostrar_status
+from proc import construir_indice_espacial, selecionar_embargos_sobrepostos
+from proc import listar_codigos_imoveis, janela_imovel, ler_tabela_conformidade
+from proc import construir_indice_imoveis, selecionar_por_indice
+from proc import geojson_nivel_detalhe
+from proc import calcular_area_sobreposicao, memoria_camada, pico_memoria_mb, usar_leitura_sob_demanda
 
 # Configurações iniciais
 st.set_page_config(page_title="Embargos", layout="wide")
@@ -19,16 +22,27 @@ st.set_page_config(page_title="Embargos", layout="wide")
 gpkg_file = "app_embargos_car/car_embargos.gpkg"
 # Informar a coluna com a matrícula do imóvel rural
 coluna_matricula_imovel = 'cod_imovel'
+# Leitura sob demanda: lê apenas o imóvel selecionado e a sua vizinhança
+# (recomendado para exportações estaduais do CAR com milhões de polígonos).
+# Configurável por EMBARGOS_LEITURA_SOB_DEMANDA (variável de ambiente ou st.secrets); sem configuração,
+# é ativada quando area_imovel tem mais de LIMITE_FEICOES_LEITURA_COMPLETA imóveis
+leitura_sob_demanda = usar_leitura_sob_demanda(gpkg_file, 'area_imovel')
+# Tabela de conformidade pré-calculada (gerada por conformidade.py)
+arquivo_conformidade = "app_embargos_car/conformidade.parquet"
+
+if leitura_sob_demanda:
+    # Selecionar os códigos dos imóveis sem carregar as geometrias
+    cod_imoveis_car = listar_codigos_imoveis(gpkg_file, 'area_imovel', coluna_matricula_imovel)
+else:
+    # Leitura dos dados do CAR
+    area_imovel = ler_geodataframe(gpkg_file, 'area_imovel')
+    # Leitura dos dados Embargos IBAMA
+    embargos_ibama = ler_geodataframe(gpkg_file, 'embargos_ibama')
+    # Leitura dos dados Embargos ICMBio
+    embargos_icmbio = ler_geodataframe(gpkg_file, 'embargos_icmbio')
 
-# Leitura dos dados do CAR
-area_imovel = ler_geodataframe(gpkg_file, 'area_imovel')
-# Leitura dos dados Embargos IBAMA
-embargos_ibama = ler_geodataframe(gpkg_file, 'embargos_ibama')
-# Leitura dos dados Embargos ICMBio
-embargos_icmbio = ler_geodataframe(gpkg_file, 'embargos_icmbio')
-
-# Selecionar o códigos dos imóveis do INCRA
-cod_imoveis_car = area_imovel[coluna_matricula_imovel].unique()
+    # Selecionar o códigos dos imóveis do INCRA
+    cod_imoveis_car = area_imovel[coluna_matricula_imovel].unique()
 
 # Carregar os dados
 st.sidebar.title("Filtros")
@@ -38,12 +52,37 @@ codigo_imo_car_selecionado = st.sidebar.selectbox("Escolha o imóvel:", cod_imov
 
 # Escrever no sidebar o código do imóvel selecionado
 st.sidebar.write(f"Código do imóvel selecionado: {codigo_imo_car_selecionado}")
+
+if leitura_sob_demanda:
+    # Ler apenas as feições na janela ao redor do imóvel (R-tree do GeoPackage)
+    janela = janela_imovel(gpkg_file, 'area_imovel', codigo_imo_car_selecionado, coluna_matricula_imovel)
+    area_imovel = ler_geodataframe(gpkg_file, 'area_imovel', bbox=janela)
+    embargos_ibama = ler_geodataframe(gpkg_file, 'embargos_ibama', bbox=janela)
+    embargos_icmbio = ler_geodataframe(gpkg_file, 'embargos_icmbio', bbox=janela)
+
+# Índices código -> linhas das três camadas (criados uma única vez por camada)
+# Na leitura sob demanda a camada muda com a janela, que passa a fazer parte da chave do cache
+sufixo = f":{janela}" if leitura_sob_demanda else ""
+indice_area_imovel = construir_indice_imoveis(area_imovel, f"{gpkg_file}:area_imovel{sufixo}", coluna_matricula_imovel)
+indice_ibama = construir_indice_imoveis(embargos_ibama, f"{gpkg_file}:embargos_ibama{sufixo}", coluna_matricula_imovel)
+indice_icmbio = construir_indice_imoveis(embargos_icmbio, f"{gpkg_file}:embargos_icmbio{sufixo}", coluna_matricula_imovel)
+
 # Selecionar o imóvel do INCRA e retorna as coordenadas envolventes do imóvel
-gdf_car_selecionado, centro_lat, centro_lon, miny, maxy, minx, maxx = selecionar_imovel_car(area_imovel, codigo_imo_car_selecionado, coluna_matricula_imovel)
+gdf_car_selecionado, centro_lat, centro_lon, miny, maxy, minx, maxx = selecionar_imovel_car(area_imovel, codigo_imo_car_selecionado, coluna_matricula_imovel, indice_area_imovel)
+
+# Modo de verificação dos embargos
+verificar_sobreposicao = st.sidebar.checkbox("Verificar também sobreposição geométrica", value=True)
 
 # Selecionar os embargos
-gdf_embargo_ibama_selecionado = embargos_ibama[embargos_ibama[coluna_matricula_imovel]==codigo_imo_car_selecionado].copy()
-gdf_embargo_icmbio_selecionado = embargos_icmbio[embargos_icmbio[coluna_matricula_imovel]==codigo_imo_car_selecionado].copy()
+gdf_embargo_ibama_selecionado = selecionar_por_indice(embargos_ibama, indice_ibama, codigo_imo_car_selecionado)
+gdf_embargo_icmbio_selecionado = selecionar_por_indice(embargos_icmbio, indice_icmbio, codigo_imo_car_selecionado)
+
+# Selecionar os embargos que se sobrepõem ao imóvel, mesmo com código diferente ou ausente
+if verificar_sobreposicao:
+    arvore_ibama = construir_indice_espacial(embargos_ibama, f"{gpkg_file}:embargos_ibama{sufixo}")
+    arvore_icmbio = construir_indice_espacial(embargos_icmbio, f"{gpkg_file}:embargos_icmbio{sufixo}")
+    gdf_sobreposicao_ibama = selecionar_embargos_sobrepostos(embargos_ibama, gdf_car_selecionado, arvore_ibama)
+    gdf_sobreposicao_icmbio = selecionar_embargos_sobrepostos(embargos_icmbio, gdf_car_selecionado, arvore_icmbio)
 
 # Título centralizado usando HTML e CSS
 st.markdown(
@@ -63,8 +102,12 @@ centro_y = area_imovel.geometry.centroid.y.mean()
 # Iniciando o mapa Folium com CAR
 mapa = folium.Map(location=[centro_y, centro_x], zoom_start=10)
 
+# Nível de detalhe das camadas de acordo com a distância ao imóvel selecionado (o mapa abre ajustado
+# ao imóvel): resolução total na vizinhança, simplificação crescente nas feições mais distantes
+extensao_imovel = (minx, miny, maxx, maxy)
+
 # Gerar o mapa com dados do CAR
-mapa = inserir_geojson_folium(area_imovel[[coluna_matricula_imovel,'geometry']], coluna_matricula_imovel
+mapa = inserir_geojson_folium(geojson_nivel_detalhe(area_imovel, f"{gpkg_file}:area_imovel{sufixo}", [coluna_matricula_imovel], extensao_imovel), coluna_matricula_imovel
                               ,'Código do Imóvel'
                               ,'Área do Imóvel'
                               ,'white'
@@ -78,14 +121,14 @@ mapa = inserir_geojson_folium(gdf_car_selecionado[[coluna_matricula_imovel,'geom
                               ,mapa)
 
 # Gerar o mampa com Emabrgos IBAMA
-mapa = inserir_geojson_folium(embargos_ibama[[coluna_matricula_imovel,'geometry']], coluna_matricula_imovel
+mapa = inserir_geojson_folium(geojson_nivel_detalhe(embargos_ibama, f"{gpkg_file}:embargos_ibama{sufixo}", [coluna_matricula_imovel], extensao_imovel), coluna_matricula_imovel
                               ,'Código do Imóvel'
                               ,'Embargos IBAMA'
                               ,'red'
                               ,mapa)
 
 # Gerar o mampa com Emabrgos ICMBio
-mapa = inserir_geojson_folium(embargos_icmbio[[coluna_matricula_imovel,'geometry']], coluna_matricula_imovel
+mapa = inserir_geojson_folium(geojson_nivel_detalhe(embargos_icmbio, f"{gpkg_file}:embargos_icmbio{sufixo}", [coluna_matricula_imovel], extensao_imovel), coluna_matricula_imovel
                               ,'Código do Imóvel'
                               ,'Embargos ICMBio'
                               ,'orange'
@@ -103,14 +146,36 @@ st_folium(mapa, use_container_width=True, height=500)
 # Sidebar
 st.sidebar.title("📊 Conformidade")
 
-# Função para exibir status com emoji
-def mostrar_status(nome, status):
-    emoji = "✅" if status == 0 else "❌"
-    st.sidebar.write(f"{emoji} {nome}")
-
 # Exibir status
-mostrar_status(" Embargos IBAMA", gdf_embargo_ibama_selecionado.shape[0])
-mostrar_status(" Embargos ICMBio", gdf_embargo_icmbio_selecionado.shape[0])
+if verificar_sobreposicao:
+    mostrar_status(" Embargos IBAMA", gdf_embargo_ibama_selecionado.shape[0], gdf_sobreposicao_ibama.shape[0])
+    mostrar_status(" Embargos ICMBio", gdf_embargo_icmbio_selecionado.shape[0], gdf_sobreposicao_icmbio.shape[0])
+
+    # Tabelas com os embargos vinculados pelo código e/ou pela sobreposição geométrica
+    gdf_embargo_ibama_selecionado = embargos_ibama.loc[gdf_embargo_ibama_selecionado.index.union(gdf_sobreposicao_ibama.index)]
+    gdf_embargo_icmbio_selecionado = embargos_icmbio.loc[gdf_embargo_icmbio_selecionado.index.union(gdf_sobreposicao_icmbio.index)]
+else:
+    mostrar_status(" Embargos IBAMA", gdf_embargo_ibama_selecionado.shape[0])
+    mostrar_status(" Embargos ICMBio", gdf_embargo_icmbio_selecionado.shape[0])
+
+# Área embargada dentro do imóvel (projeção equivalente)
+for nome, gdf_embargo in [('IBAMA', gdf_embargo_ibama_selecionado), ('ICMBio', gdf_embargo_icmbio_selecionado)]:
+    area_imovel_ha, area_embargada_ha, percentual = calcular_area_sobreposicao(gdf_car_selecionado, gdf_embargo)
+    if area_embargada_ha > 0:
+        st.sidebar.write(f"Área embargada {nome}: {area_embargada_ha:.2f} ha ({percentual:.1f}% de {area_imovel_ha:.2f} ha)")
+
+# Resumo pré-calculado do imóvel (acesso direto pelo código)
+if os.path.exists(arquivo_conformidade):
+    tabela_conformidade = ler_tabela_conformidade(arquivo_conformidade, coluna_matricula_imovel)
+    if codigo_imo_car_selecionado in tabela_conformidade.index:
+        resumo = tabela_conformidade.loc[codigo_imo_car_selecionado]
+        for fonte, nome in [('ibama', 'IBAMA'), ('icmbio', 'ICMBio')]:
+            ultimo = resumo[f'data_ultimo_embargo_{fonte}']
+            st.sidebar.write(
+                f"**{nome}:** {resumo[f'qtd_embargos_{fonte}']} embargo(s), "
+                f"{resumo[f'area_embargada_{fonte}_ha']:.2f} ha"
+                + (f", último em {ultimo:%d/%m/%Y}" if pd.notna(ultimo) else "")
+            )
 
 st.subheader("Embargos IBAMA")
 # Avaliar se a tabela do IBAMA não está vazia 
@@ -127,3 +192,16 @@ if gdf_embargo_icmbio_selecionado.empty:
 else:
     # Exibir tabela com os dados do imóvel selecionado
     st.dataframe(gdf_embargo_icmbio_selecionado, use_container_width=True)
+
+# Memória das camadas compartilhadas entre as sessões
+expander_memoria = st.sidebar.expander("💾 Memória das camadas")
+for tabela, gdf in [('area_imovel', area_imovel), ('embargos_ibama', embargos_ibama), ('embargos_icmbio', embargos_icmbio)]:
+    memoria = memoria_camada(gdf, f"{gpkg_file}:{tabela}{sufixo}")
+    expander_memoria.write(
+        f"**{tabela}**: {memoria['feicoes']} feições | "
+        f"{memoria['atributos_mb'] + memoria['geometrias_mb']:.1f} MB "
+        f"(atributos {memoria['atributos_mb']:.1f} MB, geometrias ~{memoria['geometrias_mb']:.1f} MB)"
+    )
+pico_mb = pico_memoria_mb()
+if pico_mb is not None:
+    expander_memoria.write(f"Pico de memória do processo: {pico_mb:.0f} MB")
@@ -0,0 +1,220 @@
+"""
+Benchmark do pipeline de embargos com dados sintéticos.
+
+Gera um GeoPackage com area_imovel, embargos_ibama e embargos_icmbio de tamanho configurável e mede:
+tempo de leitura, latência da seleção do imóvel (máscara booleana x índice), verificação de sobreposição
+(STRtree) e tamanho/tempo da serialização GeoJSON (resolução total, visão geral simplificada e nível
+de detalhe pela distância ao imóvel).
+Os resultados são gravados em JSON para comparar versões.
+
+Uso:
+    python app_embargos_car/benchmark_embargos.py --tamanhos 10000 100000 1000000 --saida-dir app_embargos_car/benchmarks
+"""
+import argparse
+import json
+import os
+import subprocess
+import time
+from datetime import datetime
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from proc import (ler_geodataframe, selecionar_imovel_car, construir_indice_imoveis, construir_indice_espacial,
+                  selecionar_embargos_sobrepostos, geojson_simplificado, geojson_nivel_detalhe,
+                  geometrias_simplificadas, faixa_zoom, zoom_para_extensao)
+
+# Extensão aproximada de Santa Catarina (SIRGAS 2000, graus)
+EXTENSAO = (-53.8, -29.4, -48.4, -25.9)
+CRS = "EPSG:4674"
+VERTICES = 16
+
+
+def poligonos_aleatorios(rng, centros, raios):
+    """Gera polígonos irregulares (vetorizado) ao redor dos centros."""
+    angulos = np.sort(rng.uniform(0, 2 * np.pi, (len(centros), VERTICES)), axis=1)
+    fatores = raios[:, None] * rng.uniform(0.6, 1.0, (len(centros), VERTICES))
+    x = centros[:, 0, None] + fatores * np.cos(angulos)
+    y = centros[:, 1, None] + fatores * np.sin(angulos)
+    aneis = np.stack([x, y], axis=-1)
+    aneis = np.concatenate([aneis, aneis[:, :1]], axis=1)
+    return shapely.polygons(aneis)
+
+
+def gerar_dados_sinteticos(caminho_gpkg, qtd_imoveis, qtd_ibama=None, qtd_icmbio=None, semente=42,
+                           coluna_matricula_imovel='cod_imovel'):
+    """
+    Grava no GeoPackage as camadas sintéticas area_imovel, embargos_ibama e embargos_icmbio.
+
+    Os embargos ficam dentro dos imóveis; 10% deles não têm o código do imóvel (detectáveis apenas
+    pela sobreposição geométrica).
+
+    Args:
+        qtd_ibama (int): Quantidade de embargos IBAMA (padrão: 5% dos imóveis).
+        qtd_icmbio (int): Quantidade de embargos ICMBio (padrão: 1% dos imóveis).
+
+    Returns:
+        dict com a quantidade de feições gravadas em cada camada
+    """
+    rng = np.random.default_rng(semente)
+    minx, miny, maxx, maxy = EXTENSAO
+
+    # Imóveis: área log-normal (mediana ~20 ha), raio em graus
+    centros = np.column_stack([rng.uniform(minx, maxx, qtd_imoveis), rng.uniform(miny, maxy, qtd_imoveis)])
+    area_ha = rng.lognormal(np.log(20), 1.0, qtd_imoveis)
+    raios = np.sqrt(area_ha * 10_000 / np.pi) / 111_000
+    codigos = np.array([f"SC-{4200000 + i % 99999:07d}-{i:032X}" for i in range(qtd_imoveis)])
+
+    area_imovel = gpd.GeoDataFrame(
+        {coluna_matricula_imovel: codigos, 'num_area': area_ha.round(4)},
+        geometry=poligonos_aleatorios(rng, centros, raios), crs=CRS,
+    )
+    if os.path.exists(caminho_gpkg):
+        os.remove(caminho_gpkg)
+    area_imovel.to_file(caminho_gpkg, layer='area_imovel', driver='GPKG', engine='fiona')
+
+    feicoes = {'area_imovel': qtd_imoveis}
+    for tabela, quantidade in [('embargos_ibama', qtd_ibama or max(1, qtd_imoveis // 20)),
+                               ('embargos_icmbio', qtd_icmbio or max(1, qtd_imoveis // 100))]:
+        imoveis = rng.integers(0, qtd_imoveis, quantidade)
+        deslocamento = raios[imoveis, None] * rng.uniform(-0.3, 0.3, (quantidade, 2))
+        codigos_embargo = codigos[imoveis].astype(object)
+        codigos_embargo[rng.random(quantidade) < 0.1] = None
+        datas = pd.Timestamp('2005-01-01') + pd.to_timedelta(rng.integers(0, 7300, quantidade), unit='D')
+
+        embargos = gpd.GeoDataFrame(
+            {coluna_matricula_imovel: codigos_embargo, 'dat_embarg': datas.strftime('%Y-%m-%d')},
+            geometry=poligonos_aleatorios(rng, centros[imoveis] + deslocamento, raios[imoveis] * 0.4), crs=CRS,
+        )
+        embargos.to_file(caminho_gpkg, layer=tabela, driver='GPKG', engine='fiona')
+        feicoes[tabela] = quantidade
+
+    return feicoes
+
+
+def cronometrar(funcao, *args, **kwargs):
+    """Executa a função e retorna (resultado, segundos)."""
+    inicio = time.perf_counter()
+    resultado = funcao(*args, **kwargs)
+    return resultado, time.perf_counter() - inicio
+
+
+def percentis_ms(tempos):
+    """Resumo das latências em milissegundos."""
+    tempos = np.asarray(tempos) * 1000
+    return {'mediana_ms': float(np.median(tempos)), 'p95_ms': float(np.percentile(tempos, 95)),
+            'max_ms': float(tempos.max())}
+
+
+def executar_benchmark(caminho_gpkg, qtd_amostras=200, semente=0, coluna_matricula_imovel='cod_imovel',
+                       feicoes_esperadas=None):
+    """
+    Mede as etapas do pipeline sobre o GeoPackage.
+
+    Args:
+        feicoes_esperadas (dict): Quantidade de feições de cada camada (gerar_dados_sinteticos); a
+            leitura é conferida antes das medições.
+
+    Returns:
+        dict com os resultados
+    """
+    rng = np.random.default_rng(semente)
+    resultados = {}
+
+    # Leitura das camadas (sem cache)
+    ler_geodataframe.clear()
+    camadas = {}
+    for tabela in ['area_imovel', 'embargos_ibama', 'embargos_icmbio']:
+        camadas[tabela], segundos = cronometrar(ler_geodataframe, caminho_gpkg, tabela)
+        resultados[f'leitura_{tabela}'] = {'segundos': segundos, 'feicoes': len(camadas[tabela])}
+        # Confere se a camada lida é a esperada (e não outra camada do GeoPackage)
+        if feicoes_esperadas is not None and len(camadas[tabela]) != feicoes_esperadas[tabela]:
+            raise ValueError(f"{tabela}: {len(camadas[tabela])} feições lidas, {feicoes_esperadas[tabela]} esperadas")
+    area_imovel = camadas['area_imovel']
+
+    amostra = rng.choice(area_imovel[coluna_matricula_imovel].to_numpy(), min(qtd_amostras, len(area_imovel)),
+                         replace=False)
+
+    # Seleção do imóvel: máscara booleana x índice
+    tempos = [cronometrar(selecionar_imovel_car, area_imovel, codigo, coluna_matricula_imovel)[1] for codigo in amostra]
+    resultados['selecao_mascara'] = percentis_ms(tempos)
+
+    construir_indice_imoveis.clear()
+    indice, segundos = cronometrar(construir_indice_imoveis, area_imovel, 'benchmark:area_imovel',
+                                   coluna_matricula_imovel)
+    tempos = [cronometrar(selecionar_imovel_car, area_imovel, codigo, coluna_matricula_imovel, indice)[1]
+              for codigo in amostra]
+    resultados['selecao_indice'] = {'construcao_segundos': segundos, **percentis_ms(tempos)}
+
+    # Verificação de sobreposição (STRtree)
+    construir_indice_espacial.clear()
+    for tabela in ['embargos_ibama', 'embargos_icmbio']:
+        arvore, segundos = cronometrar(construir_indice_espacial, camadas[tabela], f'benchmark:{tabela}')
+        tempos = []
+        for codigo in amostra:
+            gdf_imovel = selecionar_imovel_car(area_imovel, codigo, coluna_matricula_imovel, indice)[0]
+            tempos.append(cronometrar(selecionar_embargos_sobrepostos, camadas[tabela], gdf_imovel, arvore)[1])
+        resultados[f'sobreposicao_{tabela}'] = {'construcao_segundos': segundos, **percentis_ms(tempos)}
+
+    # Serialização GeoJSON (caches limpos antes de cada medição): resolução total, camada inteira
+    # simplificada na faixa da visão geral e nível de detalhe pela distância a um imóvel típico
+    _, _, _, miny, maxy, minx, maxx = selecionar_imovel_car(area_imovel, amostra[0], coluna_matricula_imovel, indice)
+    for tabela, gdf in camadas.items():
+        chave = f'benchmark:{tabela}'
+        zoom_visao_geral = faixa_zoom(zoom_para_extensao(*gdf.total_bounds))
+
+        def medir(funcao, *args):
+            for cache in (geojson_simplificado, geojson_nivel_detalhe, geometrias_simplificadas,
+                          construir_indice_espacial):
+                cache.clear()
+            geojson, segundos = cronometrar(funcao, *args)
+            return {'mb': len(geojson) / 1024 ** 2, 'segundos': segundos}
+
+        resultados[f'geojson_{tabela}'] = {
+            'completo': medir(geojson_simplificado, gdf, chave, [coluna_matricula_imovel], None),
+            'visao_geral': {**medir(geojson_simplificado, gdf, chave, [coluna_matricula_imovel], zoom_visao_geral),
+                            'zoom_faixa': zoom_visao_geral},
+            'nivel_detalhe': medir(geojson_nivel_detalhe, gdf, chave, [coluna_matricula_imovel],
+                                   (minx, miny, maxx, maxy)),
+        }
+
+    return resultados
+
+
+def versao_codigo():
+    """Commit atual do repositório (para comparar resultados entre versões)."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline de embargos com dados sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000], help="Quantidades de imóveis")
+    parser.add_argument("--amostras", type=int, default=200, help="Imóveis sorteados para as medições de latência")
+    parser.add_argument("--saida-dir", default="app_embargos_car/benchmarks", help="Pasta dos dados e resultados")
+    args = parser.parse_args()
+
+    os.makedirs(args.saida_dir, exist_ok=True)
+    versao = versao_codigo()
+    for tamanho in args.tamanhos:
+        caminho_gpkg = os.path.join(args.saida_dir, f"sintetico_{tamanho}.gpkg")
+        feicoes, segundos = cronometrar(gerar_dados_sinteticos, caminho_gpkg, tamanho)
+        print(f"{tamanho} imóveis gerados em {segundos:.1f} s")
+
+        resultados = executar_benchmark(caminho_gpkg, args.amostras, feicoes_esperadas=feicoes)
+        relatorio = {
+            'versao': versao,
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'qtd_imoveis': tamanho,
+            'resultados': resultados,
+        }
+        caminho_json = os.path.join(args.saida_dir, f"resultado_{tamanho}_{versao or 'local'}.json")
+        with open(caminho_json, 'w', encoding='utf-8') as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        print(json.dumps(resultados, indent=2, ensure_ascii=False))
+        print(f"Resultados -> {caminho_json}")
@@ -0,0 +1,259 @@
+"""
+Avaliação de conformidade em lote (sem interface) para uma carteira de imóveis do CAR.
+
+Os códigos dos imóveis são ordenados pela curva de Hilbert e divididos em partições espacialmente
+contíguas (cada código em uma única partição, mesmo com vários polígonos). Cada processo lê apenas os
+imóveis e os embargos da janela (bbox) da sua partição para a verificação de
+sobreposição; os embargos vinculados pelo código do imóvel são contados uma única vez sobre a camada
+inteira (apenas a coluna do código, sem geometrias), pois podem estar fora da janela. Os resultados
+são gravados em CSV ou Parquet à medida que as partições terminam.
+
+Uso:
+    python app_embargos_car/cli_conformidade.py app_embargos_car/car_embargos.gpkg codigos.txt resultado.csv --processos 8
+"""
+import argparse
+import csv
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import closing
+
+import pandas as pd
+from shapely import STRtree
+
+from proc import ler_camada, selecionar_imovel_car, selecionar_embargos_sobrepostos
+
+CAMADAS_EMBARGO = {
+    'ibama': 'embargos_ibama',
+    'icmbio': 'embargos_icmbio',
+}
+
+# Quantidade de códigos por consulta ao ler a carteira
+TAMANHO_LOTE_CODIGOS = 500
+
+
+def ler_codigos(caminho_codigos, coluna_matricula_imovel):
+    """
+    Lê a lista de códigos dos imóveis (arquivo texto com um código por linha ou CSV com a coluna do código).
+
+    Returns:
+        list
+    """
+    if caminho_codigos.lower().endswith('.csv'):
+        codigos = pd.read_csv(caminho_codigos, usecols=[coluna_matricula_imovel], dtype=str)[coluna_matricula_imovel]
+    else:
+        with open(caminho_codigos, encoding='utf-8') as arquivo:
+            codigos = pd.Series([linha.strip() for linha in arquivo])
+    codigos = codigos.dropna()
+    return codigos[codigos != ''].drop_duplicates().tolist()
+
+
+def contar_embargos_por_codigo(caminho_gpkg, tabela, coluna_matricula_imovel, codigos):
+    """
+    Conta os embargos vinculados a cada código na camada inteira, sem carregar as geometrias.
+
+    Returns:
+        dict código -> quantidade de embargos (apenas os códigos com embargos)
+    """
+    codigos = set(codigos)
+    with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+        linhas = conexao.execute(
+            f'SELECT "{coluna_matricula_imovel}", COUNT(*) FROM "{tabela}" '
+            f'WHERE "{coluna_matricula_imovel}" IS NOT NULL GROUP BY "{coluna_matricula_imovel}"'
+        ).fetchall()
+    return {codigo: quantidade for codigo, quantidade in linhas if codigo in codigos}
+
+
+def ler_imoveis_em_lotes(caminho_gpkg, coluna_matricula_imovel, codigos, tamanho_lote=TAMANHO_LOTE_CODIGOS):
+    """
+    Lê os imóveis da carteira em consultas de até tamanho_lote códigos (filtro pelo índice do código).
+
+    Returns:
+        GeoDataFrame
+    """
+    lotes = [
+        ler_camada(caminho_gpkg, 'area_imovel', coluna_matricula_imovel, codigos[inicio:inicio + tamanho_lote])
+        for inicio in range(0, len(codigos), tamanho_lote)
+    ]
+    if not lotes:
+        return ler_camada(caminho_gpkg, 'area_imovel', coluna_matricula_imovel, [])
+    return pd.concat(lotes, ignore_index=True)
+
+
+def particionar(area_imovel, coluna_matricula_imovel, qtd_particoes):
+    """
+    Divide os códigos dos imóveis em partições espacialmente contíguas (ordem da curva de Hilbert).
+
+    A divisão é feita sobre os códigos únicos: os polígonos de um mesmo imóvel ficam sempre na mesma
+    partição e o bbox da partição cobre todos eles.
+
+    Returns:
+        list de tuplas (lista de códigos da partição, bbox)
+    """
+    distancias = pd.Series(area_imovel.geometry.hilbert_distance().to_numpy(), index=area_imovel.index)
+    codigos_ordenados = distancias.groupby(area_imovel[coluna_matricula_imovel]).min().sort_values().index
+    tamanho = -(-len(codigos_ordenados) // qtd_particoes)
+
+    particoes = []
+    for inicio in range(0, len(codigos_ordenados), tamanho):
+        codigos_particao = codigos_ordenados[inicio:inicio + tamanho].tolist()
+        parte = area_imovel[area_imovel[coluna_matricula_imovel].isin(codigos_particao)]
+        particoes.append((codigos_particao, tuple(parte.geometry.total_bounds)))
+    return particoes
+
+
+def avaliar_particao(caminho_gpkg, coluna_matricula_imovel, codigos, bbox, contagens_codigo):
+    """
+    Avalia os imóveis de uma partição, lendo apenas os imóveis e os embargos da janela da partição.
+
+    Args:
+        contagens_codigo (dict): Sufixo da camada -> {código: embargos vinculados pelo código},
+            contados na camada inteira (contar_embargos_por_codigo).
+
+    Returns:
+        list de dicionários (uma linha por imóvel)
+    """
+    # O bbox usa o R-tree do GeoPackage; os imóveis da janela fora da partição são descartados
+    area_imovel = ler_camada(caminho_gpkg, 'area_imovel', bbox=bbox)
+    area_imovel = area_imovel[area_imovel[coluna_matricula_imovel].isin(codigos)]
+    camadas = {sufixo: ler_camada(caminho_gpkg, tabela, bbox=bbox) for sufixo, tabela in CAMADAS_EMBARGO.items()}
+    arvores = {sufixo: STRtree(gdf.geometry.to_numpy()) for sufixo, gdf in camadas.items()}
+
+    linhas = []
+    for codigo in codigos:
+        gdf_car_selecionado = selecionar_imovel_car(area_imovel, codigo, coluna_matricula_imovel)[0]
+        linha = {coluna_matricula_imovel: codigo, 'encontrado': not gdf_car_selecionado.empty}
+        for sufixo, gdf_embargos in camadas.items():
+            linha[f'embargos_{sufixo}_codigo'] = int(contagens_codigo[sufixo].get(codigo, 0))
+            linha[f'embargos_{sufixo}_sobreposicao'] = len(
+                selecionar_embargos_sobrepostos(gdf_embargos, gdf_car_selecionado, arvores[sufixo])
+            )
+        linha['conforme'] = linha['encontrado'] and not any(
+            valor for chave, valor in linha.items() if chave.startswith('embargos_')
+        )
+        linhas.append(linha)
+    return linhas
+
+
+class GravadorResultados:
+    """Grava os resultados em CSV ou Parquet à medida que as partições terminam."""
+
+    def __init__(self, caminho_saida):
+        self.caminho_saida = caminho_saida
+        self.parquet = caminho_saida.lower().endswith('.parquet')
+        self.escritor = None
+        self.arquivo = None
+
+    def gravar(self, linhas):
+        if not linhas:
+            return
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            tabela = pa.Table.from_pylist(linhas)
+            if self.escritor is None:
+                self.escritor = pq.ParquetWriter(self.caminho_saida, tabela.schema)
+            self.escritor.write_table(tabela)
+        else:
+            if self.escritor is None:
+                self.arquivo = open(self.caminho_saida, 'w', newline='', encoding='utf-8')
+                self.escritor = csv.DictWriter(self.arquivo, fieldnames=list(linhas[0]))
+                self.escritor.writeheader()
+            self.escritor.writerows(linhas)
+            self.arquivo.flush()
+
+    def fechar(self):
+        if self.parquet and self.escritor is not None:
+            self.escritor.close()
+        if self.arquivo is not None:
+            self.arquivo.close()
+
+
+def avaliar_carteira(caminho_gpkg, codigos, caminho_saida, coluna_matricula_imovel='cod_imovel',
+                     processos=None, qtd_particoes=None):
+    """
+    Avalia a conformidade de uma lista de imóveis em paralelo e grava o resultado.
+
+    Args:
+        caminho_gpkg (String): GeoPackage com area_imovel, embargos_ibama e embargos_icmbio.
+        codigos (list): Códigos dos imóveis.
+        caminho_saida (String): Arquivo .csv ou .parquet.
+        processos (int): Quantidade de processos (padrão: número de CPUs).
+        qtd_particoes (int): Quantidade de partições espaciais (padrão: 4 por processo).
+
+    Returns:
+        int quantidade de imóveis avaliados
+    """
+    processos = processos or os.cpu_count()
+    inicio = time.perf_counter()
+
+    # Apenas os imóveis da carteira são lidos (filtro pelo índice do código, em lotes)
+    area_imovel = ler_imoveis_em_lotes(caminho_gpkg, coluna_matricula_imovel, codigos)
+    encontrados = set(area_imovel[coluna_matricula_imovel])
+    particoes = (particionar(area_imovel, coluna_matricula_imovel, qtd_particoes or processos * 4)
+                 if len(area_imovel) else [])
+    # Embargos vinculados pelo código: contados na camada inteira (o embargo pode estar fora da partição)
+    contagens_codigo = {
+        sufixo: contar_embargos_por_codigo(caminho_gpkg, tabela, coluna_matricula_imovel, encontrados)
+        for sufixo, tabela in CAMADAS_EMBARGO.items()
+    }
+    print(f"{len(encontrados)} de {len(codigos)} imóveis encontrados, {len(particoes)} partições "
+          f"({time.perf_counter() - inicio:.1f} s)")
+
+    gravador = GravadorResultados(caminho_saida)
+    avaliados = 0
+    try:
+        # Imóveis que não existem em area_imovel
+        nao_encontrados = [codigo for codigo in codigos if codigo not in encontrados]
+        linhas_vazias = []
+        for codigo in nao_encontrados:
+            linha = {coluna_matricula_imovel: codigo, 'encontrado': False}
+            for sufixo in CAMADAS_EMBARGO:
+                linha[f'embargos_{sufixo}_codigo'] = 0
+                linha[f'embargos_{sufixo}_sobreposicao'] = 0
+            linha['conforme'] = False
+            linhas_vazias.append(linha)
+        gravador.gravar(linhas_vazias)
+        avaliados += len(linhas_vazias)
+
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = []
+            for codigos_particao, bbox in particoes:
+                # Cada processo recebe apenas as contagens dos códigos da sua partição
+                contagens_particao = {
+                    sufixo: {codigo: contagens[codigo] for codigo in codigos_particao if codigo in contagens}
+                    for sufixo, contagens in contagens_codigo.items()
+                }
+                futuros.append(executor.submit(avaliar_particao, caminho_gpkg, coluna_matricula_imovel,
+                                               codigos_particao, bbox, contagens_particao))
+            for concluidas, futuro in enumerate(as_completed(futuros), start=1):
+                linhas = futuro.result()
+                gravador.gravar(linhas)
+                avaliados += len(linhas)
+
+                decorrido = time.perf_counter() - inicio
+                print(f"[{concluidas}/{len(futuros)}] {avaliados}/{len(codigos)} imóveis "
+                      f"| {avaliados / decorrido:.1f} imóveis/s | {decorrido:.1f} s")
+    finally:
+        gravador.fechar()
+
+    return avaliados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Avaliação de conformidade em lote para imóveis do CAR.")
+    parser.add_argument("gpkg", help="GeoPackage com area_imovel, embargos_ibama e embargos_icmbio")
+    parser.add_argument("codigos", help="Arquivo .txt (um código por linha) ou .csv com a coluna do código")
+    parser.add_argument("saida", help="Arquivo de saída .csv ou .parquet")
+    parser.add_argument("--coluna", default="cod_imovel", help="Coluna com o código do imóvel")
+    parser.add_argument("--processos", type=int, default=None, help="Quantidade de processos")
+    parser.add_argument("--particoes", type=int, default=None, help="Quantidade de partições espaciais")
+    args = parser.parse_args()
+
+    codigos = ler_codigos(args.codigos, args.coluna)
+    inicio = time.perf_counter()
+    avaliados = avaliar_carteira(args.gpkg, codigos, args.saida, args.coluna, args.processos, args.particoes)
+    decorrido = time.perf_counter() - inicio
+    print(f"{avaliados} imóveis avaliados em {decorrido:.1f} s ({avaliados / decorrido:.1f} imóveis/s) -> {args.saida}")
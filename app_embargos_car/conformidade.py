@@ -0,0 +1,243 @@
+"""
+Cálculo em lote da conformidade dos imóveis do CAR em relação aos embargos do IBAMA e do ICMBio.
+
+Para cada imóvel da camada area_imovel são calculados a quantidade de embargos, a área embargada (ha),
+a data do último embargo e a área (ha e %) do imóvel sobreposta por embargos. O resultado é gravado em Parquet e lido pelo app com acesso direto por código.
+
+A atualização é incremental: só são recalculados os imóveis cuja geometria ou conjunto de embargos mudou
+desde a última execução.
+
+Uso:
+    python app_embargos_car/conformidade.py app_embargos_car/car_embargos.gpkg app_embargos_car/conformidade.parquet
+"""
+import argparse
+import hashlib
+import os
+from datetime import datetime
+
+import pandas as pd
+import shapely
+from shapely import STRtree
+
+from proc import ler_camada, calcular_sobreposicao_em_lote, texto_atributos, CRS_AREA_IGUAL
+
+# Camadas de embargo do GeoPackage (sufixo das colunas -> tabela)
+CAMADAS_EMBARGO = {
+    'ibama': 'embargos_ibama',
+    'icmbio': 'embargos_icmbio',
+}
+
+# Possíveis nomes da coluna com a data do embargo nas bases do IBAMA e do ICMBio
+COLUNAS_DATA_EMBARGO = ['dat_embarg', 'data_embarg', 'data_embargo', 'dt_embargo', 'data']
+
+
+def hash_linhas(gdf):
+    """
+    Calcula o hash (SHA-1) de cada linha a partir da geometria (WKB) e dos atributos.
+
+    Returns:
+        Series com o hash de cada linha
+    """
+    wkb = shapely.to_wkb(gdf.geometry.to_numpy())
+    atributos = texto_atributos(gdf)
+    hashes = [hashlib.sha1(geom + attr.encode()).hexdigest() for geom, attr in zip(wkb, atributos)]
+    return pd.Series(hashes, index=gdf.index)
+
+
+def assinatura_por_imovel(gdf, coluna_matricula_imovel):
+    """
+    Assinatura do conjunto de feições de cada imóvel (hash dos hashes das linhas, em ordem).
+
+    Returns:
+        Series indexada pelo código do imóvel
+    """
+    hashes = hash_linhas(gdf)
+    return hashes.groupby(gdf[coluna_matricula_imovel]).agg(
+        lambda grupo: hashlib.sha1(''.join(sorted(grupo)).encode()).hexdigest()
+    )
+
+
+def assinatura_embargos(area_imovel, gdf_embargos, coluna_matricula_imovel):
+    """
+    Assinatura do conjunto de embargos de cada imóvel: embargos vinculados pelo código e embargos
+    cujo envelope intersecta o imóvel (candidatos à sobreposição geométrica).
+
+    Returns:
+        Series indexada pelo código do imóvel
+    """
+    hashes = hash_linhas(gdf_embargos).to_numpy()
+    if gdf_embargos.crs != area_imovel.crs:
+        gdf_embargos = gdf_embargos.to_crs(area_imovel.crs)
+
+    pares_codigo = pd.DataFrame({
+        coluna_matricula_imovel: gdf_embargos[coluna_matricula_imovel].to_numpy(),
+        'hash': hashes,
+    }).dropna()
+
+    arvore = STRtree(gdf_embargos.geometry.to_numpy())
+    pos_imovel, pos_embargo = arvore.query(area_imovel.geometry.to_numpy())
+    pares_envelope = pd.DataFrame({
+        coluna_matricula_imovel: area_imovel[coluna_matricula_imovel].to_numpy()[pos_imovel],
+        'hash': hashes[pos_embargo],
+    })
+
+    pares = pd.concat([pares_codigo, pares_envelope]).drop_duplicates()
+    return pares.groupby(coluna_matricula_imovel)['hash'].agg(
+        lambda grupo: hashlib.sha1(''.join(sorted(grupo)).encode()).hexdigest()
+    )
+
+
+def coluna_data_embargo(gdf):
+    """Retorna o nome da coluna de data do embargo, se existir."""
+    for coluna in COLUNAS_DATA_EMBARGO:
+        if coluna in gdf.columns:
+            return coluna
+    return None
+
+
+def resumir_embargos(gdf_embargos, coluna_matricula_imovel, sufixo):
+    """
+    Resume os embargos de uma camada por imóvel: quantidade, área embargada (ha) e data do último embargo.
+
+    A área é calculada sobre a união dos embargos do imóvel, em projeção equivalente, para não
+    contar duas vezes embargos sobrepostos.
+
+    Returns:
+        DataFrame indexado pelo código do imóvel
+    """
+    gdf = gdf_embargos[gdf_embargos[coluna_matricula_imovel].notna()]
+
+    resumo = pd.DataFrame(index=pd.Index(gdf[coluna_matricula_imovel].unique(), name=coluna_matricula_imovel))
+    resumo[f'qtd_embargos_{sufixo}'] = gdf.groupby(coluna_matricula_imovel).size()
+    if gdf.empty:
+        resumo[f'area_embargada_{sufixo}_ha'] = pd.Series(dtype=float)
+        resumo[f'data_ultimo_embargo_{sufixo}'] = pd.Series(dtype='datetime64[ns]')
+        return resumo
+
+    uniao = gdf[[coluna_matricula_imovel, gdf.geometry.name]].to_crs(CRS_AREA_IGUAL).dissolve(by=coluna_matricula_imovel)
+    resumo[f'area_embargada_{sufixo}_ha'] = uniao.geometry.area / 10_000
+
+    coluna_data = coluna_data_embargo(gdf)
+    if coluna_data is not None:
+        datas = pd.to_datetime(gdf[coluna_data], errors='coerce')
+        resumo[f'data_ultimo_embargo_{sufixo}'] = datas.groupby(gdf[coluna_matricula_imovel]).max()
+    else:
+        resumo[f'data_ultimo_embargo_{sufixo}'] = pd.NaT
+
+    return resumo
+
+
+def calcular_conformidade(area_imovel, camadas_embargo, coluna_matricula_imovel):
+    """
+    Calcula a tabela de conformidade para todos os imóveis de area_imovel.
+
+    Args:
+        area_imovel (GeoDataFrame): Imóveis a serem avaliados.
+        camadas_embargo (dict): Sufixo da camada -> GeoDataFrame de embargos.
+        coluna_matricula_imovel (String): Coluna com o código do imóvel.
+
+    Returns:
+        DataFrame com uma linha por imóvel
+    """
+    tabela = pd.DataFrame(index=pd.Index(area_imovel[coluna_matricula_imovel].unique(), name=coluna_matricula_imovel))
+
+    for sufixo, gdf_embargos in camadas_embargo.items():
+        embargos = gdf_embargos[gdf_embargos[coluna_matricula_imovel].isin(tabela.index)]
+        resumo = resumir_embargos(embargos, coluna_matricula_imovel, sufixo)
+        tabela = tabela.join(resumo)
+        tabela[f'qtd_embargos_{sufixo}'] = tabela[f'qtd_embargos_{sufixo}'].fillna(0).astype(int)
+        tabela[f'area_embargada_{sufixo}_ha'] = tabela[f'area_embargada_{sufixo}_ha'].fillna(0.0)
+
+        # Área do imóvel sobreposta pelos embargos da camada (independente do código)
+        if gdf_embargos.crs != area_imovel.crs:
+            gdf_embargos = gdf_embargos.to_crs(area_imovel.crs)
+        sobreposicao = calcular_sobreposicao_em_lote(area_imovel, gdf_embargos, coluna_matricula_imovel)
+        tabela['area_imovel_ha'] = sobreposicao['area_imovel_ha']
+        tabela[f'area_sobreposta_{sufixo}_ha'] = sobreposicao['area_embargada_ha']
+        tabela[f'percentual_sobreposto_{sufixo}'] = sobreposicao['percentual_embargado']
+
+    return tabela
+
+
+def atualizar_tabela_conformidade(caminho_gpkg, caminho_tabela, coluna_matricula_imovel='cod_imovel', completo=False,
+                                  codigos_alterados=None):
+    """
+    Atualiza (ou cria) a tabela de conformidade em Parquet.
+
+    Apenas os imóveis novos, com geometria alterada ou com o conjunto de embargos alterado são
+    recalculados; os imóveis que deixaram de existir são removidos.
+
+    Args:
+        caminho_gpkg (String): GeoPackage com area_imovel, embargos_ibama e embargos_icmbio.
+        caminho_tabela (String): Arquivo Parquet de saída.
+        completo (bool): Força o recálculo de todos os imóveis.
+        codigos_alterados (list): Imóveis afetados segundo o log da ingestão de embargos
+            (ingestao_embargos.py). Se informado, apenas esses imóveis e os imóveis novos são
+            avaliados, sem calcular as assinaturas dos demais.
+
+    Returns:
+        tuple (tabela, quantidade de imóveis recalculados)
+    """
+    area_imovel = ler_camada(caminho_gpkg, 'area_imovel')
+    camadas_embargo = {sufixo: ler_camada(caminho_gpkg, tabela) for sufixo, tabela in CAMADAS_EMBARGO.items()}
+
+    tabela_anterior = None
+    if not completo and os.path.exists(caminho_tabela):
+        tabela_anterior = pd.read_parquet(caminho_tabela).set_index(coluna_matricula_imovel)
+
+    area_avaliada = area_imovel
+    if codigos_alterados is not None and tabela_anterior is not None:
+        # Imóveis indicados pelo log da ingestão e imóveis que ainda não estão na tabela
+        candidatos = set(codigos_alterados) | (set(area_imovel[coluna_matricula_imovel]) - set(tabela_anterior.index))
+        area_avaliada = area_imovel[area_imovel[coluna_matricula_imovel].isin(candidatos)]
+
+    # Assinaturas atuais da geometria do imóvel e de cada conjunto de embargos
+    assinaturas = pd.DataFrame({'hash_imovel': assinatura_por_imovel(area_avaliada, coluna_matricula_imovel)})
+    for sufixo, gdf_embargos in camadas_embargo.items():
+        assinaturas[f'hash_embargos_{sufixo}'] = assinatura_embargos(area_avaliada, gdf_embargos, coluna_matricula_imovel)
+    assinaturas = assinaturas[assinaturas['hash_imovel'].notna()].fillna('')
+
+    if tabela_anterior is None:
+        alterados = assinaturas.index
+    else:
+        # Assinaturas ausentes na tabela anterior (versão antiga) contam como alteração
+        anteriores = tabela_anterior.reindex(index=assinaturas.index, columns=assinaturas.columns)
+        alterados = assinaturas.index[(anteriores != assinaturas).any(axis=1)]
+
+    # Recalcula apenas os imóveis alterados
+    area_alterada = area_avaliada[area_avaliada[coluna_matricula_imovel].isin(alterados)]
+    recalculados = calcular_conformidade(area_alterada, camadas_embargo, coluna_matricula_imovel)
+    recalculados = recalculados.join(assinaturas)
+    recalculados['atualizado_em'] = pd.Timestamp(datetime.now())
+
+    if tabela_anterior is None:
+        tabela = recalculados
+    else:
+        existentes = tabela_anterior.index.isin(area_imovel[coluna_matricula_imovel])
+        mantidos = tabela_anterior[existentes & ~tabela_anterior.index.isin(alterados)]
+        tabela = pd.concat([mantidos, recalculados])
+
+    tabela.reset_index().to_parquet(caminho_tabela, index=False)
+    return tabela, len(alterados)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcula a tabela de conformidade dos imóveis do CAR.")
+    parser.add_argument("gpkg", help="GeoPackage com area_imovel, embargos_ibama e embargos_icmbio")
+    parser.add_argument("saida", help="Arquivo Parquet da tabela de conformidade")
+    parser.add_argument("--coluna", default="cod_imovel", help="Coluna com o código do imóvel")
+    parser.add_argument("--completo", action="store_true", help="Recalcula todos os imóveis")
+    parser.add_argument("--log-desde", default=None,
+                        help="Avalia apenas os imóveis do log de ingestão de embargos a partir desta data (ISO)")
+    args = parser.parse_args()
+
+    codigos_alterados = None
+    if args.log_desde is not None:
+        from ingestao_embargos import ler_log_alteracoes
+
+        log = ler_log_alteracoes(args.gpkg, args.log_desde, args.coluna)
+        codigos_alterados = log[args.coluna].dropna().unique().tolist()
+
+    tabela, qtd_recalculados = atualizar_tabela_conformidade(args.gpkg, args.saida, args.coluna, args.completo,
+                                                             codigos_alterados)
+    print(f"{qtd_recalculados} de {len(tabela)} imóveis recalculados -> {args.saida}")
@@ -0,0 +1,277 @@
+"""
+Ingestão incremental de novas listas de embargos do IBAMA/ICMBio no car_embargos.gpkg.
+
+O novo arquivo (dump) é comparado com o último estado ingerido pelo identificador do embargo e pelo
+hash da geometria e dos atributos. Apenas os embargos novos, alterados ou removidos são atualizados
+na camada (recortados pelos imóveis do CAR, como no notebook de preparação dos dados).
+
+As novas versões são gravadas primeiro (GDAL); em seguida, em uma única transação SQLite, as versões
+anteriores são excluídas (pelos fids lidos antes da gravação) e o estado e o log são atualizados. Se a
+gravação falhar, a camada e o estado ficam como estavam; se a transação falhar, a próxima ingestão
+regrava os mesmos embargos. Os gatilhos do GeoPackage mantêm o R-tree em sincronia e os índices de
+atributo (cod_imovel e identificador) são garantidos ao final. Cada alteração é registrada na tabela
+ingestao_log, consumida pela atualização da tabela de conformidade.
+
+Na primeira ingestão (sem estado gravado), os embargos já presentes na camada são o estado anterior.
+
+Uso:
+    python app_embargos_car/ingestao_embargos.py app_embargos_car/car_embargos.gpkg ibama embargos_ibama.geojson
+"""
+import argparse
+import hashlib
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import fiona
+import geopandas as gpd
+import pandas as pd
+import shapely
+
+from proc import ler_camada, criar_indice_atributo, texto_atributos
+
+# Camada do GeoPackage e coluna identificadora do embargo de cada fonte
+FONTES_EMBARGO = {
+    'ibama': {'tabela': 'embargos_ibama', 'coluna_id': 'seq_tad'},
+    'icmbio': {'tabela': 'embargos_icmbio', 'coluna_id': 'numero_emb'},
+}
+
+# Tamanho dos lotes de parâmetros nas consultas SQLite (limite de variáveis por comando)
+TAMANHO_LOTE_SQL = 500
+
+
+def criar_tabelas_controle(conexao):
+    """Cria as tabelas de estado da ingestão e de log de alterações, se não existirem."""
+    conexao.execute(
+        'CREATE TABLE IF NOT EXISTS ingestao_estado ('
+        'camada TEXT NOT NULL, id_embargo TEXT NOT NULL, hash TEXT NOT NULL, '
+        'PRIMARY KEY (camada, id_embargo))'
+    )
+    conexao.execute(
+        'CREATE TABLE IF NOT EXISTS ingestao_log ('
+        'id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL, camada TEXT NOT NULL, '
+        'id_embargo TEXT NOT NULL, operacao TEXT NOT NULL, cod_imovel TEXT)'
+    )
+    conexao.execute('CREATE INDEX IF NOT EXISTS idx_ingestao_log_data ON ingestao_log (data)')
+    conexao.commit()
+
+
+def normalizar_id(valor):
+    """
+    Identificador do embargo como texto, igual para valores lidos do SQLite e do dump.
+
+    Colunas REAL do GeoPackage ou float no pandas (123.0) e inteiras (123) resultam em '123'.
+    """
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def hash_embargos(gdf, coluna_id):
+    """
+    Calcula o hash de cada embargo (geometria normalizada em WKB e atributos).
+
+    Embargos com mais de uma feição recebem o hash do conjunto das feições.
+
+    Returns:
+        Series indexada pelo identificador do embargo
+    """
+    wkb = shapely.to_wkb(shapely.normalize(gdf.geometry.to_numpy()))
+    atributos = texto_atributos(gdf)
+    hashes = pd.Series(
+        [hashlib.sha1(geom + attr.encode()).hexdigest() for geom, attr in zip(wkb, atributos)],
+        index=gdf[coluna_id].map(normalizar_id).to_numpy(),
+    )
+    return hashes.groupby(level=0).agg(lambda grupo: hashlib.sha1(''.join(sorted(grupo)).encode()).hexdigest())
+
+
+def ajustar_ao_esquema(gdf, propriedades):
+    """
+    Converte as colunas para os tipos do esquema da camada (o fiona descarta, por exemplo, um valor
+    inteiro do dump em um campo REAL da camada).
+
+    Args:
+        propriedades (dict): schema['properties'] da camada (ex.: {'seq_tad': 'float', 'cod_imovel': 'str:254'}).
+    """
+    gdf = gdf.reindex(columns=list(propriedades) + [gdf.geometry.name])
+    for coluna, tipo in propriedades.items():
+        tipo = tipo.split(':')[0]
+        if tipo == 'float':
+            gdf[coluna] = pd.to_numeric(gdf[coluna], errors='coerce').astype(float)
+        elif tipo.startswith('int'):
+            gdf[coluna] = pd.to_numeric(gdf[coluna], errors='coerce').astype('Int64')
+        elif tipo == 'str':
+            gdf[coluna] = gdf[coluna].map(lambda valor: None if pd.isna(valor) else normalizar_id(valor))
+    return gdf
+
+
+def em_lotes(valores):
+    """Divide a lista de valores em lotes para as consultas parametrizadas."""
+    valores = list(valores)
+    for inicio in range(0, len(valores), TAMANHO_LOTE_SQL):
+        yield valores[inicio:inicio + TAMANHO_LOTE_SQL]
+
+
+def coluna_fid(conexao, tabela):
+    """Nome da chave primária (fid) da camada do GeoPackage."""
+    for _, nome, _, _, _, chave_primaria in conexao.execute(f'PRAGMA table_info("{tabela}")'):
+        if chave_primaria:
+            return nome
+    return 'fid'
+
+
+def linhas_da_camada(conexao, tabela, coluna_id, coluna_matricula_imovel):
+    """
+    Retorna fid, identificador (normalizado) e código do imóvel de cada linha da camada, sem geometrias.
+
+    Returns:
+        DataFrame com as colunas fid, id_embargo e cod_imovel
+    """
+    linhas = conexao.execute(
+        f'SELECT "{coluna_fid(conexao, tabela)}", "{coluna_id}", "{coluna_matricula_imovel}" FROM "{tabela}" '
+        f'WHERE "{coluna_id}" IS NOT NULL'
+    ).fetchall()
+    camada = pd.DataFrame(linhas, columns=['fid', 'id_embargo', 'cod_imovel'])
+    camada['id_embargo'] = camada['id_embargo'].map(normalizar_id)
+    return camada
+
+
+def ingerir_embargos(caminho_gpkg, fonte, caminho_dump, coluna_id=None, coluna_matricula_imovel='cod_imovel'):
+    """
+    Atualiza incrementalmente a camada de embargos a partir de um novo dump.
+
+    Args:
+        caminho_gpkg (String): GeoPackage com area_imovel e as camadas de embargos.
+        fonte (String): 'ibama' ou 'icmbio'.
+        caminho_dump (String): Arquivo com a nova lista de embargos (GeoJSON, SHP, GPKG...).
+        coluna_id (String): Coluna identificadora do embargo (padrão de FONTES_EMBARGO).
+        coluna_matricula_imovel (String): Coluna com o código do imóvel.
+
+    Returns:
+        dict com a quantidade de embargos incluídos, alterados e removidos
+    """
+    tabela = FONTES_EMBARGO[fonte]['tabela']
+    coluna_id = coluna_id or FONTES_EMBARGO[fonte]['coluna_id']
+
+    dump = gpd.read_file(caminho_dump)
+    if coluna_id not in dump.columns:
+        raise ValueError(f"A coluna identificadora '{coluna_id}' não existe no arquivo {caminho_dump}.")
+    dump = dump[dump[coluna_id].notna()]
+    dump = dump.set_geometry(dump.geometry.make_valid())
+    hashes_novos = hash_embargos(dump, coluna_id)
+
+    with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+        criar_tabelas_controle(conexao)
+        estado = pd.Series(dict(conexao.execute(
+            'SELECT id_embargo, hash FROM ingestao_estado WHERE camada = ?', (tabela,)
+        ).fetchall()), dtype=str)
+        camada_atual = linhas_da_camada(conexao, tabela, coluna_id, coluna_matricula_imovel)
+
+    if estado.empty:
+        # Primeira ingestão: os embargos já gravados são o estado anterior (sem hash: os que continuam
+        # no dump são regravados e os ausentes do dump são removidos)
+        estado = pd.Series('', index=pd.Index(camada_atual['id_embargo'].unique()), dtype=str)
+
+    incluidos = hashes_novos.index.difference(estado.index)
+    comuns = hashes_novos.index.intersection(estado.index)
+    alterados = comuns[hashes_novos[comuns].to_numpy() != estado[comuns].to_numpy()]
+    removidos = estado.index.difference(hashes_novos.index)
+
+    # Linhas atualmente gravadas dos embargos substituídos (excluídas somente após a gravação)
+    substituir = incluidos.union(alterados).union(removidos)
+    linhas_substituidas = camada_atual[camada_atual['id_embargo'].isin(substituir)]
+    anteriores = linhas_substituidas[['id_embargo', 'cod_imovel']]
+
+    # Recorta os embargos novos/alterados pelos imóveis do CAR da região
+    gravar = dump[dump[coluna_id].map(normalizar_id).isin(incluidos.union(alterados))]
+    novos_pares = pd.DataFrame(columns=['id_embargo', 'cod_imovel'])
+    if not gravar.empty:
+        with fiona.open(caminho_gpkg, layer='area_imovel') as camada:
+            gravar = gravar.to_crs(camada.crs_wkt)
+        area_regiao = ler_camada(caminho_gpkg, 'area_imovel', bbox=tuple(gravar.total_bounds))
+        # O código do imóvel vem do imóvel recortado (como no notebook); mantido também no dump, o
+        # overlay criaria cod_imovel_1/cod_imovel_2 e a coluna da camada ficaria vazia
+        gravar = gravar.drop(columns=[coluna_matricula_imovel], errors='ignore')
+        recortados = gpd.overlay(area_regiao, gravar, how="intersection", keep_geom_type=False)
+
+        if not recortados.empty:
+            # Mantém o esquema da camada existente
+            with fiona.open(caminho_gpkg, layer=tabela) as camada:
+                propriedades = dict(camada.schema['properties'])
+            recortados = ajustar_ao_esquema(recortados, propriedades)
+            recortados.to_file(caminho_gpkg, layer=tabela, driver="GPKG", mode="a", engine="fiona")
+
+            novos_pares = pd.DataFrame({
+                'id_embargo': recortados[coluna_id].map(normalizar_id).to_numpy(),
+                'cod_imovel': recortados[coluna_matricula_imovel].to_numpy(),
+            })
+
+    data = datetime.now().isoformat(timespec='seconds')
+    log = []
+    todos_pares = pd.concat([anteriores, novos_pares]).drop_duplicates()
+    for operacao, ids in [('inclusao', incluidos), ('alteracao', alterados), ('remocao', removidos)]:
+        pares = todos_pares[todos_pares['id_embargo'].isin(ids)]
+        sem_imovel = ids.difference(pares['id_embargo'])
+        log += [(data, tabela, id_embargo, operacao, cod) for id_embargo, cod in pares.itertuples(index=False)]
+        log += [(data, tabela, id_embargo, operacao, None) for id_embargo in sem_imovel]
+
+    # Exclusão das versões anteriores, estado e log em uma única transação (commit ou rollback juntos)
+    with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+        with conexao:
+            fid = coluna_fid(conexao, tabela)
+            for lote in em_lotes(linhas_substituidas['fid'].tolist()):
+                marcadores = ', '.join('?' * len(lote))
+                # O gatilho de exclusão do GeoPackage remove as entradas correspondentes do R-tree
+                conexao.execute(f'DELETE FROM "{tabela}" WHERE "{fid}" IN ({marcadores})', lote)
+            conexao.executemany(
+                'INSERT OR REPLACE INTO ingestao_estado (camada, id_embargo, hash) VALUES (?, ?, ?)',
+                [(tabela, id_embargo, hashes_novos[id_embargo]) for id_embargo in incluidos.union(alterados)]
+            )
+            for lote in em_lotes(removidos):
+                marcadores = ', '.join('?' * len(lote))
+                conexao.execute(
+                    f'DELETE FROM ingestao_estado WHERE camada = ? AND id_embargo IN ({marcadores})', [tabela] + lote
+                )
+            conexao.executemany(
+                'INSERT INTO ingestao_log (data, camada, id_embargo, operacao, cod_imovel) VALUES (?, ?, ?, ?, ?)', log
+            )
+
+    # Índices de atributo usados pelas leituras filtradas
+    criar_indice_atributo(caminho_gpkg, tabela, coluna_matricula_imovel)
+    criar_indice_atributo(caminho_gpkg, tabela, coluna_id)
+
+    return {'incluidos': len(incluidos), 'alterados': len(alterados), 'removidos': len(removidos)}
+
+
+def ler_log_alteracoes(caminho_gpkg, desde=None, coluna_matricula_imovel='cod_imovel'):
+    """
+    Lê o log de alterações da ingestão de embargos.
+
+    Args:
+        desde (String): Data/hora ISO; apenas alterações a partir dela são retornadas.
+        coluna_matricula_imovel (String): Nome da coluna do código do imóvel no resultado.
+
+    Returns:
+        DataFrame com data, camada, id_embargo, operacao e o código do imóvel
+    """
+    with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+        criar_tabelas_controle(conexao)
+        log = pd.read_sql_query(
+            'SELECT data, camada, id_embargo, operacao, cod_imovel FROM ingestao_log WHERE data >= ? ORDER BY id',
+            conexao, params=(desde or '',)
+        )
+    return log.rename(columns={'cod_imovel': coluna_matricula_imovel})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão incremental de embargos do IBAMA/ICMBio.")
+    parser.add_argument("gpkg", help="GeoPackage com area_imovel e as camadas de embargos")
+    parser.add_argument("fonte", choices=list(FONTES_EMBARGO), help="Fonte dos embargos")
+    parser.add_argument("dump", help="Arquivo com a nova lista de embargos")
+    parser.add_argument("--coluna-id", default=None, help="Coluna identificadora do embargo")
+    parser.add_argument("--coluna", default="cod_imovel", help="Coluna com o código do imóvel")
+    args = parser.parse_args()
+
+    resultado = ingerir_embargos(args.gpkg, args.fonte, args.dump, args.coluna_id, args.coluna)
+    print(f"{FONTES_EMBARGO[args.fonte]['tabela']}: {resultado['incluidos']} incluídos, "
+          f"{resultado['alterados']} alterados, {resultado['removidos']} removidos")
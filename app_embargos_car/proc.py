@@ -1,37 +1,308 @@
+import logging
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
 import folium
 import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
 
 import streamlit as st
+from streamlit import runtime
 
+if not runtime.exists():
+    # Nos scripts de linha de comando os caches do Streamlit ficam em memória; o aviso emitido
+    # na declaração de cada st.cache_data não se aplica
+    logging.getLogger("streamlit.runtime.caching.cache_data_api").setLevel(logging.ERROR)
 
-@st.cache_data
-def ler_geodataframe(caminho_gpkg, tabela):
+# Zoom máximo de cada faixa de nível de detalhe (acima da última faixa: resolução total)
+FAIXAS_ZOOM = [6, 9, 12, 15]
+
+# Acima desta quantidade de imóveis o app usa a leitura sob demanda (se não houver configuração)
+LIMITE_FEICOES_LEITURA_COMPLETA = 200_000
+
+# Projeção cônica equivalente de Albers (SIRGAS 2000), usada no cálculo de áreas no Brasil
+CRS_AREA_IGUAL = "+proj=aea +lat_0=-12 +lon_0=-54 +lat_1=-2 +lat_2=-22 +x_0=5000000 +y_0=10000000 +ellps=GRS80 +units=m +no_defs"
+
+
+def ler_camada(caminho_gpkg, tabela, coluna_filtro=None, valores=None, bbox=None):
     """
-    Lê os dados do GeoPackage e retorna um GeoDataFrame.
+    Lê os dados do GeoPackage e retorna um GeoDataFrame (sem cache; usada pelos scripts de linha de comando).
+
+    Sem filtros, lê a tabela inteira. Com filtros, apenas as feições necessárias são lidas:
+    o filtro de atributo usa o índice da coluna e o bbox usa o R-tree do GeoPackage.
+
+    Args:
+        caminho_gpkg (String): Caminho para o GeoPackage.
+        tabela (String): Nome da tabela (camada).
+        coluna_filtro (String): Coluna usada no filtro de atributo (ex.: cod_imovel).
+        valores (list): Valores aceitos na coluna_filtro.
+        bbox (tuple): Envelope (minx, miny, maxx, maxy) no sistema de referência da camada.
+
+    Returns:
+        GeoDataFrame
     """
-    query = f"SELECT * FROM {tabela}"
-    gdf = gpd.read_file(caminho_gpkg, sql=query, engine="fiona")
+    if coluna_filtro is None and bbox is None:
+        # O engine fiona ignora o parâmetro sql (e leria a primeira camada): a tabela vai em layer
+        gdf = gpd.read_file(caminho_gpkg, layer=tabela, engine="fiona")
+        return gdf
+
+    where = None
+    if coluna_filtro is not None:
+        criar_indice_atributo(caminho_gpkg, tabela, coluna_filtro)
+        lista_valores = ", ".join("'" + str(valor).replace("'", "''") + "'" for valor in valores)
+        where = f'"{coluna_filtro}" IN ({lista_valores})'
+
+    gdf = gpd.read_file(caminho_gpkg, layer=tabela, where=where, bbox=bbox, engine="fiona")
     return gdf
 
 
-def selecionar_imovel_car (gdf_car, codigo_imovel, coluna_matricula_imovel):
+@st.cache_resource(max_entries=32)
+def ler_geodataframe(caminho_gpkg, tabela, coluna_filtro=None, valores=None, bbox=None):
+    """
+    ler_camada em cache de recurso (app Streamlit).
+
+    Todas as sessões compartilham a mesma cópia das geometrias, que deve ser tratada como somente
+    leitura (selecione com .copy()/.iloc antes de modificar).
+
+    Returns:
+        GeoDataFrame
+    """
+    return ler_camada(caminho_gpkg, tabela, coluna_filtro, valores, bbox)
+
+
+def texto_atributos(gdf):
+    """
+    Atributos (sem a geometria) de cada linha concatenados em texto, usados nos hashes de alteração.
+
+    Valores nulos viram texto vazio: no pandas 3 o astype(str) mantém os nulos e o join falharia.
+
+    Returns:
+        Series com o texto de cada linha
+    """
+    atributos = gdf.drop(columns=gdf.geometry.name).astype(object)
+    return atributos.where(atributos.notna(), '').astype(str).agg('|'.join, axis=1)
+
+
+def criar_indice_atributo(caminho_gpkg, tabela, coluna):
+    """
+    Cria no GeoPackage o índice de atributo da coluna, caso ainda não exista.
+
+    Se o arquivo for somente leitura, a leitura segue sem o índice.
+    """
+    nome_indice = f"idx_{tabela}_{coluna}"
+    try:
+        with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+            conexao.execute(f'CREATE INDEX IF NOT EXISTS "{nome_indice}" ON "{tabela}" ("{coluna}")')
+            conexao.commit()
+    except sqlite3.OperationalError:
+        pass
+
+
+@st.cache_resource
+def garantir_indice_atributo(caminho_gpkg, tabela, coluna):
+    """criar_indice_atributo executado uma única vez por processo para cada tabela/coluna (app Streamlit)."""
+    criar_indice_atributo(caminho_gpkg, tabela, coluna)
+
+
+@st.cache_data
+def contar_feicoes(caminho_gpkg, tabela):
+    """
+    Quantidade de feições da tabela, sem carregar as geometrias.
+
+    Usa a contagem mantida em gpkg_ogr_contents e, se ela não existir, COUNT(*) na tabela.
+
+    Returns:
+        int
+    """
+    with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+        try:
+            linha = conexao.execute(
+                'SELECT feature_count FROM gpkg_ogr_contents WHERE table_name = ?', (tabela,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            linha = None
+        if linha is None or linha[0] is None:
+            linha = conexao.execute(f'SELECT COUNT(*) FROM "{tabela}"').fetchone()
+    return int(linha[0])
+
+
+def usar_leitura_sob_demanda(caminho_gpkg, tabela, limite_feicoes=LIMITE_FEICOES_LEITURA_COMPLETA):
+    """
+    Define se o app lê apenas o imóvel selecionado e a sua vizinhança.
+
+    A ordem é: variável de ambiente EMBARGOS_LEITURA_SOB_DEMANDA, st.secrets['EMBARGOS_LEITURA_SOB_DEMANDA']
+    ("1"/"true" liga, "0"/"false" desliga) e, sem configuração, o tamanho da camada (mais de
+    limite_feicoes imóveis).
+
+    Returns:
+        bool
+    """
+    configuracao = os.environ.get('EMBARGOS_LEITURA_SOB_DEMANDA')
+    if configuracao is None:
+        try:
+            configuracao = st.secrets.get('EMBARGOS_LEITURA_SOB_DEMANDA')
+        except Exception:
+            configuracao = None
+    if configuracao is not None and str(configuracao).strip().lower() not in ('', 'auto'):
+        return str(configuracao).strip().lower() in ('1', 'true', 'sim', 'yes')
+    return contar_feicoes(caminho_gpkg, tabela) > limite_feicoes
+
+
+@st.cache_data
+def listar_codigos_imoveis(caminho_gpkg, tabela, coluna_matricula_imovel):
+    """
+    Lista os códigos distintos dos imóveis sem carregar as geometrias.
+
+    Returns:
+        list
+    """
+    garantir_indice_atributo(caminho_gpkg, tabela, coluna_matricula_imovel)
+    with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+        linhas = conexao.execute(
+            f'SELECT DISTINCT "{coluna_matricula_imovel}" FROM "{tabela}" '
+            f'WHERE "{coluna_matricula_imovel}" IS NOT NULL'
+        ).fetchall()
+    return [linha[0] for linha in linhas]
+
+
+@st.cache_resource(max_entries=16)
+def memoria_camada(_gdf, chave):
+    """
+    Estima a memória residente de uma camada compartilhada (atributos e geometrias).
+
+    A memória das geometrias fica no GEOS e não é vista pelo pandas; é estimada pela
+    quantidade de coordenadas (8 bytes por ordenada) mais um custo fixo por geometria.
+
+    Returns:
+        dict com 'feicoes', 'atributos_mb' e 'geometrias_mb'
+    """
+    geometrias = _gdf.geometry.to_numpy()
+    bytes_geometrias = (
+        shapely.get_num_coordinates(geometrias).sum() * 8 * 2
+        + len(geometrias) * 100
+    )
+    bytes_atributos = _gdf.drop(columns=_gdf.geometry.name).memory_usage(deep=True).sum()
+    return {
+        'feicoes': len(_gdf),
+        'atributos_mb': bytes_atributos / 1024 ** 2,
+        'geometrias_mb': bytes_geometrias / 1024 ** 2,
+    }
+
+
+
+def pico_memoria_mb():
+    """
+    Pico de memória residente do processo (MB), ou None se não disponível.
+
+    O módulo resource só existe em sistemas Unix (no Windows retorna None).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss em KB no Linux e em bytes no macOS
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+
+@st.cache_data
+def ler_tabela_conformidade(caminho_tabela, coluna_matricula_imovel):
+    """
+    Lê a tabela de conformidade pré-calculada (conformidade.py) indexada pelo código do imóvel.
+
+    A consulta de um imóvel passa a ser um acesso direto pelo índice (tabela.loc[codigo]).
+
+    Returns:
+        DataFrame
+    """
+    tabela = pd.read_parquet(caminho_tabela)
+    return tabela.set_index(coluna_matricula_imovel)
+
+
+def janela_imovel(caminho_gpkg, tabela, codigo_imovel, coluna_matricula_imovel, margem=1.0):
+    """
+    Calcula a janela de leitura (bbox) ao redor do imóvel selecionado.
+
+    Args:
+        margem (float): Expansão da janela, proporcional à maior dimensão do imóvel.
+
+    Returns:
+        tuple (minx, miny, maxx, maxy)
+    """
+    gdf_imovel = ler_geodataframe(caminho_gpkg, tabela, coluna_matricula_imovel, [codigo_imovel])
+    minx, miny, maxx, maxy = gdf_imovel.geometry.total_bounds
+    folga = max(maxx - minx, maxy - miny) * margem
+    return (minx - folga, miny - folga, maxx + folga, maxy + folga)
+
+
+@st.cache_resource(max_entries=16)
+def construir_indice_imoveis(_gdf, chave, coluna_matricula_imovel):
+    """Constrói o índice código do imóvel -> posições das linhas e os envelopes de todas as feições.
+
+    O índice é criado uma única vez por camada; a seleção de um imóvel passa a ser uma consulta
+    no dicionário, sem varrer a coluna de códigos.
+
+    Args:
+        _gdf (GeoDataFrame): Camada (área do imóvel ou embargos).
+        chave (String): Identificador da camada, usado como chave do cache.
+        coluna_matricula_imovel (String): Coluna com o código do imóvel.
+
+    Returns:
+        dict com 'posicoes' (código -> array de posições) e 'bounds' (array n x 4)
+    """
+    return {
+        'posicoes': _gdf.groupby(coluna_matricula_imovel, sort=False).indices,
+        'bounds': shapely.bounds(_gdf.geometry.to_numpy()),
+    }
+
+
+def selecionar_por_indice(gdf, indice, codigo_imovel):
+    """Selecionar as linhas do código do imóvel usando o índice de construir_indice_imoveis.
+
+    Returns:
+        GeoDataFrame com as linhas do imóvel (vazio se o código não existir)
+    """
+    posicoes = indice['posicoes'].get(codigo_imovel, np.array([], dtype=np.intp))
+    return gdf.iloc[posicoes]
+
+
+def selecionar_imovel_car (gdf_car, codigo_imovel, coluna_matricula_imovel, indice=None):
     
     """Selecionar o imóvel do INCRA com base no código.
 
     Args:
         gdf_incra (GeoDataFrame): GeoDataFrame com os dados do INCRA.
         codigo_imovel (String): Código do imóvel a ser selecionado.
+        indice (dict): Índice de construir_indice_imoveis. Se informado, a seleção e o
+            Bounding Box são obtidos diretamente do índice.
 
     Returns:
         gdf_incra_selecionado, centro_lat, centro_lon, miny, maxy, minx, maxx
     """
-    # Selecionar o CAR considerando selectbox
-    gdf_car_selecionado = gdf_car[gdf_car[coluna_matricula_imovel]==codigo_imovel].copy()
+    if indice is not None:
+        # Selecionar o CAR pelas posições pré-calculadas do código
+        gdf_car_selecionado = selecionar_por_indice(gdf_car, indice, codigo_imovel)
+        posicoes = indice['posicoes'].get(codigo_imovel, np.array([], dtype=np.intp))
+        caixas = indice['bounds'][posicoes]
+        # Coords do Bounding Box a partir dos envelopes pré-calculados
+        if len(caixas):
+            minx, miny = caixas[:, 0].min(), caixas[:, 1].min()
+            maxx, maxy = caixas[:, 2].max(), caixas[:, 3].max()
+        else:
+            minx = miny = maxx = maxy = np.nan
+    else:
+        # Selecionar o CAR considerando selectbox
+        gdf_car_selecionado = gdf_car[gdf_car[coluna_matricula_imovel]==codigo_imovel].copy()
 
-    # Calcular o Bounding Box do polígono
-    bounds = gdf_car_selecionado.geometry.total_bounds
-    # Coords do Bounding Box
-    minx, miny, maxx, maxy = bounds
+        # Calcular o Bounding Box do polígono
+        bounds = gdf_car_selecionado.geometry.total_bounds
+        # Coords do Bounding Box
+        minx, miny, maxx, maxy = bounds
 
     # Definir o centro do mapa com base no polígono selecionado
     centro_lat = (miny + maxy) / 2
@@ -41,13 +312,132 @@ def selecionar_imovel_car (gdf_car, codigo_imovel, coluna_matricula_imovel):
 
 
 
+def zoom_para_extensao(minx, miny, maxx, maxy, largura_px=1000, altura_px=500):
+    """
+    Estima o nível de zoom (Web Mercator) em que a extensão cabe no mapa, como no fit_bounds.
+
+    Returns:
+        int
+    """
+    extensao = max((maxx - minx) / largura_px, (maxy - miny) / altura_px)
+    if not extensao > 0:
+        return FAIXAS_ZOOM[-1] + 1
+    # Graus por pixel no zoom z: 360 / (256 * 2^z)
+    return int(np.clip(np.floor(np.log2(360 / (256 * extensao))), 0, 20))
+
+
+def faixa_zoom(zoom):
+    """
+    Retorna o zoom de referência da faixa de nível de detalhe, ou None para resolução total.
+    """
+    for limite in FAIXAS_ZOOM:
+        if zoom <= limite:
+            return limite
+    return None
+
+
+def tamanho_pixel(crs, zoom):
+    """Tamanho do pixel (Web Mercator) no zoom, nas unidades do sistema de referência da camada."""
+    circunferencia = 40075016.686 if crs is not None and crs.is_projected else 360
+    return circunferencia / (256 * 2 ** zoom)
+
+
+def janela_visivel(minx, miny, maxx, maxy, zoom, crs=None, largura_px=1000, altura_px=500):
+    """
+    Região que pode aparecer no mapa no zoom informado com o centro do mapa sobre a extensão
+    (a extensão ampliada em meia tela para cada lado).
+
+    Returns:
+        tuple (minx, miny, maxx, maxy)
+    """
+    pixel = tamanho_pixel(crs, zoom)
+    meia_largura, meia_altura = largura_px * pixel / 2, altura_px * pixel / 2
+    return (minx - meia_largura, miny - meia_altura, maxx + meia_largura, maxy + meia_altura)
+
+
+@st.cache_resource(max_entries=32)
+def geometrias_simplificadas(_gdf, chave, zoom_faixa):
+    """
+    Geometrias da camada simplificadas para a faixa de zoom (cache por camada e faixa).
+
+    Simplificação preservando a topologia com tolerância de ~1 pixel no zoom da faixa e coordenadas
+    arredondadas na mesma ordem de grandeza.
+
+    Returns:
+        array de geometrias shapely (alinhado com as linhas da camada)
+    """
+    tolerancia = tamanho_pixel(_gdf.crs, zoom_faixa)
+    geometrias = shapely.simplify(_gdf.geometry.to_numpy(), tolerancia, preserve_topology=True)
+    return shapely.set_precision(geometrias, tolerancia / 4, mode="pointwise")
+
+
+@st.cache_data(max_entries=32)
+def geojson_simplificado(_gdf, chave, colunas, zoom_faixa):
+    """
+    Serializa a camada em GeoJSON simplificado para a faixa de zoom.
+
+    Args:
+        _gdf (GeoDataFrame): Camada a ser serializada (não entra no hash do cache).
+        chave (String): Identificador da camada, usado como chave do cache.
+        colunas (list): Colunas de atributos mantidas no GeoJSON.
+        zoom_faixa (int): Zoom de referência da faixa (faixa_zoom). Se None, sem simplificação.
+
+    Returns:
+        String GeoJSON
+    """
+    gdf = _gdf[list(colunas) + [_gdf.geometry.name]]
+    if zoom_faixa is None:
+        return gdf.to_json()
+
+    geometrias = geometrias_simplificadas(_gdf, chave, zoom_faixa)
+    gdf = gdf.set_geometry(gpd.GeoSeries(geometrias, index=gdf.index, crs=gdf.crs), inplace=False)
+    gdf = gdf[~gdf.geometry.is_empty]
+    return gdf.to_json()
+
+
+@st.cache_data(max_entries=32)
+def geojson_nivel_detalhe(_gdf, chave, colunas, extensao):
+    """
+    Serializa a camada em GeoJSON com o nível de detalhe de acordo com a distância ao imóvel selecionado.
+
+    O mapa abre ajustado ao imóvel e, ao afastar o zoom, a região visível cresce. Cada feição recebe
+    a simplificação da faixa de zoom mais detalhada em que pode aparecer com o centro do mapa sobre o
+    imóvel: o imóvel e a vizinhança ficam em resolução total e o restante da camada (visível apenas
+    com o mapa afastado) é simplificado.
+
+    Args:
+        _gdf (GeoDataFrame): Camada a ser serializada (não entra no hash do cache).
+        chave (String): Identificador da camada, usado como chave do cache.
+        colunas (list): Colunas de atributos mantidas no GeoJSON.
+        extensao (tuple): (minx, miny, maxx, maxy) do imóvel selecionado, no sistema da camada.
+
+    Returns:
+        String GeoJSON
+    """
+    gdf = _gdf[list(colunas) + [_gdf.geometry.name]]
+    arvore = construir_indice_espacial(_gdf, chave)
+
+    # Todas as feições na faixa mais grossa; da faixa seguinte à resolução total, as feições visíveis
+    # a partir do primeiro zoom acima da faixa anterior recebem o nível de detalhe da faixa
+    geometrias = geometrias_simplificadas(_gdf, chave, FAIXAS_ZOOM[0]).copy()
+    for anterior, faixa in zip(FAIXAS_ZOOM, FAIXAS_ZOOM[1:] + [None]):
+        janela = janela_visivel(*extensao, anterior + 1, crs=_gdf.crs)
+        posicoes = arvore.query(shapely.box(*janela))
+        origem = _gdf.geometry.to_numpy() if faixa is None else geometrias_simplificadas(_gdf, chave, faixa)
+        geometrias[posicoes] = origem[posicoes]
+
+    gdf = gdf.set_geometry(gpd.GeoSeries(geometrias, index=gdf.index, crs=gdf.crs), inplace=False)
+    gdf = gdf[~gdf.geometry.is_empty]
+    return gdf.to_json()
+
+
 def inserir_geojson_folium (gdf, nome_coluna
                             ,alias_coluna
                             ,nome_camada
                             ,cor_preenchimento
                             ,mapa):
     """
-    Cria um mapa Folium a partir de um GeoDataFrame.
+    Cria um mapa Folium a partir de um GeoDataFrame (ou de um GeoJSON já serializado).
     """
 
 
@@ -73,7 +463,143 @@ def inserir_geojson_folium (gdf, nome_coluna
 
     return mapa
 
+@st.cache_resource(max_entries=16)
+def construir_indice_espacial(_gdf, chave):
+    """Constrói a árvore espacial (STRtree) das geometrias de uma camada.
+
+    A árvore é criada uma única vez por camada e compartilhada entre os reruns do Streamlit.
+
+    Args:
+        _gdf (GeoDataFrame): Camada de embargos (o "_" evita que o Streamlit faça o hash do GeoDataFrame).
+        chave (String): Identificador da camada, usado como chave do cache.
+
+    Returns:
+        STRtree
+    """
+    return STRtree(_gdf.geometry.to_numpy())
+
+
+def selecionar_embargos_sobrepostos(gdf_embargos, gdf_imovel, arvore=None):
+    """Selecionar os embargos que se sobrepõem geometricamente ao imóvel, independente do código.
+
+    Args:
+        gdf_embargos (GeoDataFrame): GeoDataFrame com os embargos (IBAMA ou ICMBio).
+        gdf_imovel (GeoDataFrame): GeoDataFrame com o imóvel selecionado.
+        arvore (STRtree): Índice espacial da camada de embargos. Se None, é construído na hora.
+
+    Returns:
+        gdf_embargos_sobrepostos
+    """
+    if gdf_imovel.empty or gdf_embargos.empty:
+        return gdf_embargos.iloc[0:0].copy()
+
+    # Compatibilizar o sistema de referência do imóvel com o dos embargos
+    if gdf_imovel.crs != gdf_embargos.crs:
+        gdf_imovel = gdf_imovel.to_crs(gdf_embargos.crs)
+
+    geometria_imovel = shapely.union_all(geometrias_validas(gdf_imovel.geometry.to_numpy()))
+    shapely.prepare(geometria_imovel)
+
+    if arvore is None:
+        arvore = STRtree(gdf_embargos.geometry.to_numpy())
+
+    # Consulta pelo envelope do imóvel no índice espacial (apenas candidatos)
+    candidatos = arvore.query(geometria_imovel)
+    candidatos.sort()
+    geometrias = arvore.geometries.take(candidatos)
+
+    # Predicado exato: sobreposição de área (descarta embargos que apenas tocam a divisa)
+    sobrepostos = shapely.intersects(geometria_imovel, geometrias) & ~shapely.touches(geometria_imovel, geometrias)
+
+    return gdf_embargos.iloc[candidatos[sobrepostos]].copy()
+
+
+def geometrias_validas(geometrias):
+    """Corrige geometrias inválidas (ex.: polígonos autointersectados dos embargos) antes de recortes e uniões."""
+    return shapely.make_valid(geometrias)
+
+
+def calcular_area_sobreposicao(gdf_imovel, gdf_embargos):
+    """Calcular a área embargada dentro do imóvel selecionado, em projeção equivalente (Albers).
+
+    Os embargos são recortados pelo imóvel e unidos antes do cálculo, para que embargos
+    sobrepostos não sejam contados duas vezes. Geometrias inválidas são corrigidas antes
+    (make_valid), pois o GEOS não recorta polígonos autointersectados.
+
+    Args:
+        gdf_imovel (GeoDataFrame): GeoDataFrame com o imóvel selecionado.
+        gdf_embargos (GeoDataFrame): Embargos associados ao imóvel (por código e/ou sobreposição).
+
+    Returns:
+        area_imovel_ha, area_embargada_ha, percentual_embargado
+    """
+    if gdf_imovel.empty:
+        return 0.0, 0.0, 0.0
+
+    imovel = shapely.union_all(geometrias_validas(gdf_imovel.to_crs(CRS_AREA_IGUAL).geometry.to_numpy()))
+    area_imovel_ha = imovel.area / 10_000
+    if gdf_embargos.empty or area_imovel_ha == 0:
+        return area_imovel_ha, 0.0, 0.0
+
+    embargos = geometrias_validas(gdf_embargos.to_crs(CRS_AREA_IGUAL).geometry.to_numpy())
+    area_embargada_ha = shapely.union_all(shapely.intersection(embargos, imovel)).area / 10_000
+
+    return area_imovel_ha, area_embargada_ha, 100 * area_embargada_ha / area_imovel_ha
+
+
+def calcular_sobreposicao_em_lote(gdf_car, gdf_embargos, coluna_matricula_imovel):
+    """Calcular a área embargada e o percentual embargado de todos os imóveis de uma vez.
+
+    Os pares imóvel x embargo são obtidos pelo índice espacial (pré-filtro por envelope e
+    predicado intersects) e recortados com operações vetorizadas do shapely (após make_valid).
+
+    Args:
+        gdf_car (GeoDataFrame): Imóveis do CAR.
+        gdf_embargos (GeoDataFrame): Camada de embargos (IBAMA ou ICMBio).
+        coluna_matricula_imovel (String): Coluna com o código do imóvel.
+
+    Returns:
+        DataFrame indexado pelo código com area_imovel_ha, area_embargada_ha e percentual_embargado
+    """
+    imoveis = geometrias_validas(gdf_car.geometry.to_crs(CRS_AREA_IGUAL).to_numpy())
+    embargos = geometrias_validas(gdf_embargos.geometry.to_crs(CRS_AREA_IGUAL).to_numpy())
+
+    # Pares (imóvel, embargo) que se intersectam
+    arvore = STRtree(embargos)
+    pos_imovel, pos_embargo = arvore.query(imoveis, predicate="intersects")
+    intersecoes = shapely.intersection(imoveis[pos_imovel], embargos[pos_embargo])
+
+    # União dos recortes por imóvel (embargos sobrepostos não são contados duas vezes)
+    area_embargada = np.zeros(len(imoveis))
+    if len(pos_imovel):
+        recortes = gpd.GeoDataFrame({'pos': pos_imovel}, geometry=intersecoes, crs=CRS_AREA_IGUAL)
+        uniao = recortes.dissolve(by='pos')
+        area_embargada[uniao.index.to_numpy()] = uniao.geometry.area.to_numpy()
+
+    resultado = pd.DataFrame({
+        coluna_matricula_imovel: gdf_car[coluna_matricula_imovel].to_numpy(),
+        'area_imovel_ha': shapely.area(imoveis) / 10_000,
+        'area_embargada_ha': area_embargada / 10_000,
+    }).groupby(coluna_matricula_imovel).sum()
+    resultado['percentual_embargado'] = (
+        100 * resultado['area_embargada_ha'] / resultado['area_imovel_ha'].where(resultado['area_imovel_ha'] > 0)
+    ).fillna(0.0)
+    return resultado
+
+
 # Função para exibir status com emoji
-def mostrar_status(nome, status):
-    emoji = "✅" if status == 0 else "❌"
-    
+def mostrar_status(nome, status, sobreposicoes=None):
+    """
+    Exibe no sidebar o status de conformidade de uma camada de embargos.
+
+    Args:
+        nome (String): Nome da camada exibido no sidebar.
+        status (int): Quantidade de embargos vinculados pelo código do imóvel.
+        sobreposicoes (int): Quantidade de embargos que se sobrepõem geometricamente ao imóvel.
+            Se None, a verificação geométrica não é exibida.
+    """
+    emoji = "✅" if status == 0 and not sobreposicoes else "❌"
+    texto = f"{emoji} {nome}"
+    if sobreposicoes is not None:
+        texto += f" (código: {status} | sobreposição: {sobreposicoes})"
+    st.sidebar.write(texto)
@@ -1,26 +1,31 @@
+import time
+inicio_script = time.perf_counter()
+
 import streamlit as st
 import streamlit_folium
 from streamlit_folium import st_folium
-import geemap
 import geemap.foliumap as geemap
 import ee
-import plotly.express as px
 import folium
 import pandas as pd
-import geopandas as gpd
 from datetime import datetime
 import json
+import os
+import sys
 from utils_gee import maskCloudAndShadowsSR, add_indices
 
+# Módulos compartilhados entre os apps (pasta comum/ na raiz do repositório)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.ee_inicializacao import inicializar_ee, exibir_tempo_execucao
+from comum.escala import planejar_escala, executar_com_fallback, descrever_plano
+from comum.cache_tiles import adicionar_camada_ee
+
+# plotly e geopandas são importados apenas quando usados (partida mais rápida)
 
-# Autenticação com Earth Engine
-# service_account = 'my-service-account@...gserviceaccount.com'
-# credentials = ee.ServiceAccountCredentials(service_account, 'ee-scriptsremoteambgeo-040e397e0cc0.json')
-# ee.Initialize(credentials)
-# Inicializa um mapa apenas para garantir autenticação do Earth Engine
-auth_map = geemap.Map()
 # Configuração da página
 st.set_page_config(layout="wide")
+# Autenticação com Earth Engine (uma única vez por processo, credenciais em cache)
+inicializar_ee()
 st.title('Aplicativo para seleção de imagens, cálculo de índices e download das imagens')
 st.markdown(""" 
 #### O APP foi desenvolvido para que o usuário possa carregar a região de interesse, definir o período e visualizar o diferentes índices de vegetação e água. 
@@ -38,11 +43,19 @@ uploaded_file = st.sidebar.file_uploader("Faça o upload da sua área de estudo"
 st.sidebar.markdown("""### Para criar o arquivo **GeoJSON** use o site [geojson.io](https://geojson.io/#new&map=2/0/20).""")
 
 if uploaded_file is not None:
-    gdf = gpd.read_file(uploaded_file)
-    shp_json = gdf.to_json()
-    f_json = json.loads(shp_json)['features']
+    import geopandas as gpd
+    from comum.roi import descrever_relatorio
+    from comum.cache_roi import resolver_roi
+
+    # O arquivo só é lido se ainda não estiver no cache de ROIs (SHA-256 do conteúdo)
+    # Simplifica a ROI para a resolução do Sentinel 2 (10 m)
+    entrada_roi = resolver_roi(uploaded_file.getvalue(), lambda: gpd.read_file(uploaded_file), resolucao_m=10)
+    f_json = entrada_roi['feicoes']
     roi = ee.FeatureCollection(f_json)
     st.sidebar.success("Arquivo carregado com sucesso!")
+    st.sidebar.caption(descrever_relatorio(entrada_roi['relatorio']))
+    if entrada_roi['origem'] != 'leitura':
+        st.sidebar.caption("ROI recuperada do cache (arquivo já carregado anteriormente).")
 
 point = ee.Geometry.Point(-45.259679, -17.871838)
 m.centerObject(point, 8)
@@ -53,6 +66,8 @@ end_date = st.sidebar.date_input("Selecione a data final", datetime.now())
 cloud_percentage_limit = st.sidebar.slider("Limite de percentual de nuvens", 0, 100, 5)
 
 if roi is not None:
+    import plotly.express as px
+
   # Função de nuvens, fator de escala e clip
     def maskCloudAndShadowsSR(image):
         cloudProb = image.select('MSK_CLDPRB');
@@ -121,29 +136,39 @@ if roi is not None:
       # ##Data Frame
     # expander.write(data_table)
     st.divider()
-    # Função para aplicar a redução por regiões para toda a coleção usando map
-    def reduce_region_for_collection(img):
-        # Obtém a data da imagem
-        date = img.date().format('yyyy-MM-dd')
+    bands = ['ndvi', 'ndre','evi','ndwi','mndwi','ndmi','ndpi','spri','savi']
 
-        # Aplica a redução por regiões para a imagem
-        stats = img.reduceRegions(
-            collection=roi,
-            reducer=ee.Reducer.mean(),
-            scale=10  # Defina a escala apropriada para sua aplicação
-        )
+    def serie_indices(escala, tile_scale):
+        # Função para aplicar a redução por regiões para toda a coleção usando map
+        def reduce_region_for_collection(img):
+            # Obtém a data da imagem
+            date = img.date().format('yyyy-MM-dd')
 
-        # Adiciona a data à propriedade 'data'
-        stats = stats.map(lambda f: f.set('data', date))
+            # Aplica a redução por regiões para a imagem
+            stats = img.reduceRegions(
+                collection=roi,
+                reducer=ee.Reducer.mean(),
+                scale=escala,
+                tileScale=tile_scale
+            )
 
-        return stats
+            # Adiciona a data à propriedade 'data'
+            stats = stats.map(lambda f: f.set('data', date))
 
-    # Aplica a redução por regiões para toda a coleção usando map
-    bands = ['ndvi', 'ndre','evi','ndwi','mndwi','ndmi','ndpi','spri','savi']
-    stats_collection = collection.select(bands).map(reduce_region_for_collection)
+            return stats
+
+        # Aplica a redução por regiões para toda a coleção usando map
+        stats_collection = collection.select(bands).map(reduce_region_for_collection)
 
-    # Converte para df
-    df = geemap.ee_to_df(stats_collection.flatten())
+        # Converte para df
+        return geemap.ee_to_df(stats_collection.flatten())
+
+    # Escala planejada pelo orçamento de pixels (área da ROI x imagens x índices, Sentinel-2 a 10 m);
+    # em caso de timeout/excesso de pixels a redução é repetida em escala mais grossa
+    plano_escala = planejar_escala(entrada_roi['relatorio']['area_final_ha'] * 1e4, 10,
+                                   qtd_bandas=max(1, len(data_table)) * len(bands))
+    df, plano_usado = executar_com_fallback(serie_indices, plano_escala)
+    st.sidebar.caption(descrever_plano(plano_usado))
 
     # Adiciona a data como coluna no formato datetime
     df['datetime'] = pd.to_datetime(df['data'], format='%Y-%m-%d')
@@ -183,7 +208,7 @@ if roi is not None:
     
 
     contour_image = ee.Image().byte().paint(featureCollection=roi, color=1, width=2)
-    m.addLayer(contour_image, {'palette': 'FF0000'}, 'Região de Interesse')
+    adicionar_camada_ee(m, contour_image, {'palette': 'FF0000'}, 'Região de Interesse')
     m.centerObject(roi, 13)
     
      # ================== ADICIONAR MOSAICO DE ÍNDICE ==================
@@ -213,8 +238,8 @@ if roi is not None:
     else:
         palette = ['gray']  # fallback
 
-    # Adicionar camada ao mapa
-    m.addLayer(mean_index_image, {
+    # Adicionar camada ao mapa (map ID em cache: reexecuções com o mesmo índice e período não voltam ao servidor)
+    adicionar_camada_ee(m, mean_index_image, {
         'min': -1,
         'max': 1,
         'palette': palette
@@ -222,5 +247,8 @@ if roi is not None:
 
 m.to_streamlit()
 
+# Tempo desta execução do script (partida a frio ou reexecução)
+exibir_tempo_execucao('app_index', inicio_script)
+
 st.sidebar.markdown('Desenvolvido por [Christhian Cunha](https://www.linkedin.com/in/christhian-santana-cunha/)')
 st.sidebar.markdown('Conheça nossas formações [AmbGEO](https://ambgeo.com/)')
\ No newline at end of file
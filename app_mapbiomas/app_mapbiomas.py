@@ -1,17 +1,31 @@
+import time
+inicio_script = time.perf_counter()
+
 import streamlit as st
 import geemap.foliumap as geemap
 import ee
 import json
+import os
+import sys
 import pandas as pd
-import plotly.express as px
- 
-# Inicialização do Earth Engine
+
+# Módulos compartilhados entre os apps (pasta comum/ na raiz do repositório)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comum.ee_inicializacao import inicializar_ee, exibir_tempo_execucao
+from comum.escala import planejar_escala, executar_com_fallback, descrever_plano
+from comum.cache_tiles import adicionar_camada_ee
+
+# plotly e geopandas são importados apenas quando usados (partida mais rápida)
+
+st.set_page_config(layout="wide")
+
+# Inicialização do Earth Engine (uma única vez por processo, credenciais em cache)
+inicializar_ee()
 
 # Inicializa o mapa
 m = geemap.Map(center=[-14.5, -52], zoom=4)
 m.setOptions('HYBRID')
 
-st.set_page_config(layout="wide")
 st.title("MapBiomas - Análise de Uso e Cobertura com GeoJSON")
 
 st.markdown("""
@@ -110,27 +124,44 @@ legenda = pd.DataFrame([
 
 
 if geojson_file is not None and run_analysis:
+    import geopandas as gpd
+    import plotly.express as px
+    from comum.roi import descrever_relatorio
+    from comum.cache_roi import resolver_roi
+
     try:
-        geojson_data = json.load(geojson_file)
-        fc = geemap.geojson_to_ee(geojson_data)
-        m.addLayer(fc, {}, "ROI")
+        # O arquivo só é lido se ainda não estiver no cache de ROIs (SHA-256 do conteúdo)
+        # Simplifica a ROI para a resolução do MapBiomas (30 m)
+        entrada_roi = resolver_roi(geojson_file.getvalue(), lambda: gpd.read_file(geojson_file), resolucao_m=30)
+        fc = geemap.geojson_to_ee({"type": "FeatureCollection", "features": entrada_roi['feicoes']})
+        st.sidebar.caption(descrever_relatorio(entrada_roi['relatorio']))
+        if entrada_roi['origem'] != 'leitura':
+            st.sidebar.caption("ROI recuperada do cache (arquivo já carregado anteriormente).")
+        adicionar_camada_ee(m, fc, {}, "ROI")
         m.centerObject(fc, zoom=10)
 
         # Recorta a imagem pela ROI
         lulc_clipped = lulc.clip(fc)
-        m.addLayer(lulc_clipped, vis_params, f'MapBiomas Col 9 - {ano} (Recortado)')
+        adicionar_camada_ee(m, lulc_clipped, vis_params, f'MapBiomas Col 9 - {ano} (Recortado)')
 
         # Calcula área por classe
         pixel_area = ee.Image.pixelArea().divide(1e4)  # ha
         image_area = pixel_area.addBands(lulc)
-        area_por_classe = image_area.reduceRegion(
-            reducer=ee.Reducer.sum().group(groupField=1, groupName='class'),
-            geometry=fc.geometry(),
-            scale=30,
-            maxPixels=1e13
-        )
-
-        stats = area_por_classe.getInfo()
+
+        def area_classes(escala, tile_scale):
+            return image_area.reduceRegion(
+                reducer=ee.Reducer.sum().group(groupField=1, groupName='class'),
+                geometry=fc.geometry(),
+                scale=escala,
+                maxPixels=1e13,
+                tileScale=tile_scale
+            ).getInfo()
+
+        # Escala planejada pelo orçamento de pixels (área da ROI, MapBiomas a 30 m); em caso de
+        # timeout/memória a redução é repetida em escala mais grossa
+        plano_escala = planejar_escala(entrada_roi['relatorio']['area_final_ha'] * 1e4, 30)
+        stats, plano_usado = executar_com_fallback(area_classes, plano_escala)
+        st.sidebar.caption(descrever_plano(plano_usado))
         grupos = stats['groups']
         df = pd.DataFrame(grupos)
         df = df.rename(columns={"class": "Classe", "sum": "Área (ha)"})
@@ -150,6 +181,10 @@ if geojson_file is not None and run_analysis:
     except Exception as e:
         st.error(f"Erro ao processar o arquivo: {e}")
 
-# Camada de uso e cobertura
-m.addLayer(lulc, vis_params, f'MapBiomas Col 9 - {ano}')
+# Camada de uso e cobertura (map ID em cache: o mesmo ano não volta ao servidor a cada reexecução)
+adicionar_camada_ee(m, lulc, vis_params, f'MapBiomas Col 9 - {ano}')
 m.to_streamlit(height=600)
+
+# Tempo desta execução do script (partida a frio ou reexecução)
+exibir_tempo_execucao('app_mapbiomas', inicio_script)
+
@@ -0,0 +1,3 @@
+"""
+Módulos compartilhados entre os apps do Google Earth Engine (clima, índices e MapBiomas).
+"""
@@ -0,0 +1,140 @@
+"""
+Cache em disco das ROIs carregadas, endereçado pelo conteúdo (SHA-256 dos bytes do upload).
+
+Cada entrada guarda a geometria normalizada (2D, EPSG:4326), os limites (bounds) e o GeoJSON
+simplificado pronto para o Earth Engine de cada combinação (resolução, orçamento). O mesmo arquivo
+carregado em qualquer um dos apps é resolvido sem nova leitura.
+
+As entradas são gravadas em JSON (a geometria como GeoJSON), nunca em pickle, em um diretório do
+usuário com permissão 0700; uma entrada ilegível ou de formato antigo é tratada como ausente.
+
+O tamanho total do cache é limitado; as entradas usadas há mais tempo são removidas primeiro (LRU,
+pela data de modificação, atualizada a cada acerto).
+"""
+import getpass
+import hashlib
+import json
+import os
+import tempfile
+
+import geopandas as gpd
+
+from comum.roi import ORCAMENTO_PADRAO_BYTES, normalizar_roi, preparar_roi
+
+DIRETORIO_CACHE = os.environ.get("ROI_CACHE_DIR",
+                                 os.path.join(tempfile.gettempdir(), f"sbsr2025_roi_{getpass.getuser()}"))
+
+# Tamanho máximo do cache em disco
+LIMITE_CACHE_BYTES = int(os.environ.get("ROI_CACHE_MAX_MB", 256)) * 1024 ** 2
+
+
+def hash_conteudo(dados):
+    """SHA-256 dos bytes do upload."""
+    return hashlib.sha256(dados).hexdigest()
+
+
+def caminho_entrada(chave, diretorio=DIRETORIO_CACHE):
+    return os.path.join(diretorio, f"{chave}.json")
+
+
+def chave_parametros(parametros):
+    """Chave JSON de uma combinação (resolução, orçamento)."""
+    return f"{parametros[0]:g}|{parametros[1]}"
+
+
+def ler_entrada(chave, diretorio=DIRETORIO_CACHE):
+    """Lê a entrada do cache (ou None) e a marca como usada recentemente."""
+    caminho = caminho_entrada(chave, diretorio)
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            dados = json.load(arquivo)
+        entrada = {
+            'gdf': gpd.GeoDataFrame.from_features(dados['gdf']['features'], crs=dados['crs']),
+            'bounds': tuple(dados['bounds']),
+            'ee': dados['ee'],
+        }
+        os.utime(caminho)
+        return entrada
+    except Exception:
+        # Qualquer falha (arquivo ausente, corrompido ou de versão anterior) é uma falta no cache
+        return None
+
+
+def gravar_entrada(chave, entrada, diretorio=DIRETORIO_CACHE, limite_bytes=LIMITE_CACHE_BYTES):
+    """Grava a entrada de forma atômica e aplica o limite de tamanho do cache."""
+    os.makedirs(diretorio, mode=0o700, exist_ok=True)
+    dados = {
+        'gdf': json.loads(entrada['gdf'].to_json(drop_id=True)),
+        'crs': entrada['gdf'].crs.to_string(),
+        'bounds': [float(valor) for valor in entrada['bounds']],
+        'ee': entrada['ee'],
+    }
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    with os.fdopen(descritor, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, ensure_ascii=False)
+    os.replace(temporario, caminho_entrada(chave, diretorio))
+    remover_excedente(diretorio, limite_bytes)
+
+
+def remover_excedente(diretorio=DIRETORIO_CACHE, limite_bytes=LIMITE_CACHE_BYTES):
+    """Remove as entradas usadas há mais tempo até o cache caber no limite."""
+    entradas = []
+    for nome in os.listdir(diretorio):
+        if nome.endswith('.json'):
+            info = os.stat(os.path.join(diretorio, nome))
+            entradas.append((info.st_mtime, info.st_size, nome))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, nome in sorted(entradas):
+        if total <= limite_bytes:
+            break
+        try:
+            os.remove(os.path.join(diretorio, nome))
+        except OSError:
+            continue
+        total -= tamanho
+
+
+def resolver_roi(dados, ler, resolucao_m, orcamento_bytes=ORCAMENTO_PADRAO_BYTES, diretorio=DIRETORIO_CACHE):
+    """
+    Resolve a ROI de um upload pelo cache, lendo o arquivo apenas se ele ainda não foi visto.
+
+    Args:
+        dados (bytes): Conteúdo do arquivo enviado.
+        ler (callable): Função sem argumentos que lê o upload e retorna um GeoDataFrame
+            (chamada apenas quando a ROI não está no cache).
+        resolucao_m (float): Resolução (m) do dataset, usada em preparar_roi.
+        orcamento_bytes (int): Tamanho máximo do GeoJSON enviado ao Earth Engine.
+
+    Returns:
+        dict com hash, gdf (normalizado), bounds, feicoes (GeoJSON pronto para o EE), relatorio e
+        origem ('cache', 'cache_geometria' quando só o GeoJSON da resolução foi recalculado, ou 'leitura')
+    """
+    chave = hash_conteudo(dados)
+    entrada = ler_entrada(chave, diretorio)
+    origem = 'cache'
+
+    if entrada is None:
+        gdf = ler()
+        if gdf is None or gdf.empty:
+            raise ValueError("Nenhuma geometria encontrada no arquivo enviado.")
+        gdf = normalizar_roi(gdf)
+        entrada = {'gdf': gdf, 'bounds': tuple(gdf.total_bounds), 'ee': {}}
+        origem = 'leitura'
+
+    parametros = chave_parametros((float(resolucao_m), int(orcamento_bytes)))
+    if parametros not in entrada['ee']:
+        feicoes, relatorio = preparar_roi(entrada['gdf'], resolucao_m, orcamento_bytes)
+        entrada['ee'][parametros] = {'feicoes': feicoes, 'relatorio': relatorio}
+        if origem == 'cache':
+            origem = 'cache_geometria'
+        gravar_entrada(chave, entrada, diretorio)
+
+    return {
+        'hash': chave,
+        'gdf': entrada['gdf'],
+        'bounds': entrada['bounds'],
+        'feicoes': entrada['ee'][parametros]['feicoes'],
+        'relatorio': entrada['ee'][parametros]['relatorio'],
+        'origem': origem,
+    }
@@ -0,0 +1,116 @@
+"""
+Cache dos map IDs (URLs de tiles) das camadas do Earth Engine.
+
+A cada reexecução do Streamlit os apps adicionam as mesmas imagens ao mapa (MapBiomas do ano, médias
+de PDSI/ET/precipitação, mosaico do índice) e cada addLayer faz um getMapId no servidor antes de o
+mapa ser renderizado. Os map IDs ficam em cache no processo, com chave = SHA-256 da expressão
+serializada da imagem e dos parâmetros de visualização, e expiram após CACHE_TILES_TTL_S segundos
+(antes do fim da validade dos tokens de tiles do EE). Visualizações repetidas da mesma camada não
+fazem nenhuma chamada ao servidor.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Validade (s) de um map ID no cache
+TTL_PADRAO_S = float(os.environ.get("CACHE_TILES_TTL_S", 2 * 3600))
+
+# Quantidade máxima de map IDs mantidos (os mais antigos são descartados)
+MAX_ENTRADAS = 256
+
+# chave -> (expira_em, map ID)
+_cache = OrderedDict()
+_trava = threading.Lock()
+
+
+def chave_camada(imagem, vis):
+    """SHA-256 da expressão serializada da imagem e dos parâmetros de visualização."""
+    import ee
+
+    expressao = ee.serializer.encode(imagem, for_cloud_api=True)
+    conteudo = json.dumps({'imagem': expressao, 'vis': vis or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(conteudo.encode()).hexdigest()
+
+
+def imagem_da_camada(objeto, vis):
+    """
+    Imagem e parâmetros de visualização de uma camada.
+
+    Geometrias e FeatureCollections são desenhadas como o addLayer do geemap (preenchimento
+    semitransparente e contorno na cor vis['color']).
+    """
+    import ee
+
+    if isinstance(objeto, ee.Image):
+        return objeto, vis or {}
+
+    vis = vis or {}
+    feicoes = ee.FeatureCollection(objeto)
+    cor = vis.get('color', '000000')
+    preenchimento = feicoes.style(fillColor=cor).updateMask(ee.Image.constant(0.5))
+    contorno = feicoes.style(color=cor, fillColor='00000000', width=vis.get('width', 2))
+    return preenchimento.blend(contorno), {}
+
+
+def map_id_em_cache(imagem, vis=None, ttl=TTL_PADRAO_S):
+    """
+    getMapId com cache.
+
+    Args:
+        imagem (ee.Image): Imagem da camada.
+        vis (dict): Parâmetros de visualização.
+        ttl (float): Validade (s) do map ID no cache.
+
+    Returns:
+        dict do getMapId (mapid, token e tile_fetcher)
+    """
+    chave = chave_camada(imagem, vis)
+    agora = time.time()
+    with _trava:
+        entrada = _cache.get(chave)
+        if entrada is not None and entrada[0] > agora:
+            _cache.move_to_end(chave)
+            return entrada[1]
+
+    # A chamada ao servidor é feita fora da trava (camadas diferentes em paralelo)
+    map_id = imagem.getMapId(vis or {})
+    with _trava:
+        _cache[chave] = (agora + ttl, map_id)
+        _cache.move_to_end(chave)
+        while len(_cache) > MAX_ENTRADAS:
+            _cache.popitem(last=False)
+    logger.info("Novo map ID (%s), válido por %.0f s", chave[:12], ttl)
+    return map_id
+
+
+def adicionar_camada_ee(m, objeto, vis, nome, mostrar=True, opacidade=1.0):
+    """
+    Adiciona uma camada do EE ao mapa usando o map ID em cache (substitui m.addLayer).
+
+    Args:
+        m (folium.Map): Mapa (geemap.foliumap.Map).
+        objeto (ee.Image | ee.Geometry | ee.Feature | ee.FeatureCollection): Camada.
+        vis (dict): Parâmetros de visualização.
+        nome (String): Nome da camada no controle de camadas.
+        mostrar (bool): Camada visível ao abrir o mapa.
+        opacidade (float): Opacidade da camada.
+    """
+    import folium
+
+    imagem, vis = imagem_da_camada(objeto, vis)
+    folium.TileLayer(
+        tiles=map_id_em_cache(imagem, vis)['tile_fetcher'].url_format,
+        attr='Google Earth Engine',
+        name=nome,
+        overlay=True,
+        control=True,
+        show=mostrar,
+        opacity=opacidade,
+        max_zoom=24
+    ).add_to(m)
@@ -0,0 +1,232 @@
+"""
+Gravação e reprodução das chamadas ao Earth Engine (testes e benchmarks sem credenciais).
+
+As chamadas ao servidor feitas pelo cliente Python passam pelas funções de ee.data (getInfo usa
+computeValue, o geemap usa computeFeatures, addLayer usa getMapId, ee.Initialize usa getAlgorithms).
+Essas funções são substituídas por versões que:
+
+- contar: apenas contam as chamadas (idas e voltas ao servidor);
+- gravar: executam a chamada e gravam a expressão serializada e a resposta em um arquivo JSON;
+- reproduzir: respondem a partir dos arquivos gravados, sem rede, com latência simulada.
+
+A chave de cada chamada é o SHA-256 do nome da função e dos argumentos, com os objetos do EE
+serializados (mesma expressão -> mesma chave). Erros do EE também são gravados e reproduzidos.
+
+As chamadas são contadas por sessão do Streamlit (contexto da thread que faz a chamada), para que
+sessões simultâneas não misturem as contagens.
+
+Configuração (lida por inicializar_ee):
+    EE_MODO            contar | gravar | reproduzir (vazio: desativado)
+    EE_GRAVACOES_DIR   diretório dos arquivos gravados
+    EE_LATENCIA_S      latência simulada por chamada na reprodução (segundos ou 'gravada')
+
+Exemplo:
+    EE_MODO=gravar streamlit run app_mapbiomas/app_mapbiomas.py
+    EE_MODO=reproduzir EE_LATENCIA_S=gravada streamlit run app_mapbiomas/app_mapbiomas.py
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MODOS = ('contar', 'gravar', 'reproduzir')
+
+DIRETORIO_GRAVACOES = os.environ.get("EE_GRAVACOES_DIR", os.path.join(tempfile.gettempdir(), "sbsr2025_ee_gravacoes"))
+
+# Funções de ee.data que fazem chamadas ao servidor
+FUNCOES_GRAVADAS = (
+    'computeValue',
+    'computeFeatures',
+    'computeImages',
+    'getMapId',
+    'getAlgorithms',
+    'getAsset',
+    'getInfo',
+    'listAssets',
+    'getThumbId',
+    'getDownloadId',
+)
+
+# Funções originais de ee.data (substituídas enquanto a gravação está ativa)
+_originais = {}
+# sessão -> {função: chamadas}
+_contagem = {}
+_trava = threading.Lock()
+
+
+def sessao_atual():
+    """Identificador da sessão do Streamlit da thread atual ('' fora do Streamlit)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return ''
+    contexto = get_script_run_ctx(suppress_warning=True)
+    return contexto.session_id if contexto is not None else ''
+
+
+def codificar_argumento(valor):
+    """Serializa objetos do EE (expressão da API) e demais valores não JSON nos argumentos."""
+    import ee
+
+    if isinstance(valor, ee.ComputedObject):
+        return ee.serializer.encode(valor, for_cloud_api=True)
+    return repr(valor)
+
+
+def chave_chamada(funcao, args, kwargs):
+    """
+    Chave da chamada: SHA-256 da função e dos argumentos serializados.
+
+    Returns:
+        tuple (chave, expressão serializada)
+    """
+    expressao = json.dumps({'args': args, 'kwargs': kwargs}, sort_keys=True, default=codificar_argumento)
+    return hashlib.sha256(f"{funcao}:{expressao}".encode()).hexdigest(), expressao
+
+
+def codificar_resposta(funcao, resposta):
+    """Converte a resposta em JSON (map IDs e DataFrames do computeFeatures recebem marcadores)."""
+    if funcao == 'getMapId':
+        dados = {chave: valor for chave, valor in resposta.items() if chave != 'tile_fetcher'}
+        return {**dados, '__url_format__': resposta['tile_fetcher'].url_format}
+    # GeoDataFrame (fileFormat GEOPANDAS_GEODATAFRAME)
+    if hasattr(resposta, 'geometry') and hasattr(resposta, '__geo_interface__'):
+        return {'__geodataframe__': resposta.__geo_interface__, 'crs': str(resposta.crs)}
+    # DataFrame (fileFormat PANDAS_DATAFRAME, usado pelo geemap.ee_to_df)
+    if hasattr(resposta, 'columns') and hasattr(resposta, 'to_json'):
+        return {'__dataframe__': json.loads(resposta.to_json(orient='split', date_format='iso'))}
+    return resposta
+
+
+def decodificar_resposta(resposta):
+    """Reconstrói a resposta gravada (map ID com tile_fetcher, DataFrame ou GeoDataFrame)."""
+    import ee
+
+    if isinstance(resposta, dict) and '__url_format__' in resposta:
+        dados = {chave: valor for chave, valor in resposta.items() if chave != '__url_format__'}
+        return {**dados, 'tile_fetcher': ee.data.TileFetcher(resposta['__url_format__'], map_name=dados.get('mapid'))}
+    if isinstance(resposta, dict) and '__geodataframe__' in resposta:
+        import geopandas as gpd
+        return gpd.GeoDataFrame.from_features(resposta['__geodataframe__']['features'], crs=resposta['crs'])
+    if isinstance(resposta, dict) and '__dataframe__' in resposta:
+        import pandas as pd
+        return pd.DataFrame(**resposta['__dataframe__'])
+    return resposta
+
+
+def caminho_gravacao(funcao, chave, diretorio):
+    return os.path.join(diretorio, f"{funcao}_{chave}.json")
+
+
+def gravar(caminho, registro):
+    """Grava o registro de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(registro, arquivo, ensure_ascii=False)
+    os.replace(temporario, caminho)
+
+
+def latencia_simulada(configuracao, registro):
+    """Segundos de espera na reprodução: valor fixo ou a duração gravada ('gravada')."""
+    if configuracao == 'gravada':
+        return registro.get('segundos', 0.0)
+    return float(configuracao or 0)
+
+
+def envolver(funcao, original, modo, diretorio, latencia):
+    """Versão de uma função de ee.data que conta, grava ou reproduz as chamadas."""
+    import ee
+
+    def chamada(*args, **kwargs):
+        sessao = sessao_atual()
+        with _trava:
+            contagem = _contagem.setdefault(sessao, {})
+            contagem[funcao] = contagem.get(funcao, 0) + 1
+        if modo == 'contar':
+            return original(*args, **kwargs)
+
+        chave, expressao = chave_chamada(funcao, list(args), kwargs)
+        caminho = caminho_gravacao(funcao, chave, diretorio)
+
+        if modo == 'reproduzir':
+            if not os.path.exists(caminho):
+                raise ee.EEException(f"Chamada {funcao} não gravada ({chave[:12]}); grave com EE_MODO=gravar")
+            with open(caminho, encoding='utf-8') as arquivo:
+                registro = json.load(arquivo)
+            time.sleep(latencia_simulada(latencia, registro))
+            if 'erro' in registro:
+                raise ee.EEException(registro['erro'])
+            return decodificar_resposta(registro['resposta'])
+
+        inicio = time.perf_counter()
+        try:
+            resposta = original(*args, **kwargs)
+        except ee.EEException as erro:
+            gravar(caminho, {'funcao': funcao, 'expressao': expressao, 'erro': str(erro),
+                             'segundos': time.perf_counter() - inicio})
+            raise
+        gravar(caminho, {'funcao': funcao, 'expressao': expressao, 'resposta': codificar_resposta(funcao, resposta),
+                         'segundos': time.perf_counter() - inicio})
+        return resposta
+
+    chamada.__wrapped__ = original
+    return chamada
+
+
+def ativar(modo, diretorio=DIRETORIO_GRAVACOES, latencia=None):
+    """
+    Substitui as funções de ee.data (antes de ee.Initialize, para incluir o getAlgorithms).
+
+    Args:
+        modo (String): 'contar', 'gravar' ou 'reproduzir'.
+        diretorio (String): Diretório dos arquivos gravados.
+        latencia (String | float): Latência simulada na reprodução (padrão: EE_LATENCIA_S).
+    """
+    import ee
+
+    if modo not in MODOS:
+        raise ValueError(f"Modo de gravação inválido: {modo} (use {', '.join(MODOS)})")
+    desativar()
+    latencia = os.environ.get('EE_LATENCIA_S', 0) if latencia is None else latencia
+    for funcao in FUNCOES_GRAVADAS:
+        original = getattr(ee.data, funcao, None)
+        if original is None:
+            continue
+        _originais[funcao] = original
+        setattr(ee.data, funcao, envolver(funcao, original, modo, diretorio, latencia))
+    logger.info("Chamadas ao Earth Engine em modo '%s' (%s)", modo, diretorio)
+
+
+def desativar():
+    """Restaura as funções originais de ee.data."""
+    import ee
+
+    for funcao, original in _originais.items():
+        setattr(ee.data, funcao, original)
+    _originais.clear()
+
+
+def contagem_chamadas(sessao=None):
+    """Chamadas ao servidor por função desde a ativação (ou desde zerar_contagem), de uma sessão ou de todas."""
+    with _trava:
+        sessoes = [_contagem.get(sessao, {})] if sessao is not None else list(_contagem.values())
+        total = {}
+        for contagem in sessoes:
+            for funcao, chamadas in contagem.items():
+                total[funcao] = total.get(funcao, 0) + chamadas
+        return total
+
+
+def total_chamadas(sessao=None):
+    return sum(contagem_chamadas(sessao).values())
+
+
+def zerar_contagem():
+    with _trava:
+        _contagem.clear()
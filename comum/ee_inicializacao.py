@@ -0,0 +1,157 @@
+"""
+Inicialização do Google Earth Engine uma única vez por processo e medição do tempo de execução dos apps.
+
+O Streamlit reexecuta o script a cada interação; a inicialização do EE fica em st.cache_resource e as
+credenciais são lidas apenas na primeira execução do processo. O tempo de cada execução do script é
+registrado (log) e exibido, separando a partida a frio das reexecuções.
+
+Com EE_MODO definido, as chamadas ao EE são contadas, gravadas ou reproduzidas a partir de arquivos
+locais (comum/ee_gravacao.py) e a contagem de chamadas de cada execução é exibida junto do tempo.
+Tempos e contagens ficam em st.session_state (cada sessão vê apenas as suas execuções).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+logger = logging.getLogger(__name__)
+
+
+def credenciais_ee():
+    """
+    Credenciais do Earth Engine, na ordem:
+
+    1. conta de serviço em st.secrets['gcp_service_account'] ou no arquivo EE_SERVICE_ACCOUNT_FILE;
+    2. token de usuário em EARTHENGINE_TOKEN (mesma convenção do geemap), gravado no arquivo de
+       credenciais do EE;
+    3. credenciais persistentes (earthengine authenticate).
+    """
+    import ee
+
+    try:
+        conta_servico = dict(st.secrets['gcp_service_account'])
+    except Exception:
+        conta_servico = None
+    if conta_servico is None and os.environ.get('EE_SERVICE_ACCOUNT_FILE'):
+        with open(os.environ['EE_SERVICE_ACCOUNT_FILE'], encoding='utf-8') as arquivo:
+            conta_servico = json.load(arquivo)
+    if conta_servico is not None:
+        return ee.ServiceAccountCredentials(conta_servico['client_email'], key_data=json.dumps(conta_servico))
+
+    token = os.environ.get('EARTHENGINE_TOKEN')
+    caminho_credenciais = ee.oauth.get_credentials_path()
+    if token and not os.path.exists(caminho_credenciais):
+        os.makedirs(os.path.dirname(caminho_credenciais), exist_ok=True)
+        with open(caminho_credenciais, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(token)
+
+    return 'persistent'
+
+
+def projeto_ee():
+    """
+    Projeto do Google Cloud usado pelo Earth Engine, na ordem: variáveis EE_PROJECT e EE_PROJECT_ID
+    (convenção do geemap) e st.secrets['EE_PROJECT_ID'] ou st.secrets['EE_PROJECT'].
+    """
+    projeto = os.environ.get('EE_PROJECT') or os.environ.get('EE_PROJECT_ID')
+    if projeto:
+        return projeto
+    try:
+        return st.secrets.get('EE_PROJECT_ID') or st.secrets.get('EE_PROJECT')
+    except Exception:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def inicializar_ee(projeto=None):
+    """
+    Inicializa o Earth Engine (uma vez por processo).
+
+    Args:
+        projeto (String): Projeto do Google Cloud (padrão: projeto_ee()).
+
+    Returns:
+        dict com o tempo de inicialização (s)
+    """
+    inicio = time.perf_counter()
+    import ee
+
+    # Gravação/reprodução das chamadas ao EE (EE_MODO)
+    modo = os.environ.get('EE_MODO')
+    if modo:
+        from comum.ee_gravacao import ativar
+        ativar(modo)
+    if modo == 'reproduzir':
+        # Sem credenciais nem rede; credenciais anônimas evitam que o geemap tente autenticar
+        from google.auth.credentials import AnonymousCredentials
+        credenciais = AnonymousCredentials()
+    else:
+        credenciais = credenciais_ee()
+
+    ee.Initialize(credentials=credenciais, project=projeto or projeto_ee())
+    segundos = time.perf_counter() - inicio
+    logger.info("Earth Engine inicializado em %.2f s", segundos)
+    return {'segundos': segundos}
+
+
+def executor_da_sessao(max_workers):
+    """
+    ThreadPoolExecutor cujas threads herdam o contexto da sessão do Streamlit da thread atual, para que
+    as chamadas ao EE feitas em paralelo sejam contadas na sessão (ee_gravacao).
+    """
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+    contexto = get_script_run_ctx(suppress_warning=True)
+
+    def herdar_contexto():
+        if contexto is not None:
+            add_script_run_ctx(threading.current_thread(), contexto)
+
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=herdar_contexto)
+
+
+def registrar_execucao(app, inicio_script):
+    """
+    Registra o tempo da execução atual do script na sessão.
+
+    Args:
+        app (String): Nome do app (usado no log).
+        inicio_script (float): time.perf_counter() no início do script.
+
+    Returns:
+        tuple (segundos, partida_a_frio)
+    """
+    segundos = time.perf_counter() - inicio_script
+    execucoes = st.session_state.setdefault('_tempos_execucao', [])
+    partida_a_frio = not execucoes
+    execucoes.append(segundos)
+    logger.info("%s: execução %d em %.2f s (%s)", app, len(execucoes), segundos,
+                "partida a frio" if partida_a_frio else "reexecução")
+    return segundos, partida_a_frio
+
+
+def chamadas_na_execucao():
+    """Chamadas ao EE feitas pela sessão desde a sua execução anterior do script (None sem EE_MODO)."""
+    if not os.environ.get('EE_MODO'):
+        return None
+    from comum.ee_gravacao import sessao_atual, total_chamadas
+
+    total = total_chamadas(sessao_atual())
+    chamadas = total - st.session_state.get('_chamadas_ee_anteriores', 0)
+    st.session_state['_chamadas_ee_anteriores'] = total
+    return chamadas
+
+
+def exibir_tempo_execucao(app, inicio_script):
+    """Exibe na barra lateral o tempo da execução atual do script (e as chamadas ao EE, com EE_MODO)."""
+    segundos, partida_a_frio = registrar_execucao(app, inicio_script)
+    texto = f"⏱️ {'Partida a frio' if partida_a_frio else 'Reexecução'}: {segundos:.2f} s"
+    chamadas = chamadas_na_execucao()
+    if chamadas is not None:
+        logger.info("%s: %d chamadas ao Earth Engine", app, chamadas)
+        texto += f" · {chamadas} chamadas ao Earth Engine"
+    st.sidebar.caption(texto)
@@ -0,0 +1,117 @@
+"""
+Planejamento da escala das reduções no Earth Engine a partir de um orçamento de pixels.
+
+A quantidade de pixels é estimada pela área da ROI e pela resolução nativa do dataset. É escolhida a
+escala mais fina (múltiplos da resolução nativa por potências de 2) que cabe no orçamento e o
+tileScale proporcional ao volume de pixels. Se o Earth Engine ainda assim falhar por tempo, memória
+ou excesso de pixels, a redução é repetida automaticamente em escalas mais grossas.
+"""
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Orçamento padrão de pixels por redução
+ORCAMENTO_PIXELS_PADRAO = 1e8
+
+# Pixels por unidade de tileScale (acima disso o cálculo é dividido em blocos menores)
+PIXELS_POR_TILE_SCALE = 1e7
+
+TILE_SCALE_MAXIMO = 16
+
+# Trechos das mensagens de erro do Earth Engine que justificam repetir em escala mais grossa
+ERROS_RECUPERAVEIS = (
+    'timed out',
+    'too many pixels',
+    'memory limit',
+    'too many concurrent aggregations',
+)
+
+MAX_TENTATIVAS = 4
+
+
+def area_geojson_m2(geojson):
+    """
+    Área geodésica (m²) de uma Feature, FeatureCollection ou lista de feições GeoJSON em EPSG:4326.
+    """
+    from pyproj import Geod
+    from shapely.geometry import shape
+
+    if isinstance(geojson, dict) and geojson.get('type') == 'FeatureCollection':
+        feicoes = geojson['features']
+    elif isinstance(geojson, dict):
+        feicoes = [geojson]
+    else:
+        feicoes = geojson
+
+    geod = Geod(ellps="WGS84")
+    return sum(abs(geod.geometry_area_perimeter(shape(feicao['geometry']))[0]) for feicao in feicoes)
+
+
+def planejar_escala(area_m2, resolucao_nativa_m, orcamento_pixels=ORCAMENTO_PIXELS_PADRAO, qtd_bandas=1):
+    """
+    Escolhe a escala e o tileScale da redução.
+
+    Args:
+        area_m2 (float): Área da ROI.
+        resolucao_nativa_m (float): Resolução nativa do dataset.
+        orcamento_pixels (float): Quantidade máxima de pixels (x bandas) por redução.
+        qtd_bandas (int): Bandas (ou imagens) reduzidas de uma vez, ex.: meses x variáveis.
+
+    Returns:
+        dict com scale, tileScale e pixels (estimativa, já multiplicada pelas bandas)
+    """
+    escala = resolucao_nativa_m
+    while area_m2 / escala ** 2 * qtd_bandas > orcamento_pixels:
+        escala *= 2
+
+    pixels = area_m2 / escala ** 2 * qtd_bandas
+    tile_scale = 1
+    while tile_scale < TILE_SCALE_MAXIMO and pixels / tile_scale > PIXELS_POR_TILE_SCALE:
+        tile_scale *= 2
+
+    return {'scale': escala, 'tileScale': tile_scale, 'pixels': int(math.ceil(pixels))}
+
+
+def erro_recuperavel(erro):
+    """Indica se o erro do Earth Engine pode ser contornado com uma escala mais grossa."""
+    mensagem = str(erro).lower()
+    return any(trecho in mensagem for trecho in ERROS_RECUPERAVEIS)
+
+
+def executar_com_fallback(funcao, plano, max_tentativas=MAX_TENTATIVAS):
+    """
+    Executa a redução com o plano e, em caso de timeout/excesso de pixels/memória, repete em escalas
+    mais grossas (escala x 2 e tileScale x 2 a cada tentativa).
+
+    Args:
+        funcao (callable): Função funcao(scale, tileScale) que executa a redução.
+        plano (dict): Resultado de planejar_escala.
+
+    Returns:
+        tuple (resultado, plano usado)
+    """
+    plano = dict(plano)
+    for tentativa in range(max_tentativas):
+        try:
+            return funcao(plano['scale'], plano['tileScale']), plano
+        # O geemap (ee_to_df) relança os erros do EE como Exception: o filtro é feito pela mensagem
+        except Exception as erro:
+            if not erro_recuperavel(erro) or tentativa == max_tentativas - 1:
+                raise
+            logger.warning("Redução falhou na escala %s m (%s); repetindo em escala mais grossa",
+                           plano['scale'], erro)
+            plano = {
+                'scale': plano['scale'] * 2,
+                'tileScale': min(plano['tileScale'] * 2, TILE_SCALE_MAXIMO),
+                'pixels': plano['pixels'] // 4,
+                'fallback': plano.get('fallback', 0) + 1,
+            }
+
+
+def descrever_plano(plano):
+    """Texto curto com a escala usada (para a barra lateral)."""
+    texto = f"Escala: {plano['scale']:.0f} m (tileScale {plano['tileScale']}, ~{plano['pixels']:,} pixels)"
+    if plano.get('fallback'):
+        texto += f" — ajustada após {plano['fallback']} falha(s) do Earth Engine"
+    return texto
@@ -0,0 +1,146 @@
+"""
+Preparação da região de interesse (ROI) antes do envio ao Google Earth Engine.
+
+A geometria carregada pelo usuário (KML/KMZ de fazendas, por exemplo) pode ter milhares de vértices e
+gerar requisições de vários MB em cada chamada ao Earth Engine. A ROI é:
+
+1. convertida para 2D em EPSG:4326;
+2. arredondada para uma grade compatível com a resolução do dataset (fração do pixel);
+3. simplificada com preservação de topologia, com tolerância crescente, até que o GeoJSON
+   serializado caiba no orçamento de bytes.
+
+Feições que ficam vazias ou inválidas no arredondamento ou na simplificação (partes menores ou mais
+estreitas que a grade) mantêm a geometria original. O erro de área introduzido é calculado
+localmente (geodésico, pyproj) e retornado no relatório, junto com a quantidade de feições mantidas.
+"""
+import json
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import Geod
+
+# Orçamento padrão do GeoJSON enviado ao Earth Engine
+ORCAMENTO_PADRAO_BYTES = 256 * 1024
+
+# Fração do pixel usada como grade de arredondamento das coordenadas
+FRACAO_PIXEL_PRECISAO = 0.1
+
+# Metros por grau de latitude (aproximação usada para converter a resolução em graus)
+METROS_POR_GRAU = 111_320
+
+MAX_TENTATIVAS = 12
+
+GEOD = Geod(ellps="WGS84")
+
+
+def area_geodesica_ha(geometrias):
+    """Área geodésica total (ha) das geometrias em EPSG:4326."""
+    return sum(abs(GEOD.geometry_area_perimeter(geom)[0]) for geom in geometrias if geom is not None) / 10_000
+
+
+def feicoes_geojson(gdf):
+    """
+    Serializa o GeoDataFrame como lista de feições GeoJSON.
+
+    Returns:
+        tuple (lista de feições, tamanho do GeoJSON em bytes)
+    """
+    texto = gdf.to_json(drop_id=True)
+    return json.loads(texto)['features'], len(texto.encode('utf-8'))
+
+
+def manter_originais(candidatas, originais):
+    """
+    Substitui pelas originais as geometrias que ficaram vazias, inválidas ou perderam partes.
+
+    Returns:
+        tuple (array de geometrias, quantidade de feições mantidas originais)
+    """
+    degeneradas = (shapely.is_missing(candidatas) | shapely.is_empty(candidatas) | ~shapely.is_valid(candidatas)
+                   | (shapely.get_num_geometries(candidatas) < shapely.get_num_geometries(originais)))
+    return np.where(degeneradas, originais, candidatas), int(degeneradas.sum())
+
+
+def normalizar_roi(gdf):
+    """
+    Normaliza a ROI: geometrias 2D em EPSG:4326, sem geometrias vazias.
+
+    Returns:
+        GeoDataFrame
+    """
+    if gdf.crs is None:
+        gdf = gdf.set_crs("EPSG:4326")
+    gdf = gdf.to_crs("EPSG:4326")
+    gdf = gdf.set_geometry(shapely.force_2d(gdf.geometry.to_numpy()), crs="EPSG:4326")
+    return gdf[~gdf.geometry.is_empty & gdf.geometry.notna()]
+
+
+def preparar_roi(gdf, resolucao_m, orcamento_bytes=ORCAMENTO_PADRAO_BYTES):
+    """
+    Prepara a ROI para o Earth Engine: 2D, precisão reduzida e simplificada até caber no orçamento.
+
+    Args:
+        gdf (GeoDataFrame): ROI carregada pelo usuário.
+        resolucao_m (float): Resolução (m) do dataset mais fino usado na análise.
+        orcamento_bytes (int): Tamanho máximo do GeoJSON enviado ao Earth Engine.
+
+    Returns:
+        tuple (lista de feições GeoJSON, relatório)
+        O relatório contém bytes_original, bytes_final, tolerancia_m, vertices_original,
+        vertices_final, area_original_ha, area_final_ha, erro_area_pct, dentro_orcamento e
+        feicoes_mantidas (feições que ficariam vazias/inválidas e mantiveram a geometria original).
+    """
+    gdf = normalizar_roi(gdf)
+
+    _, bytes_original = feicoes_geojson(gdf)
+    geometrias_originais = gdf.geometry.to_numpy()
+    area_original_ha = area_geodesica_ha(geometrias_originais)
+
+    # Grade de arredondamento (graus): fração do pixel do dataset
+    grade = resolucao_m * FRACAO_PIXEL_PRECISAO / METROS_POR_GRAU
+    precisao, mantidas = manter_originais(shapely.set_precision(geometrias_originais, grade), geometrias_originais)
+
+    # Tolerância de simplificação em metros, no CRS UTM da ROI
+    crs_metrico = gdf.estimate_utm_crs()
+    metrico = gpd.GeoSeries(precisao, crs="EPSG:4326").to_crs(crs_metrico)
+
+    tolerancia_m = 0.0
+    candidata = gdf.set_geometry(precisao, crs="EPSG:4326")
+    feicoes, bytes_final = feicoes_geojson(candidata)
+    for _ in range(MAX_TENTATIVAS):
+        if bytes_final <= orcamento_bytes:
+            break
+        tolerancia_m = resolucao_m / 2 if tolerancia_m == 0 else tolerancia_m * 2
+        simplificada = metrico.simplify(tolerancia_m, preserve_topology=True).to_crs("EPSG:4326")
+        simplificada = shapely.make_valid(shapely.set_precision(simplificada.to_numpy(), grade))
+        simplificada, mantidas = manter_originais(simplificada, geometrias_originais)
+        candidata = gdf.set_geometry(simplificada, crs="EPSG:4326")
+        feicoes, bytes_final = feicoes_geojson(candidata)
+
+    area_final_ha = area_geodesica_ha(candidata.geometry.to_numpy())
+    relatorio = {
+        'bytes_original': bytes_original,
+        'bytes_final': bytes_final,
+        'tolerancia_m': tolerancia_m,
+        'vertices_original': int(shapely.get_num_coordinates(geometrias_originais).sum()),
+        'vertices_final': int(shapely.get_num_coordinates(candidata.geometry.to_numpy()).sum()),
+        'area_original_ha': area_original_ha,
+        'area_final_ha': area_final_ha,
+        'erro_area_pct': abs(area_final_ha - area_original_ha) / area_original_ha * 100 if area_original_ha else 0.0,
+        'dentro_orcamento': bytes_final <= orcamento_bytes,
+        'feicoes_mantidas': mantidas,
+    }
+    return feicoes, relatorio
+
+
+def descrever_relatorio(relatorio):
+    """Texto curto com o resultado da preparação da ROI (para a barra lateral)."""
+    texto = (f"ROI: {relatorio['bytes_original'] / 1024:.0f} KB → {relatorio['bytes_final'] / 1024:.0f} KB, "
+             f"{relatorio['vertices_original']} → {relatorio['vertices_final']} vértices, "
+             f"erro de área {relatorio['erro_area_pct']:.3f}%")
+    if relatorio['tolerancia_m']:
+        texto += f" (simplificação de {relatorio['tolerancia_m']:.0f} m)"
+    if relatorio.get('feicoes_mantidas'):
+        texto += f"; {relatorio['feicoes_mantidas']} feição(ões) mantidas com a geometria original (menores que a grade)"
+    return texto
@@ -0,0 +1,46 @@
+"""
+Configuração dos testes: os módulos dos apps são importados pelo nome (como nos scripts), então as
+pastas dos apps e a raiz do repositório (pasta comum/) entram no sys.path.
+"""
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "app_embargos_car"))
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+# Imóveis do CAR (quadrados de ~1 km) e embargos sintéticos, em EPSG:4674 como no car_embargos.gpkg
+CRS = "EPSG:4674"
+IMOVEIS = {
+    'A': box(-48.00, -27.00, -47.99, -26.99),
+    'B': box(-47.99, -27.00, -47.98, -26.99),  # vizinho de A (divisa comum)
+    'C': box(-47.90, -27.00, -47.89, -26.99),
+}
+
+
+@pytest.fixture
+def gpkg_sintetico(tmp_path):
+    """
+    GeoPackage com area_imovel, embargos_ibama e embargos_icmbio.
+
+    - IBAMA 0 (seq_tad REAL): dentro de A, vinculado a A pelo código;
+    - IBAMA 1: dentro de B, sem código (encontrado apenas pela geometria);
+    - ICMBio E1: encosta na divisa de A (toca sem sobrepor), vinculado a C pelo código.
+    """
+    caminho = str(tmp_path / "car_embargos.gpkg")
+    gpd.GeoDataFrame(
+        {'cod_imovel': list(IMOVEIS)}, geometry=list(IMOVEIS.values()), crs=CRS
+    ).to_file(caminho, layer='area_imovel', driver='GPKG', engine='fiona')
+    gpd.GeoDataFrame(
+        {'seq_tad': [0.0, 1.0], 'cod_imovel': ['A', None], 'des_infrac': ['desmatamento', 'queimada']},
+        geometry=[box(-47.998, -26.998, -47.995, -26.995), box(-47.988, -26.998, -47.985, -26.995)], crs=CRS
+    ).to_file(caminho, layer='embargos_ibama', driver='GPKG', engine='fiona')
+    gpd.GeoDataFrame(
+        {'numero_emb': ['E1'], 'cod_imovel': ['C']},
+        geometry=[box(-48.01, -26.998, -48.00, -26.995)], crs=CRS
+    ).to_file(caminho, layer='embargos_icmbio', driver='GPKG', engine='fiona')
+    return caminho
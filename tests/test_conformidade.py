@@ -0,0 +1,59 @@
+"""Tabela de conformidade incremental (conformidade.py) sobre o GeoPackage sintético."""
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import box
+
+from conformidade import hash_linhas, atualizar_tabela_conformidade
+from conftest import CRS
+
+
+def test_hash_linhas_com_atributos_nulos():
+    gdf = gpd.GeoDataFrame(
+        {'cod_imovel': ['A', None], 'des_infrac': [None, 'queimada']},
+        geometry=[box(0, 0, 1, 1), box(0, 0, 1, 1)], crs=CRS
+    )
+
+    hashes = hash_linhas(gdf)
+
+    assert hashes.notna().all()
+    assert hashes.iloc[0] != hashes.iloc[1]
+
+
+def test_atualizacao_recalcula_apenas_imoveis_alterados(gpkg_sintetico, tmp_path):
+    caminho_tabela = str(tmp_path / "conformidade.parquet")
+
+    tabela, recalculados = atualizar_tabela_conformidade(gpkg_sintetico, caminho_tabela)
+    assert recalculados == 3
+    assert tabela.loc['A', 'qtd_embargos_ibama'] == 1
+    assert tabela.loc['C', 'qtd_embargos_icmbio'] == 1
+    assert tabela.loc['C', 'area_sobreposta_ibama_ha'] == 0
+
+    _, recalculados = atualizar_tabela_conformidade(gpkg_sintetico, caminho_tabela)
+    assert recalculados == 0
+
+    # Novo embargo do IBAMA, sem código, dentro de C: apenas C é recalculado
+    embargos_ibama = gpd.read_file(gpkg_sintetico, layer='embargos_ibama', engine='fiona')
+    novo = gpd.GeoDataFrame(
+        {'seq_tad': [2.0], 'cod_imovel': [None], 'des_infrac': ['desmatamento']},
+        geometry=[box(-47.898, -26.998, -47.895, -26.995)], crs=CRS
+    )
+    pd.concat([embargos_ibama, novo], ignore_index=True).to_file(
+        gpkg_sintetico, layer='embargos_ibama', driver='GPKG', engine='fiona'
+    )
+
+    tabela, recalculados = atualizar_tabela_conformidade(gpkg_sintetico, caminho_tabela)
+    assert recalculados == 1
+    assert tabela.loc['C', 'area_sobreposta_ibama_ha'] > 0
+    assert sorted(tabela.index) == ['A', 'B', 'C']
+
+
+def test_tabela_anterior_sem_coluna_de_assinatura(gpkg_sintetico, tmp_path):
+    caminho_tabela = str(tmp_path / "conformidade.parquet")
+    atualizar_tabela_conformidade(gpkg_sintetico, caminho_tabela)
+
+    # Tabela gerada por uma versão sem a assinatura dos embargos do ICMBio
+    pd.read_parquet(caminho_tabela).drop(columns=['hash_embargos_icmbio']).to_parquet(caminho_tabela, index=False)
+
+    tabela, recalculados = atualizar_tabela_conformidade(gpkg_sintetico, caminho_tabela)
+    assert recalculados == 3
+    assert tabela['hash_embargos_icmbio'].notna().all()
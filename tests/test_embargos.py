@@ -0,0 +1,55 @@
+"""Seleção e área dos embargos sobrepostos aos imóveis (proc.py) sobre o GeoPackage sintético."""
+import pytest
+
+from proc import (ler_camada, selecionar_embargos_sobrepostos, calcular_area_sobreposicao,
+                  calcular_sobreposicao_em_lote)
+
+
+def imovel(area_imovel, codigo):
+    return area_imovel[area_imovel['cod_imovel'] == codigo]
+
+
+def test_embargo_que_apenas_toca_o_imovel_nao_e_selecionado(gpkg_sintetico):
+    area_imovel = ler_camada(gpkg_sintetico, 'area_imovel')
+    embargos_icmbio = ler_camada(gpkg_sintetico, 'embargos_icmbio')
+
+    # E1 encosta na divisa de A: intersecta, mas não sobrepõe
+    assert selecionar_embargos_sobrepostos(embargos_icmbio, imovel(area_imovel, 'A')).empty
+
+
+def test_embargo_sem_codigo_e_selecionado_pela_geometria(gpkg_sintetico):
+    area_imovel = ler_camada(gpkg_sintetico, 'area_imovel')
+    embargos_ibama = ler_camada(gpkg_sintetico, 'embargos_ibama')
+
+    sobrepostos_a = selecionar_embargos_sobrepostos(embargos_ibama, imovel(area_imovel, 'A'))
+    sobrepostos_b = selecionar_embargos_sobrepostos(embargos_ibama, imovel(area_imovel, 'B'))
+    sobrepostos_c = selecionar_embargos_sobrepostos(embargos_ibama, imovel(area_imovel, 'C'))
+
+    assert sobrepostos_a['seq_tad'].tolist() == [0]
+    # IBAMA 1 não tem código: só é encontrado pela sobreposição com B
+    assert sobrepostos_b['seq_tad'].tolist() == [1]
+    assert sobrepostos_c.empty
+
+
+def test_sobreposicao_em_lote_igual_a_calculo_por_imovel(gpkg_sintetico):
+    area_imovel = ler_camada(gpkg_sintetico, 'area_imovel')
+    embargos_ibama = ler_camada(gpkg_sintetico, 'embargos_ibama')
+    embargos_icmbio = ler_camada(gpkg_sintetico, 'embargos_icmbio')
+
+    lote_ibama = calcular_sobreposicao_em_lote(area_imovel, embargos_ibama, 'cod_imovel')
+    lote_icmbio = calcular_sobreposicao_em_lote(area_imovel, embargos_icmbio, 'cod_imovel')
+
+    for codigo in ['A', 'B', 'C']:
+        area_imovel_ha, area_embargada_ha, percentual = calcular_area_sobreposicao(
+            imovel(area_imovel, codigo), embargos_ibama
+        )
+        assert lote_ibama.loc[codigo, 'area_imovel_ha'] == pytest.approx(area_imovel_ha)
+        assert lote_ibama.loc[codigo, 'area_embargada_ha'] == pytest.approx(area_embargada_ha)
+        assert lote_ibama.loc[codigo, 'percentual_embargado'] == pytest.approx(percentual)
+
+    # Embargos de 0,003° x 0,003° em imóveis de 0,01° x 0,01°: 9% da área
+    assert lote_ibama.loc['A', 'percentual_embargado'] == pytest.approx(9, rel=1e-2)
+    assert lote_ibama.loc['B', 'percentual_embargado'] == pytest.approx(9, rel=1e-2)
+    assert lote_ibama.loc['C', 'area_embargada_ha'] == 0
+    # O embargo do ICMBio apenas toca A: nenhuma área sobreposta
+    assert (lote_icmbio['area_embargada_ha'] == 0).all()
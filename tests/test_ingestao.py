@@ -0,0 +1,59 @@
+"""Ingestão incremental de embargos (ingestao_embargos.py) sobre o GeoPackage sintético."""
+import sqlite3
+from contextlib import closing
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+import ingestao_embargos
+from ingestao_embargos import ingerir_embargos, ler_log_alteracoes
+from conftest import CRS
+
+
+def gravar_dump(tmp_path, ids):
+    """Dump do IBAMA com seq_tad inteiro (na camada a coluna é REAL): um embargo por id, dentro de B."""
+    caminho = str(tmp_path / "dump_ibama.geojson")
+    gpd.GeoDataFrame(
+        {'seq_tad': ids, 'cod_imovel': ['B'] * len(ids), 'des_infrac': ['desmatamento'] * len(ids)},
+        geometry=[box(-47.988, -26.998, -47.985, -26.995)] * len(ids), crs=CRS
+    ).to_file(caminho, driver='GeoJSON', engine='fiona')
+    return caminho
+
+
+def ids_da_camada(caminho_gpkg):
+    with closing(sqlite3.connect(caminho_gpkg)) as conexao:
+        return sorted(int(linha[0]) for linha in conexao.execute('SELECT seq_tad FROM embargos_ibama'))
+
+
+def test_primeira_ingestao_remove_embargos_ausentes_do_dump(gpkg_sintetico, tmp_path):
+    dump = gravar_dump(tmp_path, [1, 2])
+
+    resultado = ingerir_embargos(gpkg_sintetico, 'ibama', dump)
+
+    # 0 está na camada e não no dump; 1 (REAL na camada, inteiro no dump) é o mesmo embargo
+    assert resultado == {'incluidos': 1, 'alterados': 1, 'removidos': 1}
+    assert ids_da_camada(gpkg_sintetico) == [1, 2]
+    log = ler_log_alteracoes(gpkg_sintetico)
+    assert set(log.loc[log['operacao'] == 'remocao', 'id_embargo']) == {'0'}
+    # Código do imóvel vem do imóvel recortado
+    assert set(log.loc[log['operacao'] == 'inclusao', 'cod_imovel']) == {'B'}
+
+    # Reingestão do mesmo dump: nada muda
+    assert ingerir_embargos(gpkg_sintetico, 'ibama', dump) == {'incluidos': 0, 'alterados': 0, 'removidos': 0}
+    assert ids_da_camada(gpkg_sintetico) == [1, 2]
+
+
+def test_falha_na_gravacao_preserva_camada_e_estado(gpkg_sintetico, tmp_path, monkeypatch):
+    dump = gravar_dump(tmp_path, [1, 2])
+
+    def falhar(*args, **kwargs):
+        raise RuntimeError("falha simulada no recorte")
+
+    monkeypatch.setattr(ingestao_embargos.gpd, 'overlay', falhar)
+    with pytest.raises(RuntimeError):
+        ingerir_embargos(gpkg_sintetico, 'ibama', dump)
+
+    assert ids_da_camada(gpkg_sintetico) == [0, 1]
+    with closing(sqlite3.connect(gpkg_sintetico)) as conexao:
+        assert conexao.execute('SELECT COUNT(*) FROM ingestao_estado').fetchone()[0] == 0
@@ -0,0 +1,31 @@
+"""Área embargada com geometrias inválidas (polígonos autointersectados, comuns nos dados do IBAMA/ICMBio)."""
+import geopandas as gpd
+import pytest
+from shapely.geometry import Polygon, box
+
+from proc import calcular_area_sobreposicao, calcular_sobreposicao_em_lote
+
+# Imóvel quadrado e embargo em "gravata borboleta" (autointersectado) cobrindo metade do imóvel
+IMOVEL = box(-48.0, -27.0, -47.99, -26.99)
+GRAVATA = Polygon([(-48.005, -27.005), (-47.985, -26.985), (-47.985, -27.005), (-48.005, -26.985)])
+
+
+def test_area_sobreposicao_com_embargo_invalido():
+    gdf_imovel = gpd.GeoDataFrame({'cod_imovel': ['A']}, geometry=[IMOVEL], crs=4326)
+    gdf_embargos = gpd.GeoDataFrame({'cod_imovel': ['X']}, geometry=[GRAVATA], crs=4326)
+    assert not GRAVATA.is_valid
+
+    area_imovel_ha, area_embargada_ha, percentual = calcular_area_sobreposicao(gdf_imovel, gdf_embargos)
+
+    assert area_embargada_ha == pytest.approx(area_imovel_ha / 2, rel=1e-3)
+    assert percentual == pytest.approx(50, rel=1e-3)
+
+
+def test_sobreposicao_em_lote_com_embargo_invalido():
+    gdf_car = gpd.GeoDataFrame({'cod_imovel': ['A', 'B']}, geometry=[IMOVEL, box(-47.9, -27.0, -47.89, -26.99)], crs=4326)
+    gdf_embargos = gpd.GeoDataFrame({'cod_imovel': ['X']}, geometry=[GRAVATA], crs=4326)
+
+    resultado = calcular_sobreposicao_em_lote(gdf_car, gdf_embargos, 'cod_imovel')
+
+    assert resultado.loc['A', 'percentual_embargado'] == pytest.approx(50, rel=1e-3)
+    assert resultado.loc['B', 'area_embargada_ha'] == 0